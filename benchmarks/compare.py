@@ -0,0 +1,49 @@
+"""
+Compare two benchmark result files scenario by scenario.
+
+    python -m benchmarks.compare benchmarks/results/before.json \
+        benchmarks/results/after.json
+"""
+import argparse
+import json
+
+def flatten(result, prefix=""):
+    """Flatten nested scenario results into {'a.b': number}, skipping metrics."""
+    values = {}
+    for key, value in result.items():
+        if key == 'metrics':
+            continue
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f"{prefix}{key}"] = value
+    return values
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare two mailfox benchmark result files."
+    )
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline.get('commit')}")
+    print(f"candidate {candidate.get('commit')}")
+    for name, result in candidate['scenarios'].items():
+        before = flatten(baseline['scenarios'].get(name, {}))
+        after = flatten(result)
+        print(f"\n{name}")
+        for key, value in after.items():
+            if key not in before:
+                print(f"  {key:<40} {'':>12} {value:>12.4g}")
+                continue
+            change = (value - before[key]) / before[key] if before[key] else 0.0
+            print(f"  {key:<40} {before[key]:>12.4g} {value:>12.4g} {change:>+8.1%}")
+
+if __name__ == "__main__":
+    main()
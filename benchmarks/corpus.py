@@ -0,0 +1,244 @@
+"""
+Deterministic synthetic mailbox for benchmarks.
+
+Generates the mix of mail a real inbox sees: plain text and HTML-only personal mail,
+multipart/alternative newsletters that differ only in a few words, reply threads with
+quoted history and signatures, notifications, and receipts carrying binary attachments.
+Each kind is filed to its own folder with its own vocabulary, so a classifier trained on
+the corpus has real signal to learn. The same seed always produces byte-identical
+messages.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import format_datetime
+
+FOLDERS = ("Personal", "Work", "Newsletters", "Notifications", "Receipts")
+
+TOPICS = {
+    "Personal": (
+        "weekend dinner birthday family trip photos beach movie party garden holiday "
+        "cousins"
+    ).split(),
+    "Work": (
+        "roadmap deadline sprint review budget quarterly meeting deploy incident "
+        "design hiring"
+    ).split(),
+    "Newsletters": (
+        "digest weekly trends article research launch community tutorial podcast "
+        "release"
+    ).split(),
+    "Notifications": (
+        "alert login security password device verification account reminder activity"
+    ).split(),
+    "Receipts": (
+        "order invoice payment shipped total receipt subscription refund delivery "
+        "purchase"
+    ).split(),
+}
+
+FILLER = (
+    "the a to and of in that is for it on with as this was be at by from have are not "
+    "will can all about there their more when some would like been just also"
+).split()
+
+FIRST_NAMES = (
+    "alice bob carol dave erin frank grace heidi ivan judy mallory niaj olivia peggy "
+    "rupert"
+).split()
+
+NEWSLETTER_LISTS = [
+    ("Tech Digest", "digest.technews.example"),
+    ("Garden Weekly", "weekly.gardening.example"),
+    ("Data Letters", "letters.datasci.example"),
+]
+
+SIGNATURE = (
+    "-- \n{name}\n{title}\nExample Corp | 555-0100\n"
+    "This email and any attachments are confidential."
+)
+
+LABEL_HEADER = "X-Benchmark-Folder"
+
+BASE_DATE = datetime(2024, 1, 1, 9, 0, tzinfo=timezone.utc)
+
+class CorpusGenerator():
+    def __init__(self, seed=0, attachment_kb=(20, 200)):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.attachment_kb = attachment_kb
+        self.count = 0
+
+    def _sentence(self, folder, words=14):
+        topic = TOPICS[folder]
+        chosen = [
+            self.rng.choice(topic if self.rng.random() < 0.35 else FILLER)
+            for _ in range(words)
+        ]
+        return " ".join(chosen).capitalize() + "."
+
+    def _paragraphs(self, folder, count=3):
+        return [
+            " ".join(
+                self._sentence(folder, self.rng.randint(8, 20))
+                for _ in range(self.rng.randint(2, 5))
+            )
+            for _ in range(count)
+        ]
+
+    def _person(self, domain="example.com"):
+        name = self.rng.choice(FIRST_NAMES)
+        return name, f"{name.capitalize()} <{name}@{domain}>"
+
+    def _message(self, folder, subject, sender):
+        self.count += 1
+        message = EmailMessage()
+        message["From"] = sender
+        message["To"] = "Benchmark User <bench@example.com>"
+        message["Subject"] = subject
+        message["Date"] = format_datetime(
+            BASE_DATE + timedelta(minutes=17 * self.count)
+        )
+        message["Message-ID"] = f"<bench-{self.seed}-{self.count}@mailfox.example>"
+        # Ground truth for classification accuracy, never read by mailfox itself
+        message[LABEL_HEADER] = folder
+        return message
+
+    def plain(self, folder="Personal"):
+        _, sender = self._person()
+        message = self._message(folder, self._sentence(folder, 5).rstrip("."), sender)
+        message.set_content("\n\n".join(self._paragraphs(folder)))
+        return message
+
+    def html(self, folder="Personal"):
+        _, sender = self._person()
+        message = self._message(folder, self._sentence(folder, 5).rstrip("."), sender)
+        body = "".join(f"<p>{paragraph}</p>" for paragraph in self._paragraphs(folder))
+        message.set_content(
+            f"<html><body><div>{body}</div></body></html>", subtype="html"
+        )
+        return message
+
+    def newsletter(self, folder="Newsletters"):
+        name, list_host = self.rng.choice(NEWSLETTER_LISTS)
+        message = self._message(
+            folder, f"{name}: issue {self.count}", f"{name} <news@{list_host}>"
+        )
+        message["List-Id"] = f"{name} <{list_host}>"
+        message["List-Unsubscribe"] = f"<https://{list_host}/unsubscribe>"
+        # Issues share most of their text, the way templated newsletters do
+        template = random.Random(list_host).choice  # stable per list
+        shared = [
+            " ".join(template(TOPICS[folder] + FILLER) for _ in range(60))
+            for _ in range(3)
+        ]
+        headline = self._sentence(folder, 10)
+        footer = (
+            f"You are receiving this because you subscribed to {name}. "
+            "Unsubscribe at any time."
+        )
+        text = "\n\n".join([headline, *shared, footer])
+        message.set_content(text)
+        html = "".join(
+            f"<p>{paragraph}</p>" for paragraph in [headline, *shared, footer]
+        )
+        message.add_alternative(
+            f"<html><body><table><tr><td>{html}</td></tr></table></body></html>",
+            subtype="html",
+        )
+        return message
+
+    def thread(self, folder="Work", depth=None):
+        depth = depth or self.rng.randint(1, 4)
+        subject = self._sentence(folder, 4).rstrip(".")
+        body = ""
+        for i in range(depth):
+            name, sender = self._person("corp.example")
+            reply = "\n\n".join(self._paragraphs(folder, 2))
+            signature = SIGNATURE.format(name=name.capitalize(), title="Engineer")
+            if body:
+                quoted = "\n".join(f"> {line}" for line in body.splitlines())
+                when = format_datetime(
+                    BASE_DATE + timedelta(minutes=17 * self.count + i)
+                )
+                body = f"{reply}\n\n{signature}\n\nOn {when}, {sender} wrote:\n{quoted}"
+            else:
+                body = f"{reply}\n\n{signature}"
+        message = self._message(folder, ("Re: " * (depth - 1)) + subject, sender)
+        message.set_content(body)
+        return message
+
+    def notification(self, folder="Notifications"):
+        message = self._message(
+            folder,
+            self._sentence(folder, 4).rstrip("."),
+            "Accounts <no-reply@service.example>",
+        )
+        message.set_content("\n\n".join(self._paragraphs(folder, 1)))
+        return message
+
+    def receipt(self, folder="Receipts"):
+        message = self._message(
+            folder,
+            f"Your receipt #{self.rng.randint(10000, 99999)}",
+            "Shop <orders@shop.example>",
+        )
+        message.set_content("\n\n".join(self._paragraphs(folder, 2)))
+        size = self.rng.randint(*self.attachment_kb) * 1024
+        message.add_attachment(
+            self.rng.randbytes(size),
+            maintype="application",
+            subtype="pdf",
+            filename=f"receipt-{self.count}.pdf"
+        )
+        return message
+
+    def generate(self, kind):
+        return getattr(self, kind)().as_bytes()
+
+# Share of each kind of message in a mailbox, and the folder it is filed to
+MIX = (
+    ("plain", "Personal", 0.15),
+    ("html", "Personal", 0.10),
+    ("thread", "Work", 0.25),
+    ("newsletter", "Newsletters", 0.25),
+    ("notification", "Notifications", 0.15),
+    ("receipt", "Receipts", 0.10),
+)
+
+def generate_mailbox(
+    num_messages=500, *, seed=0, inbox_fraction=0.1, attachment_kb=(20, 200)
+):
+    """
+    Return {folder: [(raw_bytes, flags), ...]} with `num_messages` messages in total.
+
+    Filed messages are \\Seen. An `inbox_fraction` of the messages is left unseen in
+    INBOX, as new mail waiting to be classified.
+    """
+    generator = CorpusGenerator(seed, attachment_kb)
+    kinds = [kind for kind, _, _ in MIX]
+    folders = {kind: folder for kind, folder, _ in MIX}
+    weights = [weight for _, _, weight in MIX]
+
+    mailbox = {"INBOX": [], **{folder: [] for folder in FOLDERS}}
+    for _ in range(num_messages):
+        kind = generator.rng.choices(kinds, weights)[0]
+        raw = generator.generate(kind)
+        if generator.rng.random() < inbox_fraction:
+            mailbox["INBOX"].append((raw, ()))
+        else:
+            mailbox[folders[kind]].append((raw, ("\\Seen",)))
+    return mailbox
+
+def generate_messages(count, *, seed=1, attachment_kb=(20, 200)):
+    """
+    Return `count` (raw_bytes, folder) messages of mixed kinds, e.g. to deliver
+    mid-benchmark.
+    """
+    generator = CorpusGenerator(seed, attachment_kb)
+    messages = []
+    for _ in range(count):
+        weights = [weight for _, _, weight in MIX]
+        kind, folder, _ = generator.rng.choices(MIX, weights)[0]
+        messages.append((generator.generate(kind), folder))
+    return messages
@@ -0,0 +1,105 @@
+"""
+Compare the memory and per-message overhead of passing emails around as EmailRecords
+with the dict and pandas DataFrame flow they replaced.
+
+    python -m benchmarks.email_records [--messages 2000]
+
+Parses a synthetic mailbox once, served by the fake IMAP server, then times each flow
+from the parsed fields: building the email containers, reading the fields classification
+uses from every email and handing the emails on for storage. The DataFrame flow builds a
+dict per email, wraps them in a DataFrame, walks it with `iterrows()` and converts it
+back with `to_dict(orient="records")`, as `get_mail`, `classify_emails` and the poll
+callback used to. Memory is the peak allocated by each flow on top of the parsed field
+values, which both share.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+
+from mailfox.core.email_record import EMAIL_KEYS, EmailRecord
+from mailfox.email_interface.email_handler import EmailHandler
+
+from .corpus import generate_mailbox
+from .fake_imap import FakeIMAPServer
+from .run import load_mailbox
+
+def dataframe_flow(values):
+    import pandas as pd
+    emails = [dict(zip(EMAIL_KEYS, row)) for row in values]
+    frame = pd.DataFrame(emails)
+    for _, mail in frame.iterrows():
+        mail['uuid'], mail['from'], mail['list_id']
+    return frame.to_dict(orient="records")
+
+def record_flow(values):
+    emails = [EmailRecord(*row) for row in values]
+    for mail in emails:
+        mail.uuid, mail.sender, mail.list_id
+    return emails
+
+def timed(function, repeat=5):
+    """Best of `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def peak_allocated(function):
+    """Peak bytes allocated while `function` runs and builds its result."""
+    tracemalloc.start()
+    value = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del value
+    return peak
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark EmailRecords against the DataFrame flow."
+    )
+    parser.add_argument(
+        "--messages", type=int, default=2000, help="Messages in the synthetic mailbox"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    args = parser.parse_args(argv)
+
+    corpus = generate_mailbox(args.messages, seed=args.seed)
+    with FakeIMAPServer(load_mailbox(corpus)) as server:
+        handler = EmailHandler(
+            "bench",
+            "bench",
+            server="127.0.0.1",
+            port=server.port,
+            ssl=False,
+            fetch_mode="text",
+        )
+        emails = handler.get_mail(filter='all', folders=list(server.mailbox.folders))
+    values = [
+        tuple(getattr(mail, name) for name in EmailRecord.__slots__) for mail in emails
+    ]
+
+    # pandas' import isn't part of the per-message cost
+    dataframe_flow(values[:1])
+    results = {
+        'DataFrame': (
+            timed(lambda: dataframe_flow(values)),
+            peak_allocated(lambda: dataframe_flow(values)),
+        ),
+        'EmailRecord': (
+            timed(lambda: record_flow(values)),
+            peak_allocated(lambda: record_flow(values)),
+        ),
+    }
+    print(f"{len(values)} parsed emails")
+    for name, (seconds, peak) in results.items():
+        print(
+            f"{name:12} {seconds / len(values) * 1e6:8.2f} us/email   "
+            f"peak memory {peak / len(values):8.0f} B/email"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
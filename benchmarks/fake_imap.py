@@ -0,0 +1,649 @@
+"""
+In-process IMAP4rev1 stand-in for benchmarks.
+
+Implements the subset of IMAP that EmailHandler (through IMAPClient) uses: LOGIN, LIST,
+SELECT/EXAMINE, STATUS, UID SEARCH/FETCH/STORE/COPY/MOVE/EXPUNGE, EXPUNGE, NOOP,
+COMPRESS and LOGOUT. SEARCH supports RETURN (ALL) (ESEARCH) and HEADER keys, COPY and
+MOVE report COPYUID when UIDPLUS is among the capabilities, and FETCH supports whole
+messages, BODYSTRUCTURE, headers and (partial) body sections. Messages live in memory
+and are shared by every connection; `drop_connections` cuts them all to simulate a
+network failure.
+"""
+import email
+import fnmatch
+import re
+import socket
+import socketserver
+import threading
+import time
+import zlib
+
+DEFAULT_CAPABILITIES = (
+    "IMAP4rev1",
+    "LITERAL+",
+    "UIDPLUS",
+    "MOVE",
+    "ID",
+    "ENABLE",
+    "COMPRESS=DEFLATE",
+    "ESEARCH",
+)
+
+class Message():
+    __slots__ = ("uid", "raw", "flags", "_parsed")
+
+    def __init__(self, uid, raw, flags):
+        self.uid = uid
+        self.raw = raw
+        self.flags = set(flags)
+        self._parsed = None
+
+    @property
+    def parsed(self):
+        if self._parsed is None:
+            self._parsed = email.message_from_bytes(self.raw)
+        return self._parsed
+
+    @property
+    def header(self):
+        match = re.search(rb'\r?\n\r?\n', self.raw)
+        return self.raw[:match.end()] if match else self.raw
+
+class Folder():
+    def __init__(self, name, uidvalidity):
+        self.name = name
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        self.messages = []
+
+    def append(self, raw, flags=()):
+        message = Message(self.uidnext, raw, flags)
+        self.uidnext += 1
+        self.messages.append(message)
+        return message
+
+    def by_uids(self, uid_set):
+        return [message for message in self.messages if message.uid in uid_set]
+
+    def sequence_number(self, message):
+        return self.messages.index(message) + 1
+
+class Mailbox():
+    """Folders and messages shared by every connection to a FakeIMAPServer."""
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.folders = {}
+        self._next_uidvalidity = int(time.time())
+
+    def folder(self, name):
+        with self.lock:
+            if name not in self.folders:
+                self.folders[name] = Folder(name, self._next_uidvalidity)
+                self._next_uidvalidity += 1
+            return self.folders[name]
+
+    def add(self, folder, raw, flags=()):
+        with self.lock:
+            return self.folder(folder).append(raw, flags)
+
+def _parse_uid_set(text, max_uid):
+    uids = set()
+    for part in text.split(','):
+        start, _, end = part.partition(':')
+        start = max_uid if start == '*' else int(start)
+        end = start if not end else (max_uid if end == '*' else int(end))
+        uids.update(range(min(start, end), max(start, end) + 1))
+    return uids
+
+def _format_uid_set(uids):
+    return ','.join(str(uid) for uid in uids)
+
+def _format_uid_ranges(uids):
+    """A compact sequence set of sorted UIDs, e.g. '1:5000,5002'."""
+    ranges = []
+    for uid in uids:
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ','.join(
+        f'{first}:{last}' if last > first else str(first) for first, last in ranges
+    )
+
+def _quote(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _format_flags(flags):
+    return '(' + ' '.join(sorted(flags)) + ')'
+
+def _params(pairs):
+    if not pairs:
+        return 'NIL'
+    items = ' '.join(f'{_quote(key)} {_quote(value)}' for key, value in pairs)
+    return '(' + items + ')'
+
+def _part_bytes(part):
+    """A non-multipart MIME part's body as sent on the wire, still transfer-encoded."""
+    return part.get_payload().encode('ascii', 'surrogateescape')
+
+def _body_structure(part):
+    """Format a MIME part as an IMAP BODYSTRUCTURE, with extension data."""
+    if part.get_content_type() != 'message/rfc822' and part.is_multipart():
+        children = ''.join(_body_structure(child) for child in part.get_payload())
+        boundary = [('boundary', part.get_boundary())] if part.get_boundary() else []
+        subtype = _quote(part.get_content_subtype())
+        return f'({children} {subtype} {_params(boundary)} NIL NIL NIL)'
+
+    disposition = 'NIL'
+    if part.get_content_disposition():
+        filename = [('filename', part.get_filename())] if part.get_filename() else []
+        disposition = f'({_quote(part.get_content_disposition())} {_params(filename)})'
+    params = [(key, value) for key, value in (part.get_params() or [])[1:]]
+    encoding = part.get('Content-Transfer-Encoding', '7bit')
+
+    if part.get_content_type() == 'message/rfc822':
+        inner = part.get_payload(0)
+        body = inner.as_bytes()
+        size = len(body)
+        envelope = '(' + ' '.join(['NIL'] * 10) + ')'
+        fields = [envelope, _body_structure(inner), str(body.count(b'\n'))]
+    else:
+        body = _part_bytes(part)
+        size = len(body)
+        fields = []
+        if part.get_content_maintype() == 'text':
+            fields = [str(body.count(b'\n'))]
+    content_type = (
+        f'{_quote(part.get_content_maintype())} {_quote(part.get_content_subtype())}'
+    )
+    extra = ''.join(' ' + field for field in fields)
+    return (
+        f'({content_type} {_params(params)} NIL NIL {_quote(encoding)} {size}{extra} '
+        f'NIL {disposition} NIL NIL)'
+    )
+
+def _section(message, section):
+    """Resolve an IMAP section number like "2.1" to its MIME part."""
+    part = message
+    for number in section.split('.'):
+        if part.get_content_type() == 'message/rfc822':
+            part = part.get_payload(0)
+        if part.is_multipart():
+            part = part.get_payload(int(number) - 1)
+        elif number != '1':
+            raise ValueError(f'No section {section}')
+    return part
+
+def _tokenize(data):
+    """
+    Split a command line into atoms, strings and nested lists. Literals arrive as bytes.
+    """
+    tokens = []
+    stack = [tokens]
+    i = 0
+    while i < len(data):
+        item = data[i]
+        if isinstance(item, bytes):
+            stack[-1].append(item.decode('utf-8', 'replace'))
+            i += 1
+            continue
+        if item == ' ':
+            i += 1
+        elif item == '(':
+            stack.append([])
+            i += 1
+        elif item == ')':
+            group = stack.pop()
+            stack[-1].append(group)
+            i += 1
+        elif item == '"':
+            value = []
+            i += 1
+            while data[i] != '"':
+                if data[i] == '\\':
+                    i += 1
+                value.append(data[i])
+                i += 1
+            stack[-1].append(''.join(value))
+            i += 1
+        else:
+            value = []
+            depth = 0
+            while i < len(data) and not isinstance(data[i], bytes):
+                char = data[i]
+                if char == '[':
+                    depth += 1
+                elif char == ']':
+                    depth -= 1
+                elif depth == 0 and char in ' ()':
+                    break
+                value.append(char)
+                i += 1
+            stack[-1].append(''.join(value))
+    return tokens
+
+class _InflatingReader():
+    """Client-to-server side of a COMPRESS=DEFLATE connection."""
+    def __init__(self, raw):
+        self.raw = raw
+        self.inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.buffer = bytearray()
+
+    def _fill(self):
+        data = self.raw.read1(64 * 1024)
+        self.buffer += self.inflater.decompress(data)
+        return bool(data)
+
+    def readline(self):
+        while b'\n' not in self.buffer and self._fill():
+            pass
+        end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        return self.read(end)
+
+    def read(self, size):
+        while len(self.buffer) < size and self._fill():
+            pass
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+class _DeflatingWriter():
+    """Server-to-client side of a COMPRESS=DEFLATE connection, compressed per flush."""
+    def __init__(self, raw):
+        self.raw = raw
+        self.deflater = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS
+        )
+        self.buffer = []
+
+    def write(self, data):
+        self.buffer.append(data)
+
+    def flush(self):
+        compressed = self.deflater.compress(b''.join(self.buffer))
+        self.raw.write(compressed + self.deflater.flush(zlib.Z_SYNC_FLUSH))
+        self.raw.flush()
+        self.buffer = []
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    # Responses are buffered and flushed once per command, so timings aren't dominated
+    # by Nagle and delayed-ACK stalls between many small writes
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.selected = None
+        self.read_only = False
+        self.compressed = False
+        with self.server.connections_lock:
+            self.server.connections.add(self.connection)
+
+    def finish(self):
+        with self.server.connections_lock:
+            self.server.connections.discard(self.connection)
+        try:
+            super().finish()
+        except OSError:
+            pass
+
+    def send(self, line):
+        if isinstance(line, str):
+            line = line.encode()
+        self.wfile.write(line + b'\r\n')
+
+    def _read_command(self):
+        """Read one command, resolving literals into bytes items of the list."""
+        data = []
+        while True:
+            if hasattr(socket, 'TCP_QUICKACK'):
+                # IMAPClient writes a command and its CRLF separately, without quick
+                # ACKs the second write waits out the server's delayed ACK
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+            line = self.rfile.readline()
+            if not line:
+                return None
+            text = line.decode('utf-8', 'replace').rstrip('\r\n')
+            match = re.search(r'\{(\d+)(\+?)\}$', text)
+            if not match:
+                data.extend(text)
+                return data
+            data.extend(text[:match.start()])
+            if not match.group(2):
+                self.send('+ Ready for literal data')
+                self.wfile.flush()
+            data.append(self.rfile.read(int(match.group(1))))
+
+    def handle(self):
+        capabilities = ' '.join(self.server.capabilities)
+        self.send(f'* OK [CAPABILITY {capabilities}] Fake IMAP server ready')
+        self.wfile.flush()
+        while True:
+            data = self._read_command()
+            if data is None:
+                return
+            tokens = _tokenize(data)
+            if len(tokens) < 2:
+                continue
+            tag, command, args = tokens[0], tokens[1].upper(), tokens[2:]
+            self.tag = tag
+            uid = False
+            if command == 'UID':
+                uid = True
+                command, args = args[0].upper(), args[1:]
+            handler = getattr(self, f'cmd_{command}', None)
+            if handler is None:
+                self.send(f'{tag} BAD Unknown command {command}')
+                self.wfile.flush()
+                continue
+            try:
+                with self.server.mailbox.lock:
+                    response = handler(args, uid)
+            except Exception as e:
+                self.send(f'{tag} BAD {e}')
+                self.wfile.flush()
+                continue
+            self.send(f'{tag} {response or "OK Completed"}')
+            self.wfile.flush()
+            if command == 'LOGOUT':
+                return
+            if command == 'COMPRESS' and response is None:
+                self.rfile = _InflatingReader(self.rfile)
+                self.wfile = _DeflatingWriter(self.wfile)
+                self.compressed = True
+
+    # Connection state
+
+    def cmd_CAPABILITY(self, args, uid):
+        self.send('* CAPABILITY ' + ' '.join(self.server.capabilities))
+
+    def cmd_NOOP(self, args, uid):
+        pass
+
+    def cmd_ID(self, args, uid):
+        self.send('* ID NIL')
+
+    def cmd_ENABLE(self, args, uid):
+        pass
+
+    def cmd_COMPRESS(self, args, uid):
+        supported = 'COMPRESS=DEFLATE' in self.server.capabilities
+        if not supported or args[:1] != ['DEFLATE']:
+            return 'NO Unsupported compression mechanism'
+        if self.compressed:
+            return 'NO [COMPRESSIONACTIVE] Already compressing'
+
+    def cmd_LOGIN(self, args, uid):
+        if self.server.credentials and tuple(args[:2]) != self.server.credentials:
+            return 'NO [AUTHENTICATIONFAILED] Invalid credentials'
+
+    def cmd_LOGOUT(self, args, uid):
+        self.send('* BYE Logging out')
+
+    # Folders
+
+    def cmd_LIST(self, args, uid):
+        pattern = args[1].replace('%', '*') or '*'
+        for name in self.server.mailbox.folders:
+            if fnmatch.fnmatchcase(name, pattern):
+                self.send(f'* LIST (\\HasNoChildren) "/" {_quote(name)}')
+
+    cmd_LSUB = cmd_LIST
+
+    def cmd_SELECT(self, args, uid):
+        if args[0] not in self.server.mailbox.folders:
+            return 'NO Mailbox does not exist'
+        self.selected = self.server.mailbox.folders[args[0]]
+        self.read_only = False
+        self.send('* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)')
+        self.send(f'* {len(self.selected.messages)} EXISTS')
+        self.send('* 0 RECENT')
+        self.send(f'* OK [UIDVALIDITY {self.selected.uidvalidity}] UIDs valid')
+        self.send(f'* OK [UIDNEXT {self.selected.uidnext}] Predicted next UID')
+        return 'OK [READ-WRITE] SELECT completed'
+
+    def cmd_EXAMINE(self, args, uid):
+        self.cmd_SELECT(args, uid)
+        self.read_only = True
+        return 'OK [READ-ONLY] EXAMINE completed'
+
+    def cmd_STATUS(self, args, uid):
+        if args[0] not in self.server.mailbox.folders:
+            return 'NO Mailbox does not exist'
+        folder = self.server.mailbox.folders[args[0]]
+        values = {
+            'MESSAGES': len(folder.messages),
+            'RECENT': 0,
+            'UIDNEXT': folder.uidnext,
+            'UIDVALIDITY': folder.uidvalidity,
+            'UNSEEN': sum(
+                1 for message in folder.messages if '\\Seen' not in message.flags
+            ),
+        }
+        items = ' '.join(f'{item} {values[item.upper()]}' for item in args[1])
+        self.send(f'* STATUS {_quote(folder.name)} ({items})')
+
+    def cmd_CLOSE(self, args, uid):
+        if self.selected is not None and not self.read_only:
+            self.selected.messages = [
+                m for m in self.selected.messages if '\\Deleted' not in m.flags
+            ]
+        self.selected = None
+
+    # Messages
+
+    def _max_uid(self):
+        return self.selected.messages[-1].uid if self.selected.messages else 0
+
+    def _resolve(self, message_set, uid):
+        if uid:
+            return self.selected.by_uids(_parse_uid_set(message_set, self._max_uid()))
+        numbers = _parse_uid_set(message_set, len(self.selected.messages))
+        return [m for i, m in enumerate(self.selected.messages, 1) if i in numbers]
+
+    def _matches(self, message, criteria):
+        i = 0
+        while i < len(criteria):
+            key = criteria[i].upper() if isinstance(criteria[i], str) else criteria[i]
+            if isinstance(key, list):
+                if not self._matches(message, key):
+                    return False
+            elif key == 'ALL':
+                pass
+            elif key == 'SEEN' and '\\Seen' not in message.flags:
+                return False
+            elif key == 'UNSEEN' and '\\Seen' in message.flags:
+                return False
+            elif key == 'DELETED' and '\\Deleted' not in message.flags:
+                return False
+            elif key == 'UID':
+                i += 1
+                if message.uid not in _parse_uid_set(criteria[i], self._max_uid()):
+                    return False
+            elif key == 'HEADER':
+                name, value = criteria[i + 1], criteria[i + 2]
+                i += 2
+                if value.lower() not in (message.parsed.get(name) or '').lower():
+                    return False
+            elif key in ('SEEN', 'UNSEEN', 'DELETED'):
+                pass
+            else:
+                raise ValueError(f'Unsupported search key {key}')
+            i += 1
+        return True
+
+    def cmd_SEARCH(self, args, uid):
+        extended = args and isinstance(args[0], str) and args[0].upper() == 'RETURN'
+        if extended:
+            args = args[2:]
+        if args and isinstance(args[0], str) and args[0].upper() == 'CHARSET':
+            args = args[2:]
+        matches = [m for m in self.selected.messages if self._matches(m, args)]
+        ids = [m.uid if uid else self.selected.sequence_number(m) for m in matches]
+        if extended:
+            # RETURN (ALL) is the only result option served
+            result = f' ALL {_format_uid_ranges(sorted(ids))}' if ids else ''
+            self.send(f'* ESEARCH (TAG "{self.tag}"){" UID" if uid else ""}{result}')
+            return
+        self.send('* SEARCH' + ''.join(f' {i}' for i in ids))
+
+    def _fetch_items(self, message, items):
+        """Return a message's FETCH response items, literals as (key, bytes) pairs."""
+        parts = [f'UID {message.uid}']
+        for item in items:
+            name = item.upper()
+            if name == 'UID':
+                continue
+            if name == 'FLAGS':
+                parts.append(f'FLAGS {_format_flags(message.flags)}')
+            elif name == 'RFC822.SIZE':
+                parts.append(f'RFC822.SIZE {len(message.raw)}')
+            elif name == 'BODYSTRUCTURE':
+                parts.append(f'BODYSTRUCTURE {_body_structure(message.parsed)}')
+            elif name in ('BODY[]', 'BODY.PEEK[]', 'RFC822'):
+                key = 'RFC822' if name == 'RFC822' else 'BODY[]'
+                parts.append((key, message.raw))
+                if not name.startswith('BODY.PEEK'):
+                    message.flags.add('\\Seen')
+            else:
+                match = re.fullmatch(
+                    r'BODY(\.PEEK)?\[([0-9.]+|HEADER)\](?:<(\d+)\.(\d+)>)?', name
+                )
+                if not match:
+                    raise ValueError(f'Unsupported fetch item {item}')
+                section = match.group(2)
+                if section == 'HEADER':
+                    body = message.header
+                else:
+                    body = _part_bytes(_section(message.parsed, section))
+                key = f'BODY[{section}]'
+                if match.group(3) is not None:
+                    start, length = int(match.group(3)), int(match.group(4))
+                    body = body[start:start + length]
+                    key += f'<{start}>'
+                parts.append((key, body))
+                if not match.group(1):
+                    message.flags.add('\\Seen')
+        return parts
+
+    def cmd_FETCH(self, args, uid):
+        items = args[1] if isinstance(args[1], list) else [args[1]]
+        for message in self._resolve(args[0], uid):
+            parts = self._fetch_items(message, items)
+            sequence = self.selected.sequence_number(message)
+            response = f'* {sequence} FETCH ('.encode()
+            for i, part in enumerate(parts):
+                if i:
+                    response += b' '
+                if isinstance(part, tuple):
+                    key, body = part
+                    response += f'{key} {{{len(body)}}}\r\n'.encode() + body
+                else:
+                    response += part.encode()
+            self.wfile.write(response + b')\r\n')
+
+    def cmd_STORE(self, args, uid):
+        mode = args[1].upper()
+        flags = args[2] if isinstance(args[2], list) else [args[2]]
+        for message in self._resolve(args[0], uid):
+            if mode.startswith('+'):
+                message.flags.update(flags)
+            elif mode.startswith('-'):
+                message.flags.difference_update(flags)
+            else:
+                message.flags = set(flags)
+            if not mode.endswith('.SILENT'):
+                sequence = self.selected.sequence_number(message)
+                formatted = _format_flags(message.flags)
+                self.send(f'* {sequence} FETCH (UID {message.uid} FLAGS {formatted})')
+
+    def _copy(self, args, uid):
+        if args[1] not in self.server.mailbox.folders:
+            raise ValueError('[TRYCREATE] Mailbox does not exist')
+        destination = self.server.mailbox.folders[args[1]]
+        messages = self._resolve(args[0], uid)
+        copies = [destination.append(m.raw, m.flags - {'\\Deleted'}) for m in messages]
+        source_uids = _format_uid_set(m.uid for m in messages)
+        destination_uids = _format_uid_set(m.uid for m in copies)
+        if 'UIDPLUS' not in self.server.capabilities:
+            return messages, ''
+        return (
+            messages,
+            f'[COPYUID {destination.uidvalidity} {source_uids} {destination_uids}]',
+        )
+
+    def cmd_COPY(self, args, uid):
+        _, copyuid = self._copy(args, uid)
+        return f'OK {copyuid} COPY completed' if copyuid else 'OK COPY completed'
+
+    def _expunge(self, messages):
+        for message in sorted(
+            messages, key=self.selected.sequence_number, reverse=True
+        ):
+            self.send(f'* {self.selected.sequence_number(message)} EXPUNGE')
+            self.selected.messages.remove(message)
+
+    def cmd_MOVE(self, args, uid):
+        messages, copyuid = self._copy(args, uid)
+        if copyuid:
+            self.send(f'* OK {copyuid} Moved')
+        self._expunge(messages)
+        return 'OK MOVE completed'
+
+    def cmd_EXPUNGE(self, args, uid):
+        messages = self._resolve(args[0], True) if uid else self.selected.messages
+        self._expunge([m for m in messages if '\\Deleted' in m.flags])
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    """
+    Serve a Mailbox over plain IMAP on localhost. Use as a context manager:
+
+        with FakeIMAPServer(mailbox) as server:
+            handler = EmailHandler(
+                "user", "pass", server="127.0.0.1", port=server.port, ssl=False
+            )
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(
+        self,
+        mailbox,
+        *,
+        host="127.0.0.1",
+        port=0,
+        capabilities=DEFAULT_CAPABILITIES,
+        credentials=None,
+    ):
+        super().__init__((host, port), _IMAPHandler)
+        self.mailbox = mailbox
+        self.capabilities = tuple(capabilities)
+        self.credentials = credentials
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def drop_connections(self):
+        """Reset every open client connection, as a network failure would."""
+        with self.connections_lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="fake-imap", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,77 @@
+"""
+Check that the CLI imports within budget and without its heavy dependencies.
+
+    python -m benchmarks.import_time [--budget-ms 300]
+
+Runs `python -X importtime -c "import mailfox.cli.app"` in a fresh interpreter,
+reports the slowest imports and exits non-zero if the cumulative import time exceeds the
+budget or a dependency that only specific commands need was imported eagerly.
+"""
+import argparse
+import subprocess
+import sys
+
+# Cumulative import time allowed for the CLI, in milliseconds
+DEFAULT_BUDGET_MS = 300
+
+# Only the commands that need these may import them
+DEFERRED_MODULES = (
+    "chromadb", "sklearn", "pandas", "numpy", "tiktoken", "bs4", "imapclient", "openai",
+    "joblib",
+)
+
+def measure(module="mailfox.cli.app"):
+    """Return {module: cumulative microseconds} for a cold import of `module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        _, cumulative, name = (part.strip() for part in fields)
+        timings[name] = int(cumulative)
+    return timings
+
+def check(timings, module="mailfox.cli.app", budget_ms=DEFAULT_BUDGET_MS):
+    """Return the budget and eager import failures of `measure(module)` timings."""
+    failures = []
+    total_ms = timings.get(module, 0) / 1000
+    if total_ms > budget_ms:
+        failures.append(
+            f"importing {module} took {total_ms:.1f} ms, budget is {budget_ms:.0f} ms"
+        )
+    eager = sorted({name.split(".")[0] for name in timings} & set(DEFERRED_MODULES))
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check mailfox's CLI import time budget."
+    )
+    parser.add_argument(
+        "--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+        help="Maximum cumulative import time"
+    )
+    parser.add_argument("--module", default="mailfox.cli.app", help="Module to import")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to report")
+    args = parser.parse_args(argv)
+
+    timings = measure(args.module)
+    total_ms = timings.get(args.module, 0) / 1000
+    slowest = sorted(timings.items(), key=lambda item: -item[1])[:args.top]
+    for name, cumulative in slowest:
+        print(f"{cumulative / 1000:9.1f} ms  {name}")
+
+    failures = check(timings, args.module, args.budget_ms)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print(f"OK: {args.module} imports in {total_ms:.1f} ms")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,431 @@
+"""
+Run mailfox's end-to-end benchmarks against a synthetic mailbox served by a local fake
+IMAP server.
+
+    python -m benchmarks.run                          # every scenario, 500 messages
+    python -m benchmarks.run -s initial_sync -s steady_poll --messages 2000
+    python -m benchmarks.compare results/a.json results/b.json
+
+Results, including the git commit and the mailfox metrics recorded during each scenario,
+are written as JSON so runs can be compared across commits. The ingestion, retrain and
+classification scenarios load the configured embedding model.
+"""
+import argparse
+from email.parser import BytesHeaderParser
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+from mailfox.core import metrics
+from mailfox.core.email_processor import classify_emails
+from mailfox.core.poll_scheduler import FolderPollScheduler
+from mailfox.email_interface.email_handler import FETCH_MODES, EmailHandler
+from mailfox.vector.classifiers import (
+    CLASSIFIER_CLASSES,
+    EMBEDDING_FREE_CLASSIFIERS,
+    get_classifier_class,
+)
+from mailfox.vector.training_set import build_training_set
+from mailfox.vector import VectorDatabase, EmbeddingFunctions
+
+from .corpus import LABEL_HEADER, generate_mailbox, generate_messages
+from .fake_imap import FakeIMAPServer, Mailbox
+
+SCENARIOS = ("initial_sync", "steady_poll", "ingestion", "retrain", "classification")
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+class Benchmark():
+    """
+    Shared state of one run. Scenarios compute what they need from earlier ones on
+    demand.
+    """
+    def __init__(self, args, server, workdir):
+        self.args = args
+        self.server = server
+        self.workdir = workdir
+        self.folders = list(server.mailbox.folders)
+        self._emails = None
+        self._vector_db = None
+        self._classifier = None
+
+    def connect(self):
+        return EmailHandler(
+            "bench", "bench", server="127.0.0.1", port=self.server.port, ssl=False,
+            fetch_mode=self.args.fetch_mode,
+            section_max_bytes=self.args.section_max_bytes,
+            compress=self.args.compress, clean_text=self.args.clean_text
+        )
+
+    def emails(self):
+        if self._emails is None:
+            self._emails = self.connect().get_mail(filter='all', folders=self.folders)
+        return self._emails
+
+    def vector_db(self):
+        if self._vector_db is None:
+            self._vector_db = VectorDatabase(
+                os.path.join(self.workdir, "db"),
+                embedding_function=self.args.embedding,
+                openai_api_key=os.environ.get("OPENAI_API_KEY")
+            )
+        return self._vector_db
+
+    def stored_vector_db(self):
+        vector_db = self.vector_db()
+        if vector_db.is_emails_empty():
+            vector_db.store_emails(
+                [mail for mail in self.emails() if mail.folder != "INBOX"]
+            )
+        return vector_db
+
+    def classifier(self):
+        if self._classifier is None:
+            self.run_retrain()
+        return self._classifier
+
+    # Scenarios
+
+    def run_initial_sync(self):
+        handler = self.connect()
+        start = time.perf_counter()
+        emails = handler.get_mail(filter='all', folders=self.folders)
+        elapsed = time.perf_counter() - start
+        self._emails = emails
+        counters = metrics.snapshot()['counters']
+        return {
+            'messages': len(emails),
+            'bytes_fetched': counters.get('bytes_fetched_total', 0),
+            'seconds': elapsed,
+            'messages_per_second': len(emails) / elapsed if elapsed else 0.0,
+        }
+
+    def run_steady_poll(self):
+        handler = self.connect()
+        # Every folder is due every poll, so each idle poll measures the STATUS checks
+        scheduler = FolderPollScheduler(0, 0)
+        folder_uids = {}
+
+        def ignore(*args, **kwargs):
+            pass
+
+        handler.poll_folders(self.folders, folder_uids, ignore, scheduler=scheduler)
+
+        idle = []
+        for _ in range(self.args.polls):
+            start = time.perf_counter()
+            handler.poll_folders(self.folders, folder_uids, ignore, scheduler=scheduler)
+            idle.append(time.perf_counter() - start)
+
+        # New mail filed in one folder between polls
+        fetched = []
+
+        def count(folder, emails, **kwargs):
+            fetched.append(len(emails))
+
+        for raw, _ in generate_messages(
+            self.args.new_messages, seed=self.args.seed + 1
+        ):
+            self.server.mailbox.add(self.folders[-1], raw, ("\\Seen",))
+        start = time.perf_counter()
+        handler.poll_folders(self.folders, folder_uids, count, scheduler=scheduler)
+        with_new = time.perf_counter() - start
+
+        return {
+            'folders': len(self.folders),
+            'idle_poll_seconds_median': statistics.median(idle),
+            'idle_poll_seconds_max': max(idle),
+            'new_messages': sum(fetched),
+            'poll_with_new_seconds': with_new,
+        }
+
+    def run_ingestion(self):
+        emails = [mail for mail in self.emails() if mail.folder != "INBOX"]
+        vector_db = self.vector_db()
+        start = time.perf_counter()
+        vector_db.store_emails(emails)
+        elapsed = time.perf_counter() - start
+        return {
+            'emails': len(emails),
+            'paragraphs': sum(len(mail.paragraphs) for mail in emails),
+            'chunks': sum(
+                len(vector_db.chunk_paragraphs(mail.paragraphs)) for mail in emails
+            ),
+            'body_chars_stripped': metrics.snapshot()['counters'].get(
+                'body_chars_stripped_total', 0
+            ),
+            'seconds': elapsed,
+            'emails_per_second': len(emails) / elapsed if elapsed else 0.0,
+        }
+
+    def run_retrain(self):
+        vector_db = self.stored_vector_db()
+        start = time.perf_counter()
+        embeddings, folders, uuids = vector_db.get_training_vectors(include_uuids=True)
+        load_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        embeddings, training_folders, weights = build_training_set(
+            embeddings, folders, uuids
+        )
+        build_seconds = time.perf_counter() - start
+
+        results = {
+            'vectors': len(folders),
+            'training_vectors': len(training_folders),
+            'load_seconds': load_seconds,
+            'build_seconds': build_seconds,
+            'classifiers': {},
+        }
+        emails, email_folders = vector_db.get_training_emails()
+        for name in CLASSIFIER_CLASSES:
+            classifier = get_classifier_class(name)()
+            start = time.perf_counter()
+            if name in EMBEDDING_FREE_CLASSIFIERS:
+                fit_metrics = classifier.fit(emails, folders=email_folders)
+                samples = [
+                    emails[i] for i in range(0, len(emails), max(1, len(emails) // 100))
+                ]
+            else:
+                fit_metrics = classifier.fit(
+                    embeddings, folders=training_folders, sample_weight=weights
+                )
+                # One chunk per email, not counting the embedding call
+                samples = [
+                    [embeddings[i]]
+                    for i in range(0, len(embeddings), max(1, len(embeddings) // 100))
+                ]
+            fit_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            for sample in samples:
+                classifier.classify_email(sample)
+            results['classifiers'][name] = {
+                'fit_seconds': fit_seconds,
+                'predict_ms': (
+                    (time.perf_counter() - start) / len(samples) * 1000
+                    if samples
+                    else 0.0
+                ),
+                'accuracy': fit_metrics['accuracy'],
+                'f1': fit_metrics['f1'],
+            }
+            if name == self.args.classifier:
+                self._classifier = classifier
+        return results
+
+    def run_classification(self):
+        vector_db = self.stored_vector_db()
+        classifier = self.classifier()
+        for raw, _ in generate_messages(
+            self.args.new_messages, seed=self.args.seed + 2
+        ):
+            self.server.mailbox.add("INBOX", raw)
+        labels = {}
+        for message in self.server.mailbox.folders["INBOX"].messages:
+            headers = BytesHeaderParser().parsebytes(message.raw)
+            labels[headers['Message-ID']] = headers[LABEL_HEADER]
+
+        handler = self.connect()
+        start = time.perf_counter()
+        new_emails = handler.get_mail(filter='unseen', folders=["INBOX"])
+        fetch_seconds = time.perf_counter() - start
+        chunks_before = metrics.snapshot()['counters'].get('chunks_embedded_total', 0)
+        embedded = classify_emails(
+            new_emails,
+            vector_db,
+            handler,
+            classifier=classifier,
+            confidence_threshold=self.args.early_exit_confidence,
+        )
+        classify_seconds = time.perf_counter() - start - fetch_seconds
+        chunks_classified = (
+            metrics.snapshot()['counters'].get('chunks_embedded_total', 0)
+            - chunks_before
+        )
+        auto_filed = {mail.uuid for mail in new_emails if mail.folder != "INBOX"}
+        vector_db.store_emails(new_emails, embedded, auto_filed=auto_filed)
+        vector_db.flush_deferred()
+        total = time.perf_counter() - start
+
+        correct = sum(
+            1 for mail in new_emails if labels.get(mail.message_id) == mail.folder
+        )
+        return {
+            'emails': len(new_emails),
+            'fetch_seconds': fetch_seconds,
+            'classify_seconds': classify_seconds,
+            'chunks_embedded_before_move': chunks_classified,
+            'seconds': total,
+            'seconds_per_email': total / len(new_emails) if new_emails else 0.0,
+            'accuracy': correct / len(new_emails) if new_emails else 0.0,
+        }
+
+def load_mailbox(corpus):
+    mailbox = Mailbox()
+    for folder, messages in corpus.items():
+        mailbox.folder(folder)
+        for raw, flags in messages:
+            mailbox.add(folder, raw, flags)
+    return mailbox
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarize_metrics():
+    snapshot = metrics.snapshot()
+    return {
+        'counters': snapshot['counters'],
+        'mean_seconds': {
+            name: histogram['mean']
+            for name, histogram in snapshot['histograms'].items()
+        },
+        'hit_rates': snapshot['hit_rates'],
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run mailfox benchmarks against a synthetic mailbox."
+    )
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=SCENARIOS,
+        help="Scenario to run (repeatable, default all)",
+    )
+    parser.add_argument(
+        "--messages", type=int, default=500, help="Messages in the synthetic mailbox"
+    )
+    parser.add_argument(
+        "--new-messages",
+        type=int,
+        default=50,
+        help="Messages delivered during poll and classification scenarios",
+    )
+    parser.add_argument(
+        "--polls", type=int, default=20, help="Idle polls timed by steady_poll"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument(
+        "--attachment-kb",
+        type=int,
+        nargs=2,
+        default=(20, 200),
+        metavar=("MIN", "MAX"),
+        help="Attachment size range",
+    )
+    parser.add_argument(
+        "--fetch-mode",
+        choices=FETCH_MODES,
+        default="text",
+        help="Download whole messages or only their text",
+    )
+    parser.add_argument(
+        "--section-max-bytes",
+        type=int,
+        help="Cap on each text section fetched in text mode",
+    )
+    parser.add_argument(
+        "--compress",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Negotiate COMPRESS=DEFLATE",
+    )
+    parser.add_argument(
+        "--clean-text",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Strip quoted replies, signatures and footers before chunking",
+    )
+    parser.add_argument(
+        "--embedding",
+        type=EmbeddingFunctions,
+        default=EmbeddingFunctions.SENTENCE_TRANSFORMER,
+        help="Embedding function",
+    )
+    parser.add_argument(
+        "--early-exit-confidence",
+        type=float,
+        help="Classify progressively, stopping at this confidence",
+    )
+    parser.add_argument(
+        "--classifier",
+        choices=list(CLASSIFIER_CLASSES),
+        default="svm",
+        help="Classifier used for classification",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Result file (default benchmarks/results/<time>-<commit>.json)",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = args.scenario or list(SCENARIOS)
+    commit = git_commit()
+
+    corpus = generate_mailbox(
+        args.messages, seed=args.seed, attachment_kb=tuple(args.attachment_kb)
+    )
+    results = {
+        'commit': commit,
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ('scenario', 'output')
+        },
+        'scenarios': {},
+    }
+
+    metrics.enable()
+    with tempfile.TemporaryDirectory() as workdir, FakeIMAPServer(
+        load_mailbox(corpus)
+    ) as server:
+        bench = Benchmark(args, server, workdir)
+        for name in scenarios:
+            print(f"Running {name}...")
+            metrics.reset()
+            try:
+                result = getattr(bench, f"run_{name}")()
+                result['metrics'] = summarize_metrics()
+            except Exception as e:
+                print(f"Scenario {name} failed: {e}")
+                result = {'error': str(e)}
+            results['scenarios'][name] = result
+        if bench._vector_db is not None:
+            bench._vector_db.close()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR,
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{(commit or 'unknown')[:8]}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+
+    for name, result in results['scenarios'].items():
+        summary = ", ".join(
+            f"{key}={value:.4g}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in result.items()
+            if not isinstance(value, dict)
+        )
+        print(f"{name}: {summary}")
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Compare the poller's seen-UID bookkeeping with Python sets and with UIDSet.
+
+    python -m benchmarks.uid_sets [--uids 2000000] [--gaps 2000] [--new 50]
+
+Builds a folder of `--uids` UIDs with `--gaps` deleted messages, then times one poll's
+worth of work (diffing the folder's SEARCH result against the seen UIDs both ways) and
+reports the memory each representation holds.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from mailfox.core.uid_set import UIDSet
+
+def timed(function, repeat=5):
+    """Best of `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def allocated(function):
+    """Bytes still allocated by the object `function` builds."""
+    tracemalloc.start()
+    value = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del value
+    return size
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark seen-UID sets.")
+    parser.add_argument(
+        "--uids", type=int, default=2_000_000, help="UIDs in the folder"
+    )
+    parser.add_argument(
+        "--gaps",
+        type=int,
+        default=2000,
+        help="Deleted messages, leaving gaps in the UIDs",
+    )
+    parser.add_argument(
+        "--new", type=int, default=50, help="UIDs delivered since the last poll"
+    )
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    uids = np.delete(
+        np.arange(1, args.uids + 1), rng.choice(args.uids, args.gaps, replace=False)
+    )
+    current = np.concatenate([uids, np.arange(args.uids + 1, args.uids + 1 + args.new)])
+    seen_list, current_list = uids.tolist(), current.tolist()
+
+    seen_set, current_set = set(seen_list), set(current_list)
+    seen_uid_set = UIDSet(uids)
+    # Servers with ESEARCH send the SEARCH result as a sequence set
+    sequence_set = str(UIDSet(current))
+
+    results = {
+        'python set': {
+            'poll_seconds': timed(
+                lambda: (current_set - seen_set, seen_set - current_set)
+            ),
+            'bytes': allocated(lambda: set(seen_list)),
+        },
+        'UIDSet': {
+            'poll_seconds': timed(
+                lambda: (
+                    UIDSet.parse(sequence_set) - seen_uid_set,
+                    seen_uid_set - UIDSet.parse(sequence_set),
+                )
+            ),
+            'bytes': allocated(lambda: UIDSet(uids)),
+        },
+    }
+    print(f"{len(uids)} seen UIDs in {len(seen_uid_set.starts)} ranges, {args.new} new")
+    for name, result in results.items():
+        print(
+            f"{name:12} poll diff {result['poll_seconds'] * 1000:9.2f} ms   "
+            f"memory {result['bytes'] / 1e6:8.2f} MB"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,8 +4,6 @@ from .credentials import credentials_app
 from .config import config_app
 from .database import database_app
 from .classifier import classifier_app
-from .wizard import run_setup_wizard
-from .run import run_application
 
 app = typer.Typer(
     help="MailFox CLI - An intelligent email processing application",
@@ -38,11 +36,13 @@ app.add_typer(
 @app.command()
 def start() -> None:
     """Start the MailFox application."""
+    from .run import run_application
     run_application()
 
 @app.command()
 def init() -> None:
     """Initialize MailFox with an interactive setup wizard."""
+    from .wizard import run_setup_wizard
     run_setup_wizard()
 
 @app.callback()
@@ -1,23 +1,19 @@
 import typer
 from pathlib import Path
 import os
+from datetime import datetime
 from typing import Optional
-from ..core.config_manager import read_config
+from ..core.config_manager import read_config, save_config
 from ..core.auth import read_credentials
-from ..vector import VectorDatabase, EmbeddingFunctions
-from ..vector.classifiers.linear_svm import LinearSVMClassifier
-from ..vector.classifiers.logistic_regression import LogisticRegressionClassifier
-from ..vector.classifiers.mlp import MLPNeuralClassifier
-import numpy as np
+from ..vector import EmbeddingFunctions
+from ..vector.classifiers import (
+    CLASSIFIER_CLASSES,
+    EMBEDDING_FREE_CLASSIFIERS,
+    get_classifier_class,
+)
 
 classifier_app = typer.Typer(help="Manage email classifiers")
 
-CLASSIFIERS = {
-    "svm": LinearSVMClassifier,
-    "logistic": LogisticRegressionClassifier,
-    "mlp": MLPNeuralClassifier
-}
-
 def format_metrics(metrics: dict) -> str:
     """Format metrics for display."""
     if not metrics:
@@ -32,8 +28,30 @@ Metrics:
   • Training Data:
     - Total Samples: {metrics['num_samples']}
     - Number of Folders: {metrics['num_folders']}
+  • Parameters: {format_params(metrics.get('params', {}))}
 """
 
+def format_params(params: dict) -> str:
+    """Format classifier hyperparameters for display."""
+    return ' '.join(f"{key}={value}" for key, value in params.items()) or "(defaults)"
+
+def format_search_results(result: dict) -> str:
+    """Format the configurations scored by a classifier search, one line per round."""
+    lines = []
+    entries = sorted(
+        result['results'], key=lambda entry: (entry['round'], -entry['accuracy'])
+    )
+    for entry in entries:
+        marker = "*" if entry is result['best'] else " "
+        lines.append(
+            f"{marker} round {entry['round'] + 1} ({entry['samples']} vectors)  "
+            f"{entry['classifier']:8} {format_params(entry['params']):44} "
+            f"accuracy {entry['accuracy']:.2%} ±{entry['accuracy_std']:.2%}  "
+            f"fit {entry['fit_seconds']:.3f}s  "
+            f"predict {entry['predict_ms']:.3f} ms/email"
+        )
+    return '\n'.join(lines)
+
 @classifier_app.command("show")
 def show_classifier() -> None:
     """Display information about the current classifier."""
@@ -41,7 +59,7 @@ def show_classifier() -> None:
         config = read_config()
         classifier_type = config.get('default_classifier', 'svm')
         
-        if classifier_type not in CLASSIFIERS:
+        if classifier_type not in CLASSIFIER_CLASSES:
             typer.secho(
                 f"Invalid classifier type: {classifier_type}",
                 err=True,
@@ -64,7 +82,7 @@ def show_classifier() -> None:
             return
             
         # Load classifier and get metrics
-        classifier = CLASSIFIERS[classifier_type]()
+        classifier = get_classifier_class(classifier_type)()
         metrics = classifier.load_model(model_path)
         
         typer.echo("\nCurrent Classifier:")
@@ -130,30 +148,106 @@ def retrain_classifier(
         None,
         "--type",
         "-t", 
-        help="Type of classifier to train (svm or logistic)"
+        help=f"Type of classifier to train ({', '.join(CLASSIFIER_CLASSES)})"
     ),
     model_path: Optional[Path] = typer.Option(
         None,
         "--model-path",
         "-m",
         help="Path to save the trained model"
+    ),
+    search: bool = typer.Option(
+        False,
+        "--search",
+        help=(
+            "Cross-validate classifier types and regularization strengths and keep the "
+            "best"
+        )
+    ),
+    grid: bool = typer.Option(
+        False,
+        "--grid",
+        help=(
+            "With --search, score every configuration on all the data instead of "
+            "successive halving"
+        )
+    ),
+    folds: int = typer.Option(
+        3,
+        "--folds",
+        help="Cross-validation folds for --search"
+    ),
+    jobs: int = typer.Option(
+        -1,
+        "--jobs",
+        "-j",
+        help="Parallel processes for --search (-1 for all cores)"
+    ),
+    tolerance: float = typer.Option(
+        0.01,
+        "--tolerance",
+        help=(
+            "With --search, accuracy a faster-predicting configuration may give up "
+            "against the most accurate"
+        )
+    ),
+    weighting: Optional[str] = typer.Option(
+        None,
+        "--weighting",
+        help=(
+            "Give every email or every folder equal weight, or weight every vector the "
+            "same (email, folder or none)"
+        )
+    ),
+    max_per_folder: Optional[int] = typer.Option(
+        None,
+        "--max-per-folder",
+        help="Randomly subsample folders with more training vectors than this"
+    ),
+    since: Optional[datetime] = typer.Option(
+        None,
+        "--since",
+        formats=["%Y-%m-%d"],
+        help="Only train on emails dated on or after this day (YYYY-MM-DD)"
+    ),
+    max_age: Optional[float] = typer.Option(
+        None,
+        "--max-age",
+        help="Only train on emails from the last this many days"
+    ),
+    half_life: Optional[float] = typer.Option(
+        None,
+        "--half-life",
+        help="Halve the training weight of emails every this many days of age"
     )
 ) -> None:
     """Retrain the classifier using the current email database."""
     try:
         config = read_config()
         
+        # With --search every type is tried unless one is given
+        search_types = [classifier_type] if classifier_type else None
+
         # Use config values if not specified 
         if classifier_type is None:
             classifier_type = config.get('default_classifier', 'svm')
             
-        if classifier_type not in CLASSIFIERS:
+        if classifier_type not in CLASSIFIER_CLASSES:
             typer.secho(
-                f"Invalid classifier type. Choose from: {', '.join(CLASSIFIERS.keys())}",
+                "Invalid classifier type. Choose from: "
+                f"{', '.join(CLASSIFIER_CLASSES.keys())}",
                 err=True,
                 fg=typer.colors.RED
             )
             return
+
+        if search and classifier_type in EMBEDDING_FREE_CLASSIFIERS and search_types:
+            typer.secho(
+                f"--search doesn't support the {classifier_type} classifier",
+                err=True,
+                fg=typer.colors.RED,
+            )
+            return
             
         if model_path is None:
             model_path = config.get('classifier_model_path')
@@ -162,9 +256,19 @@ def retrain_classifier(
             else:
                 model_path = os.path.expanduser(model_path)
 
+        # Emails dated before the window are left out of training entirely
+        from ..vector.training_set import recency_weights, training_since
+        if max_age is None:
+            max_age = config.get("training_max_age_days")
+        if half_life is None:
+            half_life = config.get("training_half_life_days")
+        window_start = training_since(max_age, since.timestamp() if since else None)
+        if window_start is not None:
+            start = datetime.fromtimestamp(window_start)
+            typer.echo(f"📅 Training on emails since {start:%Y-%m-%d %H:%M}")
+
         # Initialize vector database
         typer.echo("🔌 Connecting to vector database...")
-        db_path = Path(config["email_db_path"]).expanduser()
         openai_api_key = None
         if config["default_embedding_function"] == EmbeddingFunctions.OPENAI:
             typer.echo("🔑 Loading OpenAI credentials...")
@@ -176,33 +280,84 @@ def retrain_classifier(
                 typer.secho(f"Error reading credentials: {e}", err=True, fg=typer.colors.RED)
                 return
 
-        vector_db = VectorDatabase(
-            db_path=str(db_path),
-            embedding_function=config["default_embedding_function"],
-            openai_api_key=openai_api_key
-        )
+        from ..core.database_manager import get_vector_db
+        vector_db = get_vector_db(openai_api_key)
 
-        # Get existing embeddings from database
-        typer.echo("📊 Loading embeddings from database...")
-        docs = vector_db.emails_collection.get(include=['embeddings', 'metadatas'])
-        
-        if not docs['embeddings']:
-            typer.secho("❌ No embeddings found in database", err=True, fg=typer.colors.RED)
-            return
-            
-        embeddings_array = np.array(docs['embeddings'])
-        folders = [metadata['folder'] for metadata in docs['metadatas']]
-        
-        typer.echo(f"✨ Loaded {len(embeddings_array)} embeddings from {len(set(folders))} folders")
+        if classifier_type in EMBEDDING_FREE_CLASSIFIERS and not search:
+            # Trained on the stored emails' headers and text, without any embeddings
+            typer.echo("📊 Loading emails from database...")
+            training_data, folders = vector_db.get_training_emails(since=window_start)
+            weights = None
+            if half_life:
+                weights = recency_weights(
+                    [mail.date_ts for mail in training_data], half_life
+                )
+
+            if not folders:
+                typer.secho(
+                    "❌ No emails found in database", err=True, fg=typer.colors.RED
+                )
+                return
+
+            typer.echo(
+                f"✨ Loaded {len(training_data)} emails from {len(set(folders))} folders"
+            )
+        else:
+            # Get existing embeddings from database
+            typer.echo("📊 Loading embeddings from database...")
+            from ..vector.training_set import training_set_options
+            options = training_set_options(config)
+            if weighting is not None:
+                options['weighting'] = weighting
+            if max_per_folder is not None:
+                options['max_per_folder'] = max_per_folder
+            options['half_life_days'] = half_life
+            training_data, folders, weights = vector_db.get_training_set(
+                since=window_start, **options
+            )
+
+            if not folders:
+                typer.secho(
+                    "❌ No embeddings found in database", err=True, fg=typer.colors.RED
+                )
+                return
+
+            typer.echo(
+                f"✨ Loaded {len(training_data)} embeddings from "
+                f"{len(set(folders))} folders"
+            )
+
+        params = {}
+        if search:
+            from ..vector.classifiers.search import search_classifiers
+            strategy = 'grid' if grid else 'successive halving'
+            typer.echo(
+                f"🔎 Searching classifier configurations ({strategy}, {folds}-fold)..."
+            )
+            result = search_classifiers(
+                training_data,
+                folders,
+                sample_weight=weights,
+                classifiers=search_types,
+                folds=folds,
+                n_jobs=jobs,
+                tolerance=tolerance,
+                halving=not grid
+            )
+            typer.echo(format_search_results(result))
+            best = result['best']
+            classifier_type, params = best['classifier'], best['params']
+            typer.echo(f"🏆 Selected {classifier_type} {format_params(params)}")
 
         # Initialize and train classifier
-        clf = CLASSIFIERS[classifier_type]()
+        clf = get_classifier_class(classifier_type)(**params)
         with typer.progressbar(
             length=100,
             label=f"🧠 Training {classifier_type} classifier"
         ) as progress:
-            metrics = clf.fit(embeddings_array, folders)
+            metrics = clf.fit(training_data, folders, sample_weight=weights)
             progress.update(100)
+        metrics['params'] = params
 
         # Save model with metrics
         typer.echo("\n💾 Saving trained model...")
@@ -213,9 +368,54 @@ def retrain_classifier(
         typer.echo(f"\n🎉 Successfully trained {classifier_type} classifier and saved to {model_path}")
         typer.echo(format_metrics(metrics))
 
+        if search and classifier_type != config.get('default_classifier'):
+            config['default_classifier'] = classifier_type
+            save_config(config)
+            typer.echo(f"Default classifier set to {classifier_type}")
+
     except Exception as e:
         typer.secho(
             f"❌ Error training classifier: {str(e)}",
             err=True,
             fg=typer.colors.RED
         )
+
+@classifier_app.command("rules")
+def show_rules(
+    rebuild: bool = typer.Option(
+        False,
+        "--rebuild",
+        help="Recount the rules from the email database first"
+    )
+) -> None:
+    """Display the learned sender rules that bypass the classifier."""
+    try:
+        try:
+            _, _, api_key = read_credentials()
+        except FileNotFoundError:
+            api_key = None
+        from ..core.database_manager import get_vector_db
+        vector_db = get_vector_db(api_key)
+
+        if rebuild:
+            typer.echo("🔄 Rebuilding sender rules...")
+            vector_db.sender_rules.rebuild()
+
+        rules = vector_db.sender_rules.rules()
+        typer.echo("\nSender Rules:")
+        typer.echo("=============")
+        if not rules:
+            typer.echo("No sender rules learned yet.")
+            return
+        for key_type, key, folder, support, purity in rules:
+            typer.echo(
+                f"{key_type:8} {key} -> {folder} "
+                f"({support} emails, {purity:.0%} pure)"
+            )
+
+    except Exception as e:
+        typer.secho(
+            f"Error showing sender rules: {str(e)}",
+            err=True,
+            fg=typer.colors.RED
+        )
@@ -4,6 +4,7 @@ from pathlib import Path
 import yaml
 from ..core.config_manager import save_config, read_config
 from ..vector import EmbeddingFunctions
+from ..vector.classifiers import CLASSIFIER_CLASSES
 
 config_app = typer.Typer(help="Manage MailFox configuration")
 
@@ -12,8 +13,36 @@ DEFAULT_CONFIG = {
     "default_classifier": "svm",
     "default_embedding_function": EmbeddingFunctions.SENTENCE_TRANSFORMER.value,
     "check_interval": 300,
+    "poll_max_interval": 3600,
     "enable_uid_validity": True,
-    "classifier_model_path": None
+    "classifier_model_path": None,
+    "near_duplicate_threshold": 0.9,
+    "sender_rule_min_support": 5,
+    "sender_rule_min_purity": 0.95,
+    "early_exit_confidence": None,
+    "sync_batch_size": 500,
+    "fetch_mode": "text",
+    "fetch_section_max_bytes": None,
+    "imap_compress": True,
+    "imap_keepalive_interval": 240,
+    "imap_reconnect_attempts": 5,
+    "strip_quotes_and_footers": True,
+    "footer_min_support": 3,
+    "reembed_workers": 4,
+    "training_dedup_threshold": 0.98,
+    "training_weighting": "email",
+    "training_max_per_folder": None,
+    "training_max_age_days": None,
+    "training_half_life_days": None,
+    "pipeline_fetch_workers": 1,
+    "pipeline_parse_workers": 2,
+    "pipeline_embed_workers": 1,
+    "pipeline_embed_batch_size": 64,
+    "pipeline_queue_size": 500,
+    "metrics_enabled": False,
+    "metrics_port": None,
+    "metrics_snapshot_path": None,
+    "metrics_snapshot_interval": 60
 }
 
 @config_app.command("set")
@@ -165,7 +194,7 @@ def reset_config() -> None:
         )
 
 # Valid classifier types
-VALID_CLASSIFIERS = ["svm", "logistic", "mlp"]
+VALID_CLASSIFIERS = list(CLASSIFIER_CLASSES)
 
 @config_app.command("validate")
 def validate_config() -> None:
@@ -3,20 +3,15 @@ from pathlib import Path
 import shutil
 from ..core.config_manager import read_config
 from ..core.auth import read_credentials
-from ..vector import VectorDatabase, EmbeddingFunctions
-from ..vector.classifiers.linear_svm import LinearSVMClassifier
-from ..vector.classifiers.logistic_regression import LogisticRegressionClassifier
-from ..vector.classifiers.mlp import MLPNeuralClassifier
-import numpy as np
+from ..vector import EmbeddingFunctions, SearchModes
+from ..vector.classifiers import (
+    CLASSIFIER_CLASSES,
+    EMBEDDING_FREE_CLASSIFIERS,
+    get_classifier_class,
+)
 
 database_app = typer.Typer(help="Manage email database")
 
-CLASSIFIERS = {
-    "svm": LinearSVMClassifier,
-    "logistic": LogisticRegressionClassifier,
-    "mlp": MLPNeuralClassifier
-}
-
 @database_app.command("create")
 def create_database(
     force: bool = typer.Option(
@@ -57,11 +52,8 @@ def create_database(
                 raise typer.Exit(1)
 
         # Initialize empty database
-        vector_db = VectorDatabase(
-            db_path=str(db_path),
-            embedding_function=config["default_embedding_function"],
-            openai_api_key=openai_api_key
-        )
+        from ..core.database_manager import get_vector_db
+        vector_db = get_vector_db(openai_api_key)
         
         typer.echo(f"✨ Created new email database at {db_path}")
 
@@ -78,7 +70,7 @@ def retrain_classifier(
         "svm",
         "--classifier",
         "-c",
-        help="Classifier to train (svm, logistic, or mlp)"
+        help=f"Classifier to train ({', '.join(CLASSIFIER_CLASSES)})"
     ),
     model_path: Path = typer.Option(
         None,
@@ -89,9 +81,10 @@ def retrain_classifier(
 ) -> None:
     """Retrain a classifier using the current email database."""
     try:
-        if classifier not in CLASSIFIERS:
+        if classifier not in CLASSIFIER_CLASSES:
             typer.secho(
-                f"Invalid classifier. Choose from: {', '.join(CLASSIFIERS.keys())}",
+                "Invalid classifier. Choose from: "
+                f"{', '.join(CLASSIFIER_CLASSES.keys())}",
                 err=True,
                 fg=typer.colors.RED
             )
@@ -99,7 +92,6 @@ def retrain_classifier(
 
         # Read configuration
         config = read_config()
-        db_path = Path(config["email_db_path"]).expanduser()
 
         # Get API key if needed
         openai_api_key = None
@@ -112,41 +104,50 @@ def retrain_classifier(
                 return
 
         # Initialize vector database
-        vector_db = VectorDatabase(
-            db_path=str(db_path),
-            embedding_function=config["default_embedding_function"],
-            openai_api_key=openai_api_key
-        )
+        from ..core.database_manager import get_vector_db
+        vector_db = get_vector_db(openai_api_key)
 
-        # Get all emails and their embeddings
-        emails = vector_db.get_all_emails()
-        if not emails:
-            typer.secho("No emails found in database", err=True, fg=typer.colors.RED)
-            return
-
-        # Get embeddings for all emails
-        all_embeddings = []
-        all_folders = []
-        for email in emails:
-            embeddings = vector_db.embed_paragraphs(email['paragraphs'])
-            if embeddings:
-                all_embeddings.extend(embeddings)
-                all_folders.extend([email['folder']] * len(embeddings))
+        # Stored vectors are only usable if they came from the configured model
+        if vector_db.embedding_model_changed():
+            typer.echo(
+                f"Embedding model changed from {vector_db.stored_embedding_model} to "
+                f"{vector_db.embedding_model}, reindexing stored emails..."
+            )
+            vector_db.reindex(workers=config.get("reembed_workers", 4))
 
-        if not all_embeddings:
+        from ..vector.training_set import (
+            recency_weights,
+            training_set_options,
+            training_since,
+        )
+        options = training_set_options(config)
+        window_start = training_since(config.get("training_max_age_days"))
+        if classifier in EMBEDDING_FREE_CLASSIFIERS:
+            training_data, all_folders = vector_db.get_training_emails(
+                since=window_start
+            )
+            weights = None
+            if options['half_life_days']:
+                weights = recency_weights(
+                    [mail.date_ts for mail in training_data], options['half_life_days']
+                )
+        else:
+            # Train on the stored vectors rather than re-embedding every email
+            training_data, all_folders, weights = vector_db.get_training_set(
+                since=window_start, **options
+            )
+        if not all_folders:
             typer.secho("No embeddings found", err=True, fg=typer.colors.RED)
             return
 
-        # Convert embeddings to numpy array
-        embeddings_array = np.array(all_embeddings)
-
         # Initialize and train classifier
-        clf = CLASSIFIERS[classifier]()
-        clf.fit(embeddings_array, all_folders)
+        clf = get_classifier_class(classifier)()
+        clf.fit(training_data, all_folders, sample_weight=weights)
 
         # Save model
         if model_path is None:
-            model_path = Path(config["clustering_path"]).parent / f"{classifier}_model.pkl"
+            model_dir = Path(config["clustering_path"]).parent
+            model_path = model_dir / f"{classifier}_model.npz"
         model_path.parent.mkdir(parents=True, exist_ok=True)
         clf.save_model(model_path)
 
@@ -159,6 +160,139 @@ def retrain_classifier(
             fg=typer.colors.RED
         )
 
+@database_app.command("reindex")
+def reindex_database(
+    status: bool = typer.Option(
+        False,
+        "--status",
+        help="Show the collections and reindex progress instead of reindexing"
+    ),
+    workers: int = typer.Option(
+        None,
+        "--workers",
+        "-w",
+        help="Concurrent embedding calls (default: reembed_workers from the config)"
+    )
+) -> None:
+    """Re-embed the database with the configured embedding model.
+
+    The running daemon keeps using the current embeddings until the new ones are
+    complete, then switches over. An interrupted reindex resumes where it stopped.
+    """
+    try:
+        config = read_config()
+
+        openai_api_key = None
+        try:
+            _, _, openai_api_key = read_credentials()
+        except FileNotFoundError:
+            if config["default_embedding_function"] == EmbeddingFunctions.OPENAI:
+                typer.secho(
+                    "OpenAI API key is required for OpenAI embeddings. "
+                    "Set it using 'mailfox credentials set'",
+                    err=True,
+                    fg=typer.colors.RED,
+                )
+                return
+
+        from ..core.database_manager import get_vector_db
+        vector_db = get_vector_db(openai_api_key)
+
+        if status:
+            for collection in vector_db.collection_status():
+                progress = ""
+                if collection['status'] == 'building':
+                    progress = (
+                        f", {collection['embedded']}/{collection['emails']} "
+                        "emails embedded"
+                    )
+                typer.echo(
+                    f"{collection['name']}: {collection['embedding_model']} "
+                    f"({collection['status']}{progress})"
+                )
+            return
+
+        if not vector_db.embedding_model_changed():
+            typer.echo(
+                f"Database is already embedded with {vector_db.embedding_model}."
+            )
+            return
+
+        typer.echo(
+            f"Reindexing from {vector_db.stored_embedding_model} to "
+            f"{vector_db.embedding_model}..."
+        )
+        vector_db.reindex(workers=workers or config.get("reembed_workers", 4))
+
+        # The classifier was trained on vectors of the old model
+        from ..core.email_processor import initialize_classifier
+        typer.echo(
+            f"Retraining the {config['default_classifier']} classifier on the new "
+            "embeddings..."
+        )
+        initialize_classifier(vector_db)
+
+        typer.echo(f"✨ Database reindexed with {vector_db.embedding_model}")
+
+    except Exception as e:
+        typer.secho(
+            f"Error reindexing database: {str(e)}",
+            err=True,
+            fg=typer.colors.RED
+        )
+
+@database_app.command("search")
+def search_database(
+    query: str = typer.Argument(
+        ...,
+        help="Text to search for"
+    ),
+    mode: SearchModes = typer.Option(
+        SearchModes.HYBRID,
+        "--mode",
+        help="Search mode: exact terms only, semantic similarity, or both fused"
+    ),
+    limit: int = typer.Option(
+        10,
+        "--limit",
+        "-n",
+        help="Maximum number of results"
+    )
+) -> None:
+    """Search the email database by exact terms and/or meaning."""
+    try:
+        config = read_config()
+
+        openai_api_key = None
+        if config["default_embedding_function"] == EmbeddingFunctions.OPENAI:
+            try:
+                _, _, api_key = read_credentials()
+                openai_api_key = api_key
+            except Exception as e:
+                typer.secho(
+                    f"Error reading credentials: {e}", err=True, fg=typer.colors.RED
+                )
+                return
+
+        from ..core.database_manager import get_vector_db
+        vector_db = get_vector_db(openai_api_key)
+
+        results = vector_db.search_emails(query, n_results=limit, mode=mode)
+        if not results:
+            typer.echo("No matching emails found.")
+            return
+
+        for result in results:
+            typer.echo(f"[{result['folder']}] {result['date']}  {result['from']}")
+            typer.echo(f"    {result['subject']}")
+
+    except Exception as e:
+        typer.secho(
+            f"Error searching database: {str(e)}",
+            err=True,
+            fg=typer.colors.RED
+        )
+
 @database_app.command("remove")
 def remove_database(
     force: bool = typer.Option(
@@ -1,23 +1,31 @@
 import typer
 import os
-from typing import Callable, Optional, Set
-import pandas as pd
-from ..core.email_processor import process_new_mail, initialize_classifier
+import queue
+from typing import Callable, List, Optional, Set
+from ..core.email_record import EmailRecord
+from ..core.email_processor import build_mail_pipeline, initialize_classifier
+from ..core import metrics
+from ..core.poll_scheduler import FolderPollScheduler
 from ..core.auth import read_credentials
 from ..core.config_manager import read_config
-from ..core.database_manager import get_vector_db, initialize_database
+from ..core.database_manager import SYNC_BATCH_SIZE, get_vector_db, initialize_database
 from ..email_interface import EmailHandler
+from ..email_interface.email_handler import handler_options
 from ..vector import VectorDatabase
 
 def process_folder_update(
     folder: str,
-    emails: pd.DataFrame,
+    emails: List[EmailRecord],
     vector_db: VectorDatabase,
     recache: bool = False,
     fetched_uids: Optional[Set[int]] = None,
-    current_uids: Optional[Set[int]] = None
+    current_uids: Optional[Set[int]] = None,
+    pipeline=None
 ) -> None:
-    """Process updates in a monitored folder."""
+    """
+    Process updates in a monitored folder, storing through the pipeline's embed stage if
+    given.
+    """
     try:
         # Store any fetched UIDs
         if fetched_uids:
@@ -25,13 +33,16 @@ def process_folder_update(
         elif current_uids:  # For new folders
             vector_db.add_seen_uids(current_uids, folder)
 
-        if not emails.empty:
+        if emails:
             if recache:
                 typer.echo(f"Recaching {len(emails)} emails in {folder}")
-                vector_db.store_emails(emails.to_dict(orient="records"))
             else:
                 typer.echo(f"Processing {len(emails)} new emails in {folder}")
-                vector_db.store_emails(emails.to_dict(orient="records"))
+            if pipeline is not None:
+                for mail in emails:
+                    pipeline.submit((mail, False), stage="embed")
+            else:
+                vector_db.store_emails(emails)
     except Exception as e:
         typer.secho(
             f"Error processing folder {folder} update: {str(e)}",
@@ -39,18 +50,45 @@ def process_folder_update(
             fg=typer.colors.RED
         )
 
+def start_metrics(config: dict, stop_event) -> None:
+    """Enable metrics collection and start the configured exporters."""
+    if not config.get("metrics_enabled", False):
+        return
+    metrics.enable()
+
+    port = config.get("metrics_port")
+    if port:
+        metrics.start_http_server(int(port))
+        typer.echo(f"Serving metrics at http://127.0.0.1:{port}/metrics")
+
+    snapshot_path = config.get("metrics_snapshot_path")
+    if snapshot_path:
+        metrics.start_snapshot_writer(
+            snapshot_path, config.get("metrics_snapshot_interval", 60), stop_event
+        )
+        typer.echo(f"Writing metrics snapshots to {snapshot_path}")
+
 def run_application() -> None:
     """Run the main MailFox application."""
-    email_handler = None
+    # Every session opened, including one per pipeline worker, closed on the way out
+    handlers = []
     try:
         # Initialize components
         username, password, api_key = read_credentials()
         config = read_config()
-        email_handler = EmailHandler(username, password)
         vector_db = get_vector_db(api_key)
         
         if vector_db is None:
             return
+
+        def connect():
+            handler = EmailHandler(username, password, **handler_options(config))
+            # The footers learned by the initial sync, frozen
+            if handler.text_cleaner is not None:
+                handler.text_cleaner.load_footers(vector_db.get_sender_footers())
+            handlers.append(handler)
+            return handler
+        email_handler = connect()
             
         # Initialize classifier if needed
         model_path = config.get('classifier_model_path')
@@ -71,8 +109,10 @@ def run_application() -> None:
         all_folders = email_handler.get_subfolders(classification_folders)
         typer.echo(f"Monitoring folders: {', '.join(all_folders)}")
         
-        # Initialize database if empty
-        initialize_database(email_handler, vector_db, all_folders)
+        # Download any emails the database doesn't have yet, resuming an
+        # interrupted sync
+        batch_size = config.get("sync_batch_size", SYNC_BATCH_SIZE)
+        initialize_database(email_handler, vector_db, all_folders, batch_size)
         
         # Initialize folder UIDs from seen UIDs in database
         folder_uids = vector_db.get_seen_uids()
@@ -80,30 +120,87 @@ def run_application() -> None:
         # Start monitoring for new emails and UID validity changes
         check_interval = config.get("check_interval", 300)
         enable_uid_validity = config.get("enable_uid_validity", True)
+        # Folders that rarely change are polled less often, down to once per
+        # poll_max_interval
+        scheduler = FolderPollScheduler(
+            check_interval, config.get("poll_max_interval", 3600)
+        )
+
+        # Fetching, parsing, embedding, storing and moving run as concurrent stages
+        seen_updates = queue.SimpleQueue()
+        released = queue.SimpleQueue()
+        pipeline = build_mail_pipeline(
+            email_handler,
+            connect,
+            vector_db,
+            config,
+            seen_updates,
+            released
+        )
+        pipeline.start()
+        start_metrics(config, pipeline.stop_event)
+        # Unseen inbox UIDs handed to the pipeline during this run, so they aren't
+        # queued twice. UIDs the pipeline failed on are released to be queued again.
+        submitted_uids = set()
         
         typer.echo(f"Starting email monitoring (checking every {check_interval} seconds)")
         try:
             while not email_handler.stop_event.is_set():
-                # First check inbox
-                process_new_mail("INBOX", email_handler, vector_db)
+                # Start serving a collection swapped in by `mailfox database reindex`
+                try:
+                    vector_db.refresh_active_collection()
+                except Exception as e:
+                    typer.secho(
+                        f"Error switching to the reindexed collection: {e}",
+                        err=True,
+                        fg=typer.colors.RED,
+                    )
+
+                # Pick up the destination UIDs of emails the pipeline moved
+                while not seen_updates.empty():
+                    folder, uids = seen_updates.get()
+                    if folder in folder_uids:
+                        folder_uids[folder].update(uids)
+
+                while not released.empty():
+                    submitted_uids.difference_update(released.get())
+
+                # First queue new inbox mail
+                unseen_uids = email_handler.search("INBOX", ["UNSEEN"])
+                # Mail that was moved out of the inbox or read is done with, which keeps
+                # the set no larger than the unseen inbox
+                submitted_uids.intersection_update(unseen_uids)
+                new_uids = [uid for uid in unseen_uids if uid not in submitted_uids]
+                if new_uids:
+                    typer.echo(
+                        f"{len(new_uids)} new emails detected in INBOX. Processing..."
+                    )
+                for uid in new_uids:
+                    pipeline.submit({"folder": "INBOX", "uid": uid, "classify": True})
+                    submitted_uids.add(uid)
                 
                 # Then poll folders
                 email_handler.poll_folders(
                     folders=all_folders,
                     folder_uids=folder_uids,
                     callback=lambda folder, emails, recache=False, fetched_uids=None, current_uids=None: process_folder_update(
-                        folder, emails, vector_db, recache, fetched_uids, current_uids
+                        folder, emails, vector_db, recache, fetched_uids,
+                        current_uids, pipeline
                     ),
-                    enable_uid_validity=enable_uid_validity
+                    enable_uid_validity=enable_uid_validity,
+                    scheduler=scheduler
                 )
+
+                typer.echo(f"Pipeline: {pipeline.format_stats()}")
                 
                 # Wait before next iteration
                 email_handler.stop_event.wait(check_interval)
         except KeyboardInterrupt:
             typer.echo("\nShutting down gracefully...")
         finally:
-            if email_handler:
-                email_handler.stop_event.set()
+            pipeline.stop()
+            # Store the chunks that progressive classification left for later
+            vector_db.flush_deferred()
                 
     except Exception as e:
         typer.secho(
@@ -111,5 +208,6 @@ def run_application() -> None:
             err=True,
             fg=typer.colors.RED
         )
-        if email_handler:
-            email_handler.stop_event.set()
+    finally:
+        for handler in handlers:
+            handler.close()
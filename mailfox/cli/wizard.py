@@ -3,7 +3,7 @@ import click
 from typing import Optional, List
 from ..core.auth import save_credentials
 from ..core.config_manager import save_config
-from ..core.database_manager import get_vector_db, initialize_database
+from ..core.database_manager import SYNC_BATCH_SIZE, get_vector_db, initialize_database
 from ..email_interface import EmailHandler
 from ..vector import EmbeddingFunctions
 import os
@@ -102,13 +102,15 @@ def _handle_initial_download(
         return
         
     try:
-        email_handler = EmailHandler(username, password)
+        from ..email_interface.email_handler import handler_options
+        email_handler = EmailHandler(username, password, **handler_options(config))
         vector_db = get_vector_db(api_key)
         
         folders = config["flagged_folders"]
         typer.echo(f"Downloading emails from folders: {', '.join(folders)}")
         
-        initialize_database(email_handler, vector_db, folders)
+        batch_size = config.get("sync_batch_size", SYNC_BATCH_SIZE)
+        initialize_database(email_handler, vector_db, folders, batch_size)
                 
     except Exception as e:
         typer.secho(
@@ -1,34 +1,93 @@
 from typing import Dict, Set, List
+import datetime
 import os
+import time
 import typer
 from ..vector import VectorDatabase
+from ..vector.database import get_vector_database
 from ..email_interface import EmailHandler
 from .config_manager import read_config
+from .uid_set import UIDSet
 
-def initialize_database(email_handler: EmailHandler, vector_db: VectorDatabase, folders: List[str]) -> None:
-    """Initialize the vector database with emails from all folders."""
-    if not vector_db.is_emails_empty():
-        typer.echo("Database already contains emails. Skipping initialization.")
-        return
+# Emails stored per checkpoint of the initial sync
+SYNC_BATCH_SIZE = 500
 
-    typer.echo("Email database is empty. Downloading all emails...")
+def initialize_database(
+    email_handler: EmailHandler,
+    vector_db: VectorDatabase,
+    folders: List[str],
+    batch_size: int = SYNC_BATCH_SIZE
+) -> None:
+    """
+    Download every email in the folders into the vector database.
+
+    Each batch of `batch_size` emails is stored and then checkpointed, so an
+    interrupted sync resumes where it stopped and only fetches the UIDs that were never
+    checkpointed. Folders whose sync completed are skipped; later changes are picked up
+    by the poller.
+
+    This is the only time the handler's TextCleaner learns senders' footers. It
+    continues from the counts stored by an interrupted sync, checkpoints them with every
+    batch and leaves them frozen when the sync ends.
+    """
+    cleaner = email_handler.text_cleaner
+    if cleaner is not None:
+        cleaner.load_footers(vector_db.get_sender_footers())
+        cleaner.learning = True
+    try:
+        _sync_folders(email_handler, vector_db, folders, batch_size)
+    finally:
+        if cleaner is not None:
+            cleaner.learning = False
+
+def _sync_folders(email_handler, vector_db, folders, batch_size):
+    cleaner = email_handler.text_cleaner
     for folder in folders:
-        emails, all_uids = email_handler.get_mail(
-            filter="all",
-            folders=[folder],
-            return_dataframe=True,
-            return_uids=True
-        )
-        if not emails.empty:
-            typer.echo(f"Storing {len(emails)} emails from {folder}")
-            vector_db.store_emails(emails.to_dict(orient="records"))
-        
-        # Store all UIDs from the folder
-        for folder_name, uids in all_uids.items():
-            vector_db.add_seen_uids(uids, folder_name)
+        checkpoint = vector_db.get_sync_checkpoint(folder)
+        if checkpoint and checkpoint['completed']:
+            continue
+
+        uidvalidity, uids = email_handler.list_uids(folder)
+        if checkpoint and checkpoint['uidvalidity'] != uidvalidity:
+            typer.echo(f"UID validity changed for {folder}, restarting its sync")
+            vector_db.reset_sync_checkpoint(folder, uidvalidity)
+            checkpoint = None
+
+        seen = vector_db.get_seen_uids().get(folder, UIDSet())
+        missing = (uids - seen).to_array().tolist()
+        if not missing:
+            vector_db.record_sync_batch(folder, uidvalidity, [], completed=True)
+            continue
+
+        if checkpoint:
+            typer.echo(
+                f"Resuming sync of {folder}: {len(missing)} of {len(uids)} emails left"
+            )
+        else:
+            typer.echo(f"Downloading {len(missing)} emails from {folder}")
+
+        start = time.monotonic()
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            emails = email_handler.fetch_mail(folder, batch, select=False)
+            if emails:
+                vector_db.store_emails(emails)
+            done = i + len(batch)
+            vector_db.record_sync_batch(
+                folder, uidvalidity, batch, completed=done == len(missing),
+                footers=cleaner.take_footer_changes() if cleaner is not None else None
+            )
+
+            rate = done / (time.monotonic() - start)
+            left = len(missing) - done
+            eta = datetime.timedelta(seconds=round(left / rate)) if rate else "unknown"
+            typer.echo(
+                f"{folder}: {done}/{len(missing)} emails "
+                f"({rate:.1f} emails/s, ETA {eta})"
+            )
 
 def get_vector_db(api_key: str = None) -> VectorDatabase:
-    """Initialize and return the vector database."""
+    """Return the configured vector database, shared by every caller in the process."""
     try:
         config = read_config()
         email_db_path = os.path.expanduser(config["email_db_path"])
@@ -37,10 +96,13 @@ def get_vector_db(api_key: str = None) -> VectorDatabase:
         os.makedirs(email_db_path, exist_ok=True)
         
         # Initialize vector database
-        vector_db = VectorDatabase(
-            db_path=email_db_path,
+        vector_db = get_vector_database(
+            email_db_path,
             embedding_function=config["default_embedding_function"],
             openai_api_key=api_key,
+            near_duplicate_threshold=config.get("near_duplicate_threshold", 0.9),
+            sender_rule_min_support=config.get("sender_rule_min_support", 5),
+            sender_rule_min_purity=config.get("sender_rule_min_purity", 0.95),
         )
         
         if vector_db.is_emails_empty():
@@ -1,22 +1,24 @@
 from collections import Counter
+import threading
 import typer
-from ..vector.classifiers.linear_svm import LinearSVMClassifier
-from ..vector.classifiers.logistic_regression import LogisticRegressionClassifier
+from ..vector.classifiers import (
+    CLASSIFIER_CLASSES,
+    EMBEDDING_FREE_CLASSIFIERS,
+    get_classifier_class,
+)
+from ..vector.training_set import recency_weights, training_set_options, training_since
 from ..core.config_manager import read_config
+from ..email_interface.email_handler import FETCH_BATCH_SIZE
+from .pipeline import Pipeline, Stage
+from . import metrics
 import os
-import numpy as np
-
-CLASSIFIERS = {
-    "svm": LinearSVMClassifier,
-    "logistic": LogisticRegressionClassifier
-}
 
 def initialize_classifier(vector_db):
     """Initialize and save a new classifier model."""
     config = read_config()
     classifier_type = config.get('default_classifier', 'svm')
     
-    if classifier_type not in CLASSIFIERS:
+    if classifier_type not in CLASSIFIER_CLASSES:
         typer.secho(f"Invalid classifier type: {classifier_type}", err=True, fg=typer.colors.RED)
         return None
         
@@ -26,14 +28,23 @@ def initialize_classifier(vector_db):
     else:
         model_path = os.path.expanduser(model_path)
     
-    # Get all pre-calculated embeddings and their metadata from the vector database
-    docs = vector_db.emails_collection.get(include=['embeddings', 'metadatas'])
-    all_embeddings = np.array(docs['embeddings'])
-    folders = [metadata['folder'] for metadata in docs['metadatas']]
-    
-    # Create and fit new classifier model
-    classifier = CLASSIFIERS[classifier_type]()
-    classifier.fit(all_embeddings, folders=folders)
+    classifier = get_classifier_class(classifier_type)()
+    options = training_set_options(config)
+    window_start = training_since(config.get('training_max_age_days'))
+    if classifier_type in EMBEDDING_FREE_CLASSIFIERS:
+        emails, folders = vector_db.get_training_emails(since=window_start)
+        weights = None
+        if options['half_life_days']:
+            weights = recency_weights(
+                [mail.date_ts for mail in emails], options['half_life_days']
+            )
+        classifier.fit(emails, folders=folders, sample_weight=weights)
+    else:
+        # Get all pre-calculated embeddings and their metadata from the vector database
+        all_embeddings, folders, weights = vector_db.get_training_set(
+            since=window_start, **options
+        )
+        classifier.fit(all_embeddings, folders=folders, sample_weight=weights)
     
     # Save the model
     classifier.save_model(model_path)
@@ -44,7 +55,7 @@ def get_classifier():
     config = read_config()
     classifier_type = config.get('default_classifier', 'svm')
     
-    if classifier_type not in CLASSIFIERS:
+    if classifier_type not in CLASSIFIER_CLASSES:
         typer.secho(f"Invalid classifier type: {classifier_type}", err=True, fg=typer.colors.RED)
         return None
         
@@ -54,47 +65,373 @@ def get_classifier():
     else:
         model_path = os.path.expanduser(model_path)
         
-    classifier = CLASSIFIERS[classifier_type]()
+    classifier = get_classifier_class(classifier_type)()
     classifier.load_model(model_path)
     return classifier
 
-def process_new_mail(folder, email_handler, vector_db):
+def process_new_mail(folder, email_handler, vector_db, folder_uids=None):
     """Process new emails in a folder."""
     try:
-        new_emails = email_handler.get_mail(filter="unseen", folders=[folder], return_dataframe=True)
-        if not new_emails.empty:
+        new_emails = email_handler.get_mail(filter="unseen", folders=[folder])
+        if new_emails:
             typer.echo(f"New emails detected in {folder}. Processing...")
-            vector_db.store_emails(new_emails.to_dict(orient="records"))
-            classify_emails(new_emails, vector_db, email_handler)
+            # Classify from the in-memory embeddings first, then store those same
+            # vectors
+            embedded = classify_emails(
+                new_emails, vector_db, email_handler, folder_uids=folder_uids,
+                confidence_threshold=read_config().get("early_exit_confidence")
+            )
+            # Emails the classifier moved were filed by mailfox, not by the user
+            auto_filed = {mail.uuid for mail in new_emails if mail.folder != folder}
+            vector_db.store_emails(new_emails, embedded, auto_filed=auto_filed)
         else:
             typer.echo(f"No new emails in {folder}.")
     except Exception as e:
         typer.secho(f"Error processing new mail in folder {folder}: {e}", err=True, fg=typer.colors.RED)
 
-def classify_emails(new_emails, vector_db, email_handler):
-    # Get classifier model
-    classifier = get_classifier()
-    if not classifier:
-        return
-    
-    for idx, mail in new_emails.iterrows():
+@metrics.timed("predict_folders")
+def predict_folders(
+    emails, vector_db, embedded=None, classifier=None, confidence_threshold=None
+):
+    """
+    Predict the destination folder of each email, keyed by uuid as (folder, source).
+
+    Senders covered by a learned rule are classified without any embedding, and so is
+    every email if the classifier works on EmailRecords (e.g. the hashed classifier).
+    The rest are classified from `embedded` (the result of `vector_db.embed_emails`),
+    which is computed here for just those emails if not given. `classifier` defaults to
+    the configured model.
+
+    With a `confidence_threshold`, classification is progressive: emails are first
+    classified from their first chunk, and only those whose confidence stays below the
+    threshold get more of their chunks embedded, in rounds that double the chunks
+    embedded so far. The chunks left over are embedded in the background once the emails
+    are stored.
+
+    Returns the predictions and the embeddings used.
+    """
+    # Predictions are keyed by the uuid the emails will be stored under
+    vector_db.resolve_uuids(emails)
+    predictions = {}
+    unmatched = []
+    for mail in emails:
+        # Senders that are always filed to the same folder skip the embedding model
+        # entirely
+        rule_folder = vector_db.sender_rules.lookup(mail.sender, mail.list_id)
+        if rule_folder:
+            predictions[mail.uuid] = (rule_folder, "sender rule")
+        else:
+            unmatched.append(mail)
+    metrics.increment("sender_rule_hits_total", len(emails) - len(unmatched))
+    metrics.increment("sender_rule_misses_total", len(unmatched))
+
+    if unmatched:
+        if classifier is None:
+            try:
+                classifier = get_classifier()
+            except Exception as e:
+                print(f"Error loading classifier: {e}")
+        if classifier is not None and not getattr(classifier, 'uses_embeddings', True):
+            for mail in unmatched:
+                try:
+                    predictions[mail.uuid] = (
+                        classifier.classify_email(mail),
+                        "classifier",
+                    )
+                except Exception as e:
+                    print(f"Classification failed for {mail.uuid}: {e}")
+            return predictions, embedded
+        if embedded is None:
+            progressive = (
+                [mail.uuid for mail in unmatched]
+                if confidence_threshold is not None
+                else ()
+            )
+            embedded = vector_db.embed_emails(unmatched, progressive=progressive)
+        pending = unmatched
+        while pending:
+            uncertain = []
+            for mail in pending:
+                try:
+                    # Slice the embeddings computed at ingest to this email's chunks
+                    if not classifier or mail.uuid not in embedded['offsets']:
+                        continue
+                    start, end = embedded['offsets'][mail.uuid]
+                    embeddings = list(embedded['embeddings'][start:end])
+
+                    if confidence_threshold is None:
+                        predictions[mail.uuid] = (
+                            classifier.classify_email(embeddings),
+                            "classifier",
+                        )
+                        continue
+                    folder, confidence = classifier.classify_with_confidence(embeddings)
+                    remaining = embedded.get('remaining', {}).get(mail.uuid)
+                    if confidence < confidence_threshold and remaining:
+                        uncertain.append(mail)
+                        continue
+                    if remaining:
+                        metrics.increment("early_exit_classifications_total")
+                    predictions[mail.uuid] = (folder, "classifier")
+                except Exception as e:
+                    print(f"Classification failed for {mail.uuid}: {e}")
+
+            if uncertain:
+                embedded = vector_db.embed_more(
+                    embedded,
+                    [mail.uuid for mail in uncertain],
+                    max_chunks=max(
+                        end - start
+                        for start, end in (
+                            embedded['offsets'][mail.uuid] for mail in uncertain
+                        )
+                    ),
+                )
+            pending = uncertain
+
+    return predictions, embedded
+
+def group_by_destination(emails, predictions):
+    """Group emails with a valid prediction by destination, as (mail, source) pairs."""
+    destinations = {}
+    for mail in emails:
+        predicted_folder, source = predictions.get(mail.uuid, (None, None))
+        if predicted_folder and predicted_folder != "UNKNOWN":
+            predicted_folder = predicted_folder.replace('"', '').strip()
+            destinations.setdefault(predicted_folder, []).append((mail, source))
+        else:
+            print(f"No valid folder prediction for email {mail.uuid}")
+    return destinations
+
+@metrics.timed("classify_emails")
+def classify_emails(
+    new_emails,
+    vector_db,
+    email_handler,
+    embedded=None,
+    folder_uids=None,
+    classifier=None,
+    confidence_threshold=None,
+):
+    """
+    Classify and move a list of new EmailRecords.
+
+    Moves are grouped so each destination folder costs a single MOVE round trip. Moved
+    emails get their new folder and UID written back into their records, and their UIDs
+    added to `folder_uids` (the poller's seen UIDs) when given. `confidence_threshold`
+    enables progressive classification (see `predict_folders`). Returns the embeddings
+    used so the caller can store the emails without embedding them again.
+    """
+    predictions, embedded = predict_folders(
+        new_emails, vector_db, embedded, classifier, confidence_threshold
+    )
+
+    destinations = group_by_destination(new_emails, predictions)
+    for predicted_folder, moved in destinations.items():
         try:
-            # Look up embeddings for this email's uuid in vector db
-            email_ids = [f"{mail['uuid']}_{i}" for i in range(len(mail['paragraphs']))]
-            email_docs = vector_db.emails_collection.get(
-                ids=email_ids,
-                include=['embeddings']
+            uid_map = email_handler.move_mail(
+                [mail.uid for mail, _ in moved], predicted_folder,
+                message_ids={mail.uid: mail.message_id for mail, _ in moved}
             )
-            embeddings = email_docs['embeddings']
-            
-            # Use the LRClassifier to predict the folder directly
-            predicted_folder = classifier.classify_email(embeddings)
-            
-            if predicted_folder and predicted_folder != "UNKNOWN":
-                email_handler.move_mail([mail['uid']], predicted_folder)
-                print(f"Moved email {mail['uuid']} to folder: {predicted_folder}")
-            else:
-                print(f"No valid folder prediction for email {mail['uuid']}")
-                
+            vector_db.record_moves(
+                {mail.uuid: uid_map.get(mail.uid) for mail, _ in moved},
+                predicted_folder,
+            )
+            if folder_uids is not None and predicted_folder in folder_uids:
+                folder_uids[predicted_folder].update(uid_map.values())
+
+            # The emails are stored after classification, so store them where they now
+            # live
+            for mail, source in moved:
+                mail.uid = uid_map.get(mail.uid)
+                mail.folder = predicted_folder
+                print(
+                    f"Moved email {mail.uuid} to folder: {predicted_folder} ({source})"
+                )
         except Exception as e:
-            print(f"Classification failed for {mail['uuid']}: {e}")
+            print(f"Moving {len(moved)} emails to {predicted_folder} failed: {e}")
+
+    return embedded
+
+def build_mail_pipeline(email_handler, connect, vector_db, config, seen_updates,
+                        released=None):
+    """
+    Build the daemon's fetch -> parse -> embed -> store/classify -> move pipeline.
+
+    Items enter the fetch stage as {'folder', 'uid', 'classify'} dicts, or the embed
+    stage as (EmailRecord, classify) pairs. Fetch and move workers each open their own
+    IMAP session with `connect()`, since a session can't be shared between threads;
+    `email_handler` is only used for parsing. UIDs of moved emails are put on
+    `seen_updates` as (folder, uids) for the poller to pick up. The source UIDs of
+    emails to classify that a stage failed on, that the server didn't return, or that
+    couldn't be moved, are put on `released` if given, so the poller can submit them
+    again. Emails that don't parse (no body, or broken headers) are given up on: parsing
+    them again would give the same result, so their UIDs stay submitted until the
+    email is read or moved out of the inbox.
+    """
+    local = threading.local()
+
+    def release(uids):
+        if released is not None and uids:
+            released.put(uids)
+
+    def releasing(handler, source_uids):
+        """Put the UIDs of a batch on `released` if `handler` fails on it."""
+        def run(items):
+            # Taken first, since the store stage clears the UIDs of emails it moves
+            uids = source_uids(items)
+            try:
+                return handler(items)
+            except Exception:
+                release(uids)
+                raise
+        return run
+    # Emails to classify are embedded progressively when set, see predict_folders
+    confidence_threshold = config.get("early_exit_confidence")
+    # Classifiers that don't use embeddings only need the first chunk before the move
+    classifier_type = config.get('default_classifier', 'svm')
+    embedding_free = classifier_type in EMBEDDING_FREE_CLASSIFIERS
+
+    def imap():
+        if not hasattr(local, 'email_handler'):
+            local.email_handler = connect()
+        return local.email_handler
+
+    def fetch(items):
+        outputs = []
+        by_folder = {}
+        for item in items:
+            by_folder.setdefault(item['folder'], []).append(item)
+        for folder, folder_items in by_folder.items():
+            raw = imap().fetch_raw(folder, [item['uid'] for item in folder_items])
+            missing = [item for item in folder_items if item['uid'] not in raw]
+            release(item_uids(missing))
+            for item in folder_items:
+                if item['uid'] in raw:
+                    raw_email, flags = raw[item['uid']]
+                    outputs.append({**item, 'raw': raw_email, 'flags': flags})
+        return outputs
+
+    def parse(items):
+        outputs = []
+        for item in items:
+            mail = email_handler.parse_raw(
+                item['uid'], item['folder'], item['raw'], item['flags']
+            )
+            if mail:
+                outputs.append((mail, item['classify']))
+        return outputs
+
+    def embed(items):
+        emails = [mail for mail, _ in items]
+        progressive = ()
+        if confidence_threshold is not None or embedding_free:
+            progressive = [mail.uuid for mail, classify in items if classify]
+        return [{
+            'emails': emails,
+            'classify': [classify for _, classify in items],
+            'embedded': vector_db.embed_emails(emails, progressive=progressive),
+        }]
+
+    def store_and_classify(batches):
+        outputs = []
+        for batch in batches:
+            to_classify = [
+                mail for mail, classify in zip(batch['emails'], batch['classify'])
+                if classify
+            ]
+            predictions, batch['embedded'] = predict_folders(
+                to_classify,
+                vector_db,
+                batch['embedded'],
+                confidence_threshold=confidence_threshold,
+            )
+
+            # Store under the predicted folder right away, the move stage fills in the
+            # new UIDs
+            auto_filed = set()
+            destinations = group_by_destination(to_classify, predictions)
+            for predicted_folder, moved in destinations.items():
+                moves = []
+                for mail, source in moved:
+                    moves.append(
+                        (mail.uuid, mail.folder, mail.uid, mail.message_id, source)
+                    )
+                    mail.folder = predicted_folder
+                    mail.uid = None
+                    auto_filed.add(mail.uuid)
+                outputs.append({'folder': predicted_folder, 'moves': moves})
+            vector_db.store_emails(
+                batch['emails'], batch['embedded'], auto_filed=auto_filed
+            )
+        return outputs
+
+    def move(items):
+        by_folders = {}
+        for item in items:
+            for uuid, source_folder, uid, message_id, source in item['moves']:
+                by_folders.setdefault((source_folder, item['folder']), []).append(
+                    (uuid, uid, message_id, source)
+                )
+        for (source_folder, folder), moves in by_folders.items():
+            try:
+                uid_map = imap().move_mail(
+                    [uid for _, uid, _, _ in moves], folder,
+                    source_folder=source_folder,
+                    message_ids={uid: message_id for _, uid, message_id, _ in moves}
+                )
+                vector_db.record_moves(
+                    {uuid: uid_map.get(uid) for uuid, uid, _, _ in moves}, folder
+                )
+                seen_updates.put((folder, set(uid_map.values())))
+                for uuid, _, _, source in moves:
+                    print(f"Moved email {uuid} to folder: {folder} ({source})")
+            except Exception as e:
+                print(f"Moving {len(moves)} emails to {folder} failed: {e}")
+                release([uid for _, uid, _, _ in moves])
+                # Point the stored emails back at where they still are
+                for uuid, uid, _, _ in moves:
+                    vector_db.restore_location(uuid, source_folder, uid)
+        return []
+
+    def item_uids(items):
+        return [item['uid'] for item in items if item['classify']]
+
+    def pair_uids(items):
+        return [mail.uid for mail, classify in items if classify]
+
+    def batch_uids(batches):
+        return [
+            mail.uid for batch in batches
+            for mail, classify in zip(batch['emails'], batch['classify']) if classify
+        ]
+
+    def move_uids(items):
+        return [uid for item in items for _, _, uid, _, _ in item['moves']]
+
+    queue_size = config.get("pipeline_queue_size", 500)
+    pipeline = Pipeline([
+        Stage("fetch", releasing(fetch, item_uids),
+              workers=config.get("pipeline_fetch_workers", 1), queue_size=queue_size,
+              batch_size=FETCH_BATCH_SIZE),
+        Stage("parse", releasing(parse, item_uids),
+              workers=config.get("pipeline_parse_workers", 2), queue_size=queue_size,
+              batch_size=16),
+        Stage("embed", releasing(embed, pair_uids),
+              workers=config.get("pipeline_embed_workers", 1), queue_size=queue_size,
+              batch_size=config.get("pipeline_embed_batch_size", 64)),
+        Stage("store", releasing(store_and_classify, batch_uids), workers=1,
+              queue_size=queue_size),
+        Stage("move", releasing(move, move_uids), workers=1, queue_size=queue_size,
+              batch_size=64),
+    ])
+
+    for stat in ("queue_depth", "processed", "errors", "throughput", "utilization"):
+        metrics.register_gauge(
+            f"pipeline_{stat}",
+            lambda stat=stat: {
+                name: stats[stat] for name, stats in pipeline.stats().items()
+            },
+            label="stage"
+        )
+    return pipeline
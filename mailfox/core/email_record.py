@@ -0,0 +1,141 @@
+import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+# Format of an email's display date, in the local time of ingestion. The display date
+# is part of an email's uuid, so its format and time zone can't change
+DISPLAY_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S"
+
+# Email dict keys that are Python keywords, and the attributes holding them
+_KEY_ATTRIBUTES = {'from': 'sender', 'to': 'recipient'}
+
+class EmailRecord():
+    """
+    A parsed email, as it moves from `EmailHandler` through classification to the
+    database.
+
+    The fields live in slots rather than a per-email dict, so a record costs a fixed,
+    small amount of memory and attribute access is a direct slot lookup. Records can
+    still be used like the email dicts they replace: `mail['from']`,
+    `mail.get('list_id')` and `to_dict()` all work, with the 'from' and 'to' keys
+    mapping to the `sender` and `recipient` attributes.
+    """
+    __slots__ = (
+        'uid',
+        'folder',
+        'uuid',
+        'sender',
+        'recipient',
+        'subject',
+        'date',
+        'date_ts',
+        'message_id',
+        'list_id',
+        'list_unsubscribe',
+        'paragraphs',
+        'raw_body',
+        'flags',
+    )
+
+    def __init__(
+        self,
+        uid: Optional[int] = None,
+        folder: Optional[str] = None,
+        uuid: Optional[str] = None,
+        sender: Optional[str] = None,
+        recipient: Optional[str] = None,
+        subject: Optional[str] = None,
+        date: Optional[str] = None,
+        date_ts: Optional[int] = None,
+        message_id: Optional[str] = None,
+        list_id: Optional[str] = None,
+        list_unsubscribe: Optional[str] = None,
+        paragraphs: Optional[List[str]] = None,
+        raw_body: Optional[str] = None,
+        flags: Optional[tuple] = None,
+    ):
+        self.uid = uid
+        self.folder = folder
+        self.uuid = uuid
+        self.sender = sender
+        self.recipient = recipient
+        self.subject = subject
+        self.date = date
+        # The date as UTC epoch seconds, which unlike the display string sorts and
+        # range-queries
+        self.date_ts = date_ts
+        self.message_id = message_id
+        self.list_id = list_id
+        self.list_unsubscribe = list_unsubscribe
+        self.paragraphs = paragraphs
+        self.raw_body = raw_body
+        self.flags = flags
+
+    @classmethod
+    def from_dict(cls, mail: Dict[str, Any]) -> "EmailRecord":
+        """A record from an email dict, ignoring keys that aren't fields."""
+        record = cls()
+        for key, value in mail.items():
+            attribute = _KEY_ATTRIBUTES.get(key, key)
+            if attribute in cls.__slots__:
+                setattr(record, attribute, value)
+        return record
+
+    @classmethod
+    def _attribute(cls, key: str) -> str:
+        attribute = _KEY_ATTRIBUTES.get(key, key)
+        if attribute not in cls.__slots__:
+            raise KeyError(key)
+        return attribute
+
+    def keys(self) -> List[str]:
+        """The fields' email dict keys, 'from' and 'to' for sender and recipient."""
+        return list(EMAIL_KEYS)
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, self._attribute(key))
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        setattr(self, self._attribute(key), value)
+
+    def __contains__(self, key: object) -> bool:
+        return key in EMAIL_KEYS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(EMAIL_KEYS)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The record as an email dict."""
+        return {
+            key: getattr(self, name) for key, name in zip(EMAIL_KEYS, self.__slots__)
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"EmailRecord(uuid={self.uuid!r}, folder={self.folder!r}, "
+            f"uid={self.uid!r}, subject={self.subject!r})"
+        )
+
+# The fields' email dict keys, in slot order
+EMAIL_KEYS = tuple(
+    {attribute: key for key, attribute in _KEY_ATTRIBUTES.items()}.get(name, name)
+    for name in EmailRecord.__slots__
+)
+
+def display_date(date_ts: int) -> str:
+    """The display date of UTC epoch seconds, in local time."""
+    return datetime.datetime.fromtimestamp(date_ts).strftime(DISPLAY_DATE_FORMAT)
+
+def display_date_timestamp(date: str) -> Optional[int]:
+    """UTC epoch seconds of a `display_date` string, or None if it doesn't parse."""
+    try:
+        local_date = datetime.datetime.strptime(date, DISPLAY_DATE_FORMAT)
+    except (TypeError, ValueError):
+        return None
+    # The string is naive local time, which astimezone assumes before converting
+    return int(local_date.astimezone(datetime.timezone.utc).timestamp())
@@ -0,0 +1,233 @@
+"""
+Lightweight timings and counters for the daemon's hot paths.
+
+Everything is a no-op until `enable()` is called, so instrumented functions only pay
+for a module-level flag check. Metrics can be served as Prometheus text on localhost or
+written as periodic JSON snapshots.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "mailfox_"
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+    float("inf"),
+)
+
+# Counter pairs reported together as a hit rate
+HIT_RATES = {
+    "embedding_cache": ("embedding_cache_hits_total", "embedding_cache_misses_total"),
+    "sender_rule": ("sender_rule_hits_total", "sender_rule_misses_total"),
+}
+
+_enabled = False
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_gauges = {}
+
+class Histogram():
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(BUCKETS, self.bucket_counts):
+            total += count
+            yield bound, total
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+def is_enabled() -> bool:
+    return _enabled
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def increment(name: str, value: float = 1) -> None:
+    """Add to a counter."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def observe(name: str, seconds: float) -> None:
+    """Record a latency in a histogram."""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+def timed(name: str):
+    """Decorator recording each call's latency in the `<name>_seconds` histogram."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(f"{name}_seconds", time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def register_gauge(name: str, read, label: str = None) -> None:
+    """
+    Register a gauge read at export time. `read` returns a number, or a dict of numbers
+    keyed by the value of `label` (e.g. per pipeline stage).
+    """
+    with _lock:
+        _gauges[name] = (read, label)
+
+def _read_gauges() -> dict:
+    with _lock:
+        gauges = dict(_gauges)
+    values = {}
+    for name, (read, label) in gauges.items():
+        try:
+            values[name] = (read(), label)
+        except Exception as e:
+            print(f"Error reading gauge {name}: {e}")
+    return values
+
+def snapshot() -> dict:
+    """All current metrics as a JSON-serializable dict."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {
+            name: {
+                'count': histogram.count,
+                'sum': histogram.sum,
+                'mean': histogram.sum / histogram.count if histogram.count else 0.0,
+                'buckets': {
+                    str(bound): count for bound, count in histogram.cumulative()
+                },
+            }
+            for name, histogram in _histograms.items()
+        }
+
+    hit_rates = {}
+    for name, (hits_name, misses_name) in HIT_RATES.items():
+        hits, misses = counters.get(hits_name, 0), counters.get(misses_name, 0)
+        if hits + misses:
+            hit_rates[name] = hits / (hits + misses)
+
+    return {
+        'timestamp': time.time(),
+        'counters': counters,
+        'histograms': histograms,
+        'hit_rates': hit_rates,
+        'gauges': {name: value for name, (value, _) in _read_gauges().items()},
+    }
+
+def prometheus_text() -> str:
+    """All current metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(
+            (name, list(h.cumulative()), h.sum, h.count)
+            for name, h in _histograms.items()
+        )
+
+    for name, value in counters:
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        lines.append(f"{PREFIX}{name} {value}")
+
+    for name, buckets, total, count in histograms:
+        lines.append(f"# TYPE {PREFIX}{name} histogram")
+        for bound, cumulative in buckets:
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{PREFIX}{name}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"{PREFIX}{name}_sum {total}")
+        lines.append(f"{PREFIX}{name}_count {count}")
+
+    for name, (value, label) in sorted(_read_gauges().items()):
+        lines.append(f"# TYPE {PREFIX}{name} gauge")
+        if isinstance(value, dict):
+            for label_value, number in value.items():
+                lines.append(f'{PREFIX}{name}{{{label}="{label_value}"}} {number}')
+        else:
+            lines.append(f"{PREFIX}{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('', '/metrics'):
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would otherwise flood the daemon's output
+        pass
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve Prometheus metrics at http://host:port/metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="mailfox-metrics-http", daemon=True
+    ).start()
+    return server
+
+def write_snapshot(path: str) -> None:
+    """Atomically write a JSON snapshot of all metrics."""
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp_path, path)
+
+def start_snapshot_writer(path: str, interval: float,
+                          stop_event: threading.Event) -> threading.Thread:
+    """Write a JSON snapshot every `interval` seconds until `stop_event` is set."""
+    def run():
+        stopped = False
+        while not stopped:
+            # One last snapshot is written on shutdown
+            stopped = stop_event.wait(interval)
+            try:
+                write_snapshot(path)
+            except Exception as e:
+                print(f"Error writing metrics snapshot: {e}")
+
+    thread = threading.Thread(target=run, name="mailfox-metrics-snapshot", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+class Stage():
+    """
+    One step of a Pipeline: a pool of worker threads fed by a bounded queue.
+
+    Workers take up to `batch_size` items at a time and pass them to `handler`, which
+    returns the items to hand to the next stage. A full downstream queue blocks the
+    workers, so a slow stage applies backpressure all the way up to the source.
+    """
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[list], Optional[list]],
+        *,
+        workers: int = 1,
+        queue_size: int = 100,
+        batch_size: int = 1,
+        batch_timeout: float = 0.2
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.downstream = None
+
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started_at = None
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def put(self, item, stop_event: threading.Event) -> bool:
+        """Queue an item, blocking while the queue is full. False if stopped first."""
+        while not stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _next_batch(self, stop_event: threading.Event) -> list:
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.batch_timeout
+        while len(batch) < self.batch_size and not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            batch = self._next_batch(stop_event)
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            outputs = []
+            failed = 0
+            try:
+                outputs = self.handler(batch) or []
+            except Exception as e:
+                print(f"Error in pipeline stage {self.name}: {e}")
+                failed = len(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+            with self._lock:
+                self.processed += len(batch) - failed
+                self.errors += failed
+                self.busy_seconds += time.perf_counter() - start
+
+            if self.downstream is not None:
+                for output in outputs:
+                    if not self.downstream.put(output, stop_event):
+                        return
+
+    def start(self, stop_event: threading.Event) -> None:
+        self._started_at = time.monotonic()
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._run,
+                args=(stop_event,),
+                name=f"mailfox-{self.name}-{i}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        """Queue depth, item counts and throughput of this stage since it started."""
+        with self._lock:
+            uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+            return {
+                'workers': self.workers,
+                'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'processed': self.processed,
+                'errors': self.errors,
+                'throughput': self.processed / uptime if uptime else 0.0,
+                # Fraction of the workers' wall time spent handling items, ~1.0 marks
+                # the bottleneck
+                'utilization': (
+                    self.busy_seconds / (uptime * self.workers) if uptime else 0.0
+                ),
+            }
+
+class Pipeline():
+    """A chain of Stages, each feeding the next, sharing one stop event."""
+    def __init__(self, stages: List[Stage],
+                 stop_event: Optional[threading.Event] = None):
+        self.stages = stages
+        self.stop_event = stop_event or threading.Event()
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.downstream = next_stage
+
+    def __getitem__(self, name: str) -> Stage:
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(name)
+
+    def submit(self, item, stage: Optional[str] = None) -> bool:
+        """Feed an item to the first stage, or skip earlier ones to the named stage."""
+        target = self[stage] if stage else self.stages[0]
+        return target.put(item, self.stop_event)
+
+    def start(self) -> None:
+        for stage in self.stages:
+            stage.start(self.stop_event)
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self.stop_event.set()
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def stats(self) -> dict:
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def format_stats(self) -> str:
+        """One-line summary of every stage's queue depth and throughput."""
+        parts = []
+        for name, stats in self.stats().items():
+            parts.append(
+                f"{name} q={stats['queue_depth']}/{stats['queue_size']} "
+                f"{stats['throughput']:.1f}/s {stats['utilization']:.0%} busy"
+            )
+        return " | ".join(parts)
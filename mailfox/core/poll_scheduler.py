@@ -0,0 +1,55 @@
+import time
+from typing import Callable, Dict, Iterable, List
+
+# A poll that finds a folder unchanged multiplies its interval by this
+BACKOFF_FACTOR = 2
+
+class FolderPollScheduler():
+    """
+    Decide which monitored folders are due for a poll, adapting each folder's interval
+    to how often it changes.
+
+    Every folder starts out polled every `min_interval` seconds. A poll whose STATUS
+    shows the folder unchanged multiplies its interval by BACKOFF_FACTOR, up to
+    `max_interval`, and one that finds a change resets it to `min_interval`. Folders
+    that receive mail are polled every round while dormant archives are checked rarely.
+    A folder is due up to half of `min_interval` early, so a daemon waking every
+    `min_interval` seconds doesn't skip rounds because of its own processing time.
+    """
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.clock = clock
+        self.intervals: Dict[str, float] = {}
+        self.next_due: Dict[str, float] = {}
+        self.statuses: Dict[str, dict] = {}
+
+    def due(self, folders: Iterable[str]) -> List[str]:
+        """The folders that should be polled now."""
+        now = self.clock()
+        cutoff = now + self.min_interval / 2
+        return [
+            folder for folder in folders if self.next_due.get(folder, now) <= cutoff
+        ]
+
+    def changed(self, folder: str, status: dict) -> bool:
+        """Whether `status` differs from the folder's status at its last poll."""
+        return self.statuses.get(folder) != status
+
+    def record(self, folder: str, status: dict, changed: bool) -> None:
+        """Remember a polled folder's status and schedule its next poll."""
+        if changed:
+            interval = self.min_interval
+        else:
+            interval = min(
+                self.intervals.get(folder, self.min_interval) * BACKOFF_FACTOR,
+                self.max_interval
+            )
+        self.statuses[folder] = status
+        self.intervals[folder] = interval
+        self.next_due[folder] = self.clock() + interval
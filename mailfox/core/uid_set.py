@@ -0,0 +1,155 @@
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+# One element of an IMAP sequence set: a UID or an inclusive UID range, in either order
+SEQUENCE_SET_ELEMENT = re.compile(r'(\d+)(?::(\d+))?')
+
+def _merge(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sort ranges and merge the ones that overlap or touch."""
+    if not len(starts):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    first = np.flatnonzero(np.r_[True, starts[1:] > reach[:-1] + 1])
+    return starts[first], reach[np.r_[first[1:] - 1, len(starts) - 1]]
+
+def _covered(starts: np.ndarray, ends: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Which points fall inside one of the sorted, disjoint ranges."""
+    started = np.searchsorted(starts, points, 'right')
+    return started > np.searchsorted(ends, points, 'left')
+
+class UIDSet():
+    """
+    A set of IMAP UIDs stored as sorted, disjoint, inclusive ranges.
+
+    A folder's UIDs mostly come in long consecutive runs, so even millions of them take
+    a handful of ranges. Union and difference are vectorized over the range boundaries,
+    never over the UIDs, and IMAP sequence sets such as '1:5000,5002' parse straight
+    into ranges.
+    """
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, uids: Iterable[int] = ()):
+        if isinstance(uids, UIDSet):
+            self.starts, self.ends = uids.starts, uids.ends
+            return
+        if isinstance(uids, np.ndarray):
+            array = np.unique(uids.astype(np.int64))
+        else:
+            array = np.unique(np.fromiter((int(uid) for uid in uids), dtype=np.int64))
+        breaks = np.flatnonzero(np.diff(array) != 1) + 1
+        self.starts = array[np.r_[0, breaks]] if len(array) else array
+        self.ends = array[np.r_[breaks - 1, len(array) - 1]] if len(array) else array
+
+    @classmethod
+    def from_ranges(cls, starts: Iterable[int], ends: Iterable[int]) -> 'UIDSet':
+        """The UIDs in the inclusive ranges starts[i]..ends[i], which may overlap."""
+        uid_set = cls()
+        uid_set.starts, uid_set.ends = _merge(
+            np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+        )
+        return uid_set
+
+    @classmethod
+    def parse(cls, sequence_set: str) -> 'UIDSet':
+        """Parse an IMAP sequence set such as '1:5000,5002'. '*' isn't supported."""
+        if isinstance(sequence_set, bytes):
+            sequence_set = sequence_set.decode('ascii')
+        elements = sequence_set.strip().split(',') if sequence_set.strip() else []
+        bounds = []
+        for element in elements:
+            match = SEQUENCE_SET_ELEMENT.fullmatch(element)
+            if match is None:
+                raise ValueError(f"Invalid UID sequence set element: {element!r}")
+            bounds.append((int(match.group(1)), int(match.group(2) or match.group(1))))
+        bounds = np.array(bounds, dtype=np.int64).reshape(-1, 2)
+        return cls.from_ranges(bounds.min(axis=1), bounds.max(axis=1))
+
+    def ranges(self) -> List[Tuple[int, int]]:
+        """The inclusive (first, last) UID ranges, in order."""
+        return list(zip(self.starts.tolist(), self.ends.tolist()))
+
+    def to_array(self) -> np.ndarray:
+        """Every UID, sorted."""
+        lengths = self.ends - self.starts + 1
+        offsets = np.arange(lengths.sum())
+        offsets -= np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(self.starts, lengths) + offsets
+
+    def contains(self, uids: Iterable[int]) -> np.ndarray:
+        """Which of `uids` are in the set, as a boolean array."""
+        if not isinstance(uids, np.ndarray):
+            uids = np.fromiter((int(uid) for uid in uids), dtype=np.int64)
+        return _covered(self.starts, self.ends, uids)
+
+    def union(self, other: Iterable[int]) -> 'UIDSet':
+        other = UIDSet(other)
+        return UIDSet.from_ranges(
+            np.concatenate([self.starts, other.starts]),
+            np.concatenate([self.ends, other.ends]),
+        )
+
+    def difference(self, other: Iterable[int]) -> 'UIDSet':
+        other = UIDSet(other)
+        if not self or not other:
+            return UIDSet(self)
+        # Every point where either set's membership can change, as a segment start
+        points = np.unique(
+            np.concatenate([self.starts, self.ends + 1, other.starts, other.ends + 1])
+        )
+        keep = np.flatnonzero(
+            _covered(self.starts, self.ends, points)
+            & ~_covered(other.starts, other.ends, points)
+        )
+        return UIDSet.from_ranges(points[keep], points[keep + 1] - 1)
+
+    def update(self, uids: Iterable[int]) -> None:
+        """Add UIDs in place."""
+        merged = self.union(uids)
+        self.starts, self.ends = merged.starts, merged.ends
+
+    def min(self) -> int:
+        return int(self.starts[0])
+
+    def max(self) -> int:
+        return int(self.ends[-1])
+
+    __or__ = union
+    __sub__ = difference
+
+    def __contains__(self, uid) -> bool:
+        i = int(np.searchsorted(self.starts, int(uid), 'right')) - 1
+        return i >= 0 and int(uid) <= self.ends[i]
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in self.ranges():
+            yield from range(start, end + 1)
+
+    def __len__(self) -> int:
+        return int((self.ends - self.starts + 1).sum())
+
+    def __bool__(self) -> bool:
+        return len(self.starts) > 0
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, UIDSet):
+            if not isinstance(other, (set, frozenset)):
+                return NotImplemented
+            other = UIDSet(other)
+        return (
+            np.array_equal(self.starts, other.starts)
+            and np.array_equal(self.ends, other.ends)
+        )
+
+    def __str__(self) -> str:
+        """The IMAP sequence set, e.g. '1:5000,5002'."""
+        return ','.join(
+            f"{start}:{end}" if end > start else str(start)
+            for start, end in self.ranges()
+        )
+
+    def __repr__(self) -> str:
+        return f"UIDSet('{self}')"
@@ -1,2 +1,12 @@
-from .email_handler import EmailHandler
-from .email_gen_ai import EmailLLM
\ No newline at end of file
+# EmailHandler pulls in bs4 and imapclient, and EmailLLM the OpenAI client, so both
+# are imported on first use rather than with the package
+_LAZY_ATTRIBUTES = {
+    "EmailHandler": ".email_handler",
+    "EmailLLM": ".email_gen_ai",
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
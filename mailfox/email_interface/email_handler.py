@@ -1,28 +1,144 @@
 import os
-import datetime
 import email
 import hashlib
 from email.header import decode_header
-import pandas as pd
 import re
 from bs4 import BeautifulSoup
 from tqdm.auto import tqdm
 import time
-from imapclient import IMAPClient
 from threading import Thread, Event
+from ..core import metrics
+from ..core.email_record import EmailRecord, display_date
+from ..core.uid_set import UIDSet
+from .session import KEEPALIVE_INTERVAL, RECONNECT_ATTEMPTS, IMAPSession
+from .text_cleaner import FOOTER_MIN_SUPPORT, TextCleaner
 
+# Number of messages requested per FETCH command
+FETCH_BATCH_SIZE = 50
+
+# STATUS items that change whenever a folder gains, loses or (un)reads messages
+POLL_STATUS_ITEMS = ('UIDNEXT', 'UIDVALIDITY', 'MESSAGES', 'UNSEEN')
+
+# "full" downloads whole messages, "text" only their headers and text parts (see
+# fetch_text)
+FETCH_MODES = ("full", "text")
+
+def handler_options(config):
+    """The EmailHandler options set in the config."""
+    return {
+        'fetch_mode': config.get("fetch_mode", "text"),
+        'section_max_bytes': config.get("fetch_section_max_bytes"),
+        'compress': config.get("imap_compress", True),
+        'keepalive_interval': config.get("imap_keepalive_interval", KEEPALIVE_INTERVAL),
+        'reconnect_attempts': config.get("imap_reconnect_attempts", RECONNECT_ATTEMPTS),
+        'clean_text': config.get("strip_quotes_and_footers", True),
+        'footer_min_support': config.get("footer_min_support", FOOTER_MIN_SUPPORT),
+    }
+
+def _text_sections(structure):
+    """
+    Return the (section, transfer encoding) of the parts of a BODYSTRUCTURE that
+    `_extract_body` reads: the text/plain parts that aren't attachments, or the
+    text/html ones if there are none. A single-part message is read whole if it is text.
+    """
+    plain, html = [], []
+
+    def walk(node, section, is_message):
+        if isinstance(node[0], (list, tuple)):
+            # Multipart: IMAPClient nests the top-level parts in a list, encapsulated
+            # messages keep them as the leading tuples
+            if isinstance(node[0], list):
+                children = node[0]
+            else:
+                children = [child for child in node if isinstance(child, tuple)]
+            base = f"{section}." if section else ""
+            for i, child in enumerate(children, 1):
+                walk(child, f"{base}{i}", False)
+            return
+
+        if is_message:
+            section = f"{section}.1" if section else "1"
+        content_type = (node[0] + b'/' + node[1]).decode('ascii', 'replace').lower()
+        if content_type == 'message/rfc822':
+            walk(node[8], section, True)
+            return
+        if section == "1" and is_message:
+            # The message itself is its only part
+            if content_type.startswith('text/'):
+                plain.append((section, node[5]))
+            return
+        disposition = node[9] if len(node) > 9 else None
+        attachment = (
+            isinstance(disposition, tuple) and disposition[0]
+            and disposition[0].lower() == b'attachment'
+        )
+        if content_type == 'text/plain' and not attachment:
+            plain.append((section, node[5]))
+        elif content_type == 'text/html' and not attachment:
+            html.append((section, node[5]))
+
+    walk(structure, "", True)
+    return plain or html
+
+def _decode_section(payload, encoding, truncated=False):
+    """Decode a fetched body section the way `_extract_body` decodes a MIME part."""
+    encoding = (encoding or b'7bit').decode('ascii', 'replace').lower()
+    if truncated and encoding == 'base64':
+        # A capped section can end mid-quantum, so drop its incomplete last line
+        payload = payload[:payload.rfind(b'\n') + 1] or payload[:len(payload) // 4 * 4]
+    part = email.message.Message()
+    part['Content-Transfer-Encoding'] = encoding
+    part.set_payload(payload.decode('ascii', 'surrogateescape'))
+    try:
+        return part.get_payload(decode=True).decode("utf-8", errors="ignore")
+    except:
+        return part.get_payload(decode=True).decode("latin-1", errors="ignore")
 
 class EmailHandler:
-    def __init__(self, username, password, server="imap.gmail.com", ssl=True):
+    def __init__(self, username, password, server="imap.gmail.com", ssl=True, port=None,
+                 fetch_mode="text", section_max_bytes=None, compress=True,
+                 keepalive_interval=KEEPALIVE_INTERVAL,
+                 reconnect_attempts=RECONNECT_ATTEMPTS, clean_text=True,
+                 footer_min_support=FOOTER_MIN_SUPPORT):
         self.server = server
         self.username = username
         self.password = password
         self.ssl = ssl
-        self.mail = IMAPClient(self.server, use_uid=True, ssl=self.ssl)
-        self.mail.login(self.username, self.password)
+        self.port = port
+        if fetch_mode not in FETCH_MODES:
+            raise ValueError(
+                f"Invalid fetch mode: {fetch_mode}. "
+                f"Must be one of: {', '.join(FETCH_MODES)}"
+            )
+        self.fetch_mode = fetch_mode
+        self.section_max_bytes = section_max_bytes
+        # Strips quoted replies, signatures and footers from bodies before they are
+        # chunked. Footers are only learned during the initial sync, see
+        # initialize_database
+        self.text_cleaner = (
+            TextCleaner(min_support=footer_min_support, learning=False)
+            if clean_text else None
+        )
+        # Reconnects and re-selects by itself when the connection drops
+        self.mail = IMAPSession(
+            self.server,
+            self.username,
+            self.password,
+            port=self.port,
+            ssl=self.ssl,
+            compress=compress,
+            keepalive_interval=keepalive_interval,
+            reconnect_attempts=reconnect_attempts
+        )
         self.stop_event = Event()
+        self.mail.start_keepalive(self.stop_event)
         self._uid_validity_cache = {}
 
+    def close(self):
+        """Stop the keepalive thread and log out."""
+        self.stop_event.set()
+        self.mail.logout()
+
     def format_folders(self, folders):
         # No special formatting needed with IMAPClient
         return folders
@@ -36,11 +152,23 @@ class EmailHandler:
         subfolders = [folder for folder in all_folders if any(f in folder for f in folders)]
         return subfolders
 
-    def _check_uid_validity(self, folder):
+    def folder_status(self, folder):
+        """
+        The folder's POLL_STATUS_ITEMS (and HIGHESTMODSEQ, which changes with any flag,
+        if the server supports CONDSTORE) in one STATUS round trip, without selecting
+        it.
+        """
+        items = POLL_STATUS_ITEMS
+        if self.mail.has_capability('CONDSTORE'):
+            items += ('HIGHESTMODSEQ',)
+        return self.mail.folder_status(folder, items)
+
+    def _check_uid_validity(self, folder, current_validity=None):
         """Check if folder's UID validity has changed."""
         try:
-            self.mail.select_folder(folder)
-            current_validity = self.mail.folder_status(folder)[b'UIDVALIDITY']
+            if current_validity is None:
+                status = self.mail.folder_status(folder, ['UIDVALIDITY'])
+                current_validity = status[b'UIDVALIDITY']
             cached_validity = self._uid_validity_cache.get(folder)
             
             if cached_validity is None:
@@ -62,48 +190,91 @@ class EmailHandler:
         try:
             self.mail.select_folder(folder)
             messages = self.mail.search(['ALL'])
-            return self.get_mail(filter='all', folders=[folder], uids=messages, return_dataframe=True)
+            return self.get_mail(filter='all', folders=[folder], uids=messages)
         except Exception as e:
             print(f"Error recaching folder {folder}: {e}")
-            return pd.DataFrame()
+            return []
 
-    def poll_folders(self, folders, folder_uids, callback, enable_uid_validity=True):
-        """Poll folders for changes."""
+    def poll_folders(self, folders, folder_uids, callback, enable_uid_validity=True,
+                     scheduler=None):
+        """
+        Poll folders for changes.
+
+        With a FolderPollScheduler only the folders it says are due are polled, and each
+        first gets a single STATUS: a folder whose status is unchanged since its last
+        poll is skipped without being selected or searched.
+        """
+        if scheduler is not None:
+            folders = scheduler.due(folders)
         for folder in folders:
             try:
-                # Check UID validity if enabled
-                if enable_uid_validity and not self._check_uid_validity(folder):
-                    print(f"Recaching folder {folder}")
-                    emails = self._recache_folder(folder)
-                    if not emails.empty:
-                        callback(folder, emails, recache=True)
-                    continue
-
-                # Get current UIDs
-                self.mail.select_folder(folder)
-                current_uids = set(self.mail.search(['SEEN']))
-                
-                # Check for changes
-                if folder not in folder_uids:
-                    folder_uids[folder] = current_uids
-                    # Return all UIDs for new folders
-                    callback(folder, pd.DataFrame(), current_uids=current_uids)
-                    continue
-                    
-                new_uids = current_uids - {int(uid) for uid in folder_uids[folder]}
-                removed_uids = {int(uid) for uid in folder_uids[folder]} - current_uids
-                
-                # POTENTIAL SECURITY RISK, NEEDS TO SYNC REMOVED IDS AND REMOVE THEM FROM LOCAL STORAGE
-                if new_uids or removed_uids:
-                    if new_uids:
-                        emails = self.get_mail(filter=None, folders=[folder], uids=list(new_uids), return_dataframe=True)
-                        # Return checked UIDs along with emails
-                        callback(folder, emails, fetched_uids=new_uids)
-            
+                status = None
+                if scheduler is not None:
+                    status = self.folder_status(folder)
+                    if folder in folder_uids and not scheduler.changed(folder, status):
+                        scheduler.record(folder, status, changed=False)
+                        metrics.increment("folder_polls_skipped_total")
+                        continue
+
+                self._poll_folder(
+                    folder, folder_uids, callback, enable_uid_validity, status
+                )
+                if scheduler is not None:
+                    scheduler.record(folder, status, changed=True)
             except Exception as e:
                 print(f"Error polling folder {folder}: {e}")
 
-    def get_mail(self, filter='unseen', folders=["INBOX"], uids=None, return_dataframe=True, return_uids=False):
+    def _poll_folder(self, folder, folder_uids, callback, enable_uid_validity,
+                     status=None):
+        """Poll a folder: recache it if its UIDVALIDITY changed, else fetch new mail."""
+        # Check UID validity if enabled
+        validity = status and status[b'UIDVALIDITY']
+        if enable_uid_validity and not self._check_uid_validity(folder, validity):
+            print(f"Recaching folder {folder}")
+            emails = self._recache_folder(folder)
+            if emails:
+                callback(folder, emails, recache=True)
+            return
+
+        # Get current UIDs
+        self.mail.select_folder(folder)
+        current_uids = self.search_uids(['SEEN'])
+        
+        # Check for changes
+        if folder not in folder_uids:
+            folder_uids[folder] = current_uids
+            # Return all UIDs for new folders
+            callback(folder, [], current_uids=current_uids)
+            return
+            
+        new_uids = current_uids - folder_uids[folder]
+        removed_uids = folder_uids[folder] - current_uids
+        
+        # POTENTIAL SECURITY RISK, NEEDS TO SYNC REMOVED IDS AND REMOVE THEM FROM LOCAL
+        # STORAGE
+        if new_uids or removed_uids:
+            if new_uids:
+                emails = self.get_mail(
+                    filter=None, folders=[folder], uids=new_uids.to_array().tolist()
+                )
+                # Return checked UIDs along with emails
+                callback(folder, emails, fetched_uids=new_uids)
+            folder_uids[folder] = current_uids
+
+    @metrics.timed("get_mail")
+    def get_mail(
+        self,
+        filter='unseen',
+        folders=["INBOX"],
+        uids=None,
+        return_dataframe=False,
+        return_uids=False,
+    ):
+        """
+        Fetch and parse the mail in `folders` matching `filter`, or the given `uids`, as
+        a list of EmailRecords. With `return_dataframe` they are returned as a pandas
+        DataFrame instead.
+        """
         emails = []
         for folder in tqdm(folders, desc="Processing Folders", position=0, leave=False):
             self.mail.select_folder(folder)
@@ -120,14 +291,17 @@ class EmailHandler:
                     print("Invalid filter. Please use 'unseen', 'all', or 'seen'.")
                     return
 
-            for uid in tqdm(messages, desc=f"Getting Emails from {folder}", position=1, leave=False):
-                # Use correct PEEK format for IMAPClient 
-                raw_email = self.mail.fetch(uid, ['BODY.PEEK[]', 'FLAGS'])
-                email_message = email.message_from_bytes(raw_email[uid][b'BODY[]'])
-                flags = raw_email[uid][b'FLAGS']
-                mail = self._process_email(uid, folder, email_message, flags)
-                if mail:
-                    emails.append(mail)
+            messages = list(messages)
+            with tqdm(total=len(messages), desc=f"Getting Emails from {folder}",
+                      position=1, leave=False) as progress:
+                for i in range(0, len(messages), FETCH_BATCH_SIZE):
+                    batch = messages[i:i + FETCH_BATCH_SIZE]
+                    raw = self.fetch_raw(folder, batch, select=False)
+                    for uid, (raw_email, flags) in raw.items():
+                        mail = self.parse_raw(uid, folder, raw_email, flags)
+                        if mail:
+                            emails.append(mail)
+                    progress.update(len(batch))
 
         if return_uids:
             all_uids = {}
@@ -142,69 +316,235 @@ class EmailHandler:
                         all_uids[folder] = set(self.mail.search(['SEEN']))
                     elif filter == 'all':
                         all_uids[folder] = set(self.mail.search('ALL'))
-            return (pd.DataFrame(emails) if return_dataframe else emails, all_uids)
+            return (
+                self._to_dataframe(emails) if return_dataframe else emails,
+                all_uids,
+            )
         else:
-            return pd.DataFrame(emails) if return_dataframe else emails
+            return self._to_dataframe(emails) if return_dataframe else emails
+
+    @staticmethod
+    def _to_dataframe(emails):
+        # pandas is only needed by callers that ask for a DataFrame
+        import pandas as pd
+        return pd.DataFrame([mail.to_dict() for mail in emails])
+
+    @metrics.timed("fetch")
+    def fetch_raw(self, folder, uids, select=True):
+        """
+        Fetch messages and their flags, keyed by UID.
+
+        In "full" fetch mode a message is its raw RFC822 bytes, fetched in one round
+        trip. In "text" mode it is (header bytes, body text) from `fetch_text`, which
+        skips attachments. Either can be passed to `parse_raw`.
+        """
+        if select:
+            self.mail.select_folder(folder)
+        if not uids:
+            return {}
+        if self.fetch_mode == "text":
+            return self.fetch_text(uids)
+        # Use correct PEEK format for IMAPClient
+        response = self.mail.fetch(uids, ['BODY.PEEK[]', 'FLAGS'])
+        fetched = {
+            uid: (data[b'BODY[]'], data[b'FLAGS'])
+            for uid, data in response.items()
+            if b'BODY[]' in data
+        }
+        metrics.increment("messages_fetched_total", len(fetched))
+        metrics.increment(
+            "bytes_fetched_total",
+            sum(len(raw_email) for raw_email, _ in fetched.values())
+        )
+        return fetched
 
-    def _process_email(self, uid, folder, email_message, flags):
+    def fetch_text(self, uids):
+        """
+        Fetch the headers and body text of messages in the selected folder, without
+        downloading their attachments.
+
+        The BODYSTRUCTURE and headers of every message are fetched first, then only the
+        text sections `_extract_body` would read, with BODY.PEEK[n]. Each section is
+        capped at `section_max_bytes` if set (BODY.PEEK[n]<0.N>). Messages with the same
+        section numbers are fetched in one round trip. Returns
+        {uid: ((header bytes, body text), flags)}.
+        """
+        response = self.mail.fetch(
+            uids, ['BODYSTRUCTURE', 'BODY.PEEK[HEADER]', 'FLAGS']
+        )
+        sections = {
+            uid: _text_sections(data[b'BODYSTRUCTURE'])
+            for uid, data in response.items()
+            if b'BODYSTRUCTURE' in data and data.get(b'BODY[HEADER]') is not None
+        }
+        fetched_bytes = sum(len(response[uid][b'BODY[HEADER]']) for uid in sections)
+
+        by_sections = {}
+        for uid, parts in sections.items():
+            numbers = tuple(section for section, _ in parts)
+            by_sections.setdefault(numbers, []).append(uid)
+
+        suffix = f"<0.{self.section_max_bytes}>" if self.section_max_bytes else ""
+        # A partial fetch is answered as BODY[n]<0>
+        origin = "<0>" if suffix else ""
+        bodies = {uid: "" for uid in sections}
+        for numbers, group in by_sections.items():
+            if not numbers:
+                continue
+            parts_response = self.mail.fetch(
+                group, [f'BODY.PEEK[{number}]{suffix}' for number in numbers]
+            )
+            for uid, data in parts_response.items():
+                for section, encoding in sections.get(uid, []):
+                    payload = data.get(f'BODY[{section}]{origin}'.encode())
+                    if payload:
+                        fetched_bytes += len(payload)
+                        bodies[uid] += _decode_section(
+                            payload, encoding, truncated=bool(suffix)
+                        )
+
+        fetched = {
+            uid: (
+                (response[uid][b'BODY[HEADER]'], bodies[uid]),
+                response[uid][b'FLAGS']
+            )
+            for uid in sections
+        }
+        metrics.increment("messages_fetched_total", len(fetched))
+        metrics.increment("bytes_fetched_total", fetched_bytes)
+        return fetched
+
+    def fetch_mail(self, folder, uids, select=True):
+        """Fetch and parse messages, FETCH_BATCH_SIZE per round trip; skip bad ones."""
+        if select:
+            self.mail.select_folder(folder)
+        emails = []
+        uids = list(uids)
+        for i in range(0, len(uids), FETCH_BATCH_SIZE):
+            batch = self.fetch_raw(folder, uids[i:i + FETCH_BATCH_SIZE], select=False)
+            for uid, (raw_email, flags) in batch.items():
+                mail = self.parse_raw(uid, folder, raw_email, flags)
+                if mail:
+                    emails.append(mail)
+        return emails
+
+    def list_uids(self, folder):
+        """Select a folder and return its UIDVALIDITY and a UIDSet of all its UIDs."""
+        status = self.mail.select_folder(folder)
+        return status[b'UIDVALIDITY'], self.search_uids('ALL')
+
+    def search_uids(self, criteria):
+        """
+        Return the UIDs in the selected folder matching the search criteria as a UIDSet.
+
+        Servers with ESEARCH answer with a compact sequence set such as '1:5000,5002'
+        rather than listing every UID.
+        """
+        if self.mail.has_capability('ESEARCH'):
+            return UIDSet.parse(self.mail.esearch(criteria))
+        return UIDSet(self.mail.search(criteria))
+
+    def search(self, folder, criteria):
+        """Return the UIDs in a folder matching the search criteria."""
+        self.mail.select_folder(folder)
+        return self.mail.search(criteria)
+
+    def parse_raw(self, uid, folder, raw_email, flags):
+        """
+        Parse a fetched message into an EmailRecord. Needs no IMAP connection.
+
+        `raw_email` is the whole message, or (header bytes, body text) from
+        `fetch_text`.
+        """
+        if isinstance(raw_email, tuple):
+            header, body = raw_email
+            message = email.message_from_bytes(header)
+            return self._process_email(uid, folder, message, flags, body=body)
+        message = email.message_from_bytes(raw_email)
+        return self._process_email(uid, folder, message, flags)
+
+    @metrics.timed("process_email")
+    def _process_email(self, uid, folder, email_message, flags, body=None):
         try:
             date_tuple = email.utils.parsedate_tz(email_message['Date'])
             if date_tuple:
-                local_date = datetime.datetime.fromtimestamp(email.utils.mktime_tz(date_tuple))
-                local_message_date = local_date.strftime("%a, %d %b %Y %H:%M:%S")
+                date_ts = email.utils.mktime_tz(date_tuple)
+                local_message_date = display_date(date_ts)
 
             email_from = str(decode_header(email_message['From'])[0][0])
             email_to = str(decode_header(email_message['To'])[0][0]) 
             subject = str(decode_header(email_message['Subject'])[0][0])
             
-            body = self._extract_body(email_message)
+            if body is None:
+                body = self._extract_body(email_message)
             if not body:
                 return None
 
             raw_body = body
-            processed_body = self._process_body(body)
+            processed_body = self._process_body(body, sender=email_from)
             paragraphs = self._split_into_paragraphs(processed_body)
 
             if not paragraphs:
                 return None
 
+            message_id = email_message['Message-ID']
             uuid = self.hash_email({
                 'from': email_from, 
                 'to': email_to, 
                 'subject': subject,
                 'date': local_message_date,
+                'message_id': str(message_id).strip() if message_id else None,
                 'body': body
             })
-            message_id = email_message['Message-ID']
+            list_id = email_message['List-Id']
+            list_unsubscribe = email_message['List-Unsubscribe']
         except Exception as e:
             print(f"Error processing email: {e}")
             return None
         
-        return {
-            'uid': uid,
-            'folder': folder,
-            'uuid': uuid,
-            'from': email_from,
-            'to': email_to,
-            'subject': subject,
-            'date': local_message_date,
-            'message_id': message_id,
-            'paragraphs': paragraphs,
-            'raw_body': raw_body,
-            'flags': flags
-        }
+        return EmailRecord(
+            uid=uid,
+            folder=folder,
+            uuid=uuid,
+            sender=email_from,
+            recipient=email_to,
+            subject=subject,
+            date=local_message_date,
+            date_ts=date_ts,
+            message_id=message_id,
+            list_id=str(list_id) if list_id else None,
+            list_unsubscribe=str(list_unsubscribe) if list_unsubscribe else None,
+            paragraphs=paragraphs,
+            raw_body=raw_body,
+            flags=flags
+        )
 
     def _extract_body(self, email_message):
+        """
+        The body text of a message: its text/plain parts that aren't attachments. A
+        multipart message without any, such as an HTML-only newsletter, is read from its
+        text/html parts instead, which `_process_body` reduces to text. Such messages
+        used to have no body and were skipped. `_text_sections` picks the same parts.
+        """
         body = ""
         if email_message.is_multipart():
+            html = ""
             for part in email_message.walk():
                 content_type = part.get_content_type()
                 content_disposition = str(part.get("Content-Disposition"))
-                if content_type == 'text/plain' and 'attachment' not in content_disposition:
+                if (content_type in ('text/plain', 'text/html')
+                        and 'attachment' not in content_disposition):
+                    payload = part.get_payload(decode=True)
                     try:
-                        body += part.get_payload(decode=True).decode("utf-8", errors="ignore")
+                        text = payload.decode("utf-8", errors="ignore")
                     except:
-                        body += part.get_payload(decode=True).decode("latin-1", errors="ignore")
+                        text = payload.decode("latin-1", errors="ignore")
+                    if content_type == 'text/plain':
+                        body += text
+                    else:
+                        html += text
+            if not body:
+                body = html
         else:
             try:
                 body = email_message.get_payload(decode=True).decode("utf-8", errors="ignore")
@@ -213,15 +553,41 @@ class EmailHandler:
         return body
 
     def hash_email(self, email_dict):
-        hash_string = email_dict['from'] + email_dict['to'] + email_dict['subject'] + email_dict['date'] + email_dict['body']
+        """
+        The uuid of an email. Emails with a Message-ID are identified by it and their
+        headers alone, so the uuid doesn't depend on how much of the body was fetched
+        (see `section_max_bytes`). Emails without one fall back to hashing their body
+        too.
+        """
+        hash_string = (
+            email_dict['from'] + email_dict['to'] + email_dict['subject']
+            + email_dict['date']
+        )
+        if email_dict.get('message_id'):
+            hash_string += email_dict['message_id']
+        else:
+            hash_string += email_dict['body']
         uuid = hashlib.sha256(hash_string.encode()).hexdigest()
         return uuid
 
-    def _process_body(self, body):
+    def _process_body(self, body, sender=None):
         soup = BeautifulSoup(body, 'html.parser')
         for element in soup(["script", "style", "img", "table", "code"]):
             element.decompose()
+        if self.text_cleaner is not None:
+            # Quoted history in HTML replies
+            quotes = soup.find_all("blockquote")
+            quotes += soup.find_all(class_=["gmail_quote", "yahoo_quoted"])
+            for element in quotes:
+                element.decompose()
+            for element in soup.find_all("br"):
+                element.replace_with("\n")
         text = soup.get_text()
+        # The cleaner works line by line, so it runs before whitespace is collapsed
+        if self.text_cleaner is not None:
+            length = len(text)
+            text = self.text_cleaner.clean(text, sender)
+            metrics.increment("body_chars_stripped_total", max(0, length - len(text)))
         text = re.sub(r'\s+', ' ', text)
         text = text.encode('ascii', 'ignore').decode('ascii')
         return text.strip()
@@ -230,9 +596,89 @@ class EmailHandler:
         paragraphs = [para.strip() for para in text.split('\n') if para.strip()]
         return paragraphs
 
-    def move_mail(self, uids, folder):
+    @metrics.timed("move_mail")
+    def move_mail(self, uids, folder, source_folder=None, message_ids=None):
+        """
+        Move messages to a folder in one round trip.
+
+        The messages are taken from `source_folder` if given, else from the selected
+        folder.
+
+        Uses UID MOVE when the server supports it, otherwise COPY followed by flagging
+        the originals \\Deleted and expunging them. Returns a mapping of each source UID
+        to its UID in the destination folder. The server reports these if it has UIDPLUS
+        (COPYUID). Otherwise, messages whose Message-ID is given in `message_ids`
+        (source UID -> Message-ID) are looked up in the destination folder with a UID
+        SEARCH each. Messages found neither way are left out.
+        """
         folder = folder.replace('"', '').strip()
-        self.mail.move(uids, folder)
+        if not uids:
+            return {}
+        if source_folder is not None:
+            self.mail.select_folder(source_folder)
+
+        if self.mail.has_capability('MOVE'):
+            responses = self.mail.transfer('move', uids, folder)
+        else:
+            responses = self.mail.transfer('copy', uids, folder)
+            self.mail.delete_messages(uids, silent=True)
+            if self.mail.has_capability('UIDPLUS'):
+                self.mail.uid_expunge(uids)
+            else:
+                self.mail.expunge()
+        metrics.increment("emails_moved_total", len(uids))
+
+        uid_map = self._parse_copyuid(responses)
+        missing = {
+            uid: message_id for uid, message_id in (message_ids or {}).items()
+            if uid in uids and uid not in uid_map and message_id
+        }
+        if missing:
+            uid_map.update(self._find_moved(folder, missing))
+        return uid_map
+
+    @staticmethod
+    def _parse_copyuid(responses):
+        """Map source to destination UIDs from COPYUID '<validity> <src> <dst>' data."""
+        uid_map = {}
+        for response in responses:
+            if isinstance(response, bytes):
+                response = response.decode()
+            parts = response.split()
+            if len(parts) == 3:
+                # The UIDs pair up in the order the sets list them, so each element is
+                # expanded on its own, ranges in ascending order ('5:3' is 3, 4, 5)
+                source_uids = [
+                    uid for element in parts[1].split(',')
+                    for uid in UIDSet.parse(element).to_array().tolist()
+                ]
+                destination_uids = [
+                    uid for element in parts[2].split(',')
+                    for uid in UIDSet.parse(element).to_array().tolist()
+                ]
+                uid_map.update(zip(source_uids, destination_uids))
+        return uid_map
+
+    def _find_moved(self, folder, message_ids):
+        """
+        Look up moved messages in their destination folder by Message-ID, for servers
+        that don't report their new UIDs. The previously selected folder is selected
+        again.
+        """
+        previous = self.mail.selected_folder
+        self.mail.select_folder(folder, readonly=True)
+        uid_map = {}
+        try:
+            for uid, message_id in message_ids.items():
+                matches = self.mail.search(['HEADER', 'Message-ID', message_id])
+                if matches:
+                    # An earlier copy may share the Message-ID, the newest is this one
+                    uid_map[uid] = max(matches)
+        finally:
+            if previous is not None:
+                self.mail.select_folder(previous)
+        metrics.increment("moved_uids_searched_total", len(message_ids))
+        return uid_map
 
     def delete_mail(self, uids):
         self.mail.delete_messages(uids)
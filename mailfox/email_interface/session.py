@@ -0,0 +1,321 @@
+import imaplib
+import random
+import re
+import threading
+import time
+import zlib
+
+import imapclient
+from imapclient import IMAPClient
+
+from ..core import metrics
+
+# Seconds a session may sit idle before a NOOP is sent, so neither the server nor a NAT
+# in between drops it
+KEEPALIVE_INTERVAL = 240
+
+# Reconnect attempts after a dropped connection. Attempt n waits
+# RECONNECT_BACKOFF * 2**n seconds, at most RECONNECT_BACKOFF_MAX, plus up to 10% jitter
+RECONNECT_ATTEMPTS = 5
+RECONNECT_BACKOFF = 1.0
+RECONNECT_BACKOFF_MAX = 60.0
+
+# IMAPClient methods that don't change the mailbox, so one lost with the connection is
+# sent again after reconnecting. Others (moves, flag changes, expunges) are not
+# repeated, since the server may have carried them out before the connection dropped
+RETRYABLE_COMMANDS = frozenset({
+    "capabilities",
+    "esearch",
+    "fetch",
+    "folder_status",
+    "list_folders",
+    "noop",
+    "search",
+    "select_folder",
+})
+
+# Errors that mean the connection itself is gone
+CONNECTION_ERRORS = (OSError, EOFError, imaplib.IMAP4.abort, zlib.error)
+
+# IMAPClient versions, from inclusive to exclusive, whose internals _Internals uses
+IMAPCLIENT_VERSIONS = ((2, 0), (5, 0))
+
+# Capabilities the session can only use through _Internals
+INTERNAL_CAPABILITIES = frozenset({"COMPRESS=DEFLATE", "ESEARCH"})
+
+class _InflatingFile():
+    """The read side of an imaplib connection after COMPRESS=DEFLATE (RFC 4978)."""
+    def __init__(self, file):
+        self.file = file
+        self.inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.buffer = bytearray()
+
+    def _fill(self):
+        data = self.file.read1(64 * 1024)
+        if not data:
+            return False
+        metrics.increment("imap_compressed_bytes_total", len(data))
+        self.buffer += self.inflater.decompress(data)
+        return True
+
+    def read(self, size):
+        while len(self.buffer) < size and self._fill():
+            pass
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, limit=-1):
+        while True:
+            end = self.buffer.find(b'\n')
+            if end >= 0 or 0 <= limit <= len(self.buffer) or not self._fill():
+                break
+        size = end + 1 if end >= 0 else len(self.buffer)
+        return self.read(size if limit < 0 else min(size, limit))
+
+    def close(self):
+        self.file.close()
+
+def _internals_supported():
+    """Whether the installed IMAPClient and imaplib have what _Internals uses."""
+    version = tuple(getattr(imapclient, 'version_info', (0, 0))[:2])
+    low, high = IMAPCLIENT_VERSIONS
+    return (
+        low <= version < high
+        and hasattr(IMAPClient, '_raw_command_untagged')
+        and hasattr(imaplib, 'Commands')
+        and all(hasattr(imaplib.IMAP4, name) for name in ('_simple_command', 'send'))
+    )
+
+class _Internals():
+    """
+    Every use of private IMAPClient and imaplib internals, in one place.
+
+    IMAPClient exposes neither COMPRESS=DEFLATE, ESEARCH nor the COPYUID data of a COPY
+    or MOVE, so these reach into the imaplib connection it wraps (`client._imap`).
+    `supported` is checked once at import, against IMAPCLIENT_VERSIONS and the
+    attributes used. Without it the session does without them: no compression, plain
+    SEARCH, and moved messages are found by Message-ID.
+    """
+    supported = _internals_supported()
+
+    @staticmethod
+    def enable_compression(client):
+        """Switch an authenticated connection to DEFLATE. Returns whether it was."""
+        imaplib.Commands.setdefault('COMPRESS', ('AUTH', 'SELECTED'))
+        imap = client._imap
+        typ, _ = imap._simple_command('COMPRESS', 'DEFLATE')
+        if typ != 'OK':
+            return False
+        imap.file = _InflatingFile(imap.file)
+        deflater = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS
+        )
+
+        def send(data):
+            imap.sock.sendall(
+                deflater.compress(data) + deflater.flush(zlib.Z_SYNC_FLUSH)
+            )
+        imap.send = send
+        return True
+
+    @staticmethod
+    def esearch(client, criteria):
+        """UID SEARCH RETURN (ALL) (RFC 4731), returning the matching sequence set."""
+        if isinstance(criteria, str):
+            criteria = [criteria]
+        args = [b'RETURN', b'(ALL)'] + [
+            item.encode() if isinstance(item, str) else item for item in criteria
+        ]
+        data = client._raw_command_untagged(b'SEARCH', args, response_name='ESEARCH')
+        # No ALL item when nothing matched
+        lines = b' '.join(line for line in data if line)
+        match = re.search(rb'\bALL\s+([0-9:,]+)', lines)
+        return match.group(1).decode() if match else ''
+
+    @staticmethod
+    def transfer(client, command, uids, folder):
+        """Run COPY or MOVE, returning the COPYUID data (RFC 4315) it produced."""
+        if not _Internals.supported:
+            getattr(client, command)(uids, folder)
+            return []
+        # imaplib files the response code, tagged or untagged, under its own key
+        responses = client._imap.untagged_responses
+        responses.pop('COPYUID', None)
+        getattr(client, command)(uids, folder)
+        return responses.pop('COPYUID', [])
+
+class IMAPSession():
+    """
+    An IMAPClient connection that keeps itself alive.
+
+    Methods of the underlying IMAPClient are called through the session. When one fails
+    because the connection dropped, the session reconnects with exponential backoff,
+    logs in again and re-selects the folder that was selected. The method is then sent
+    again if it is in RETRYABLE_COMMANDS, and its error raised otherwise.
+    COMPRESS=DEFLATE is negotiated whenever the server offers it, and `start_keepalive`
+    sends a NOOP whenever the session has been idle for `keepalive_interval` seconds.
+    Calls are serialized with a lock, so the keepalive thread never interleaves with a
+    command.
+    """
+    def __init__(self, server, username, password, port=None, ssl=True, compress=True,
+                 keepalive_interval=KEEPALIVE_INTERVAL,
+                 reconnect_attempts=RECONNECT_ATTEMPTS):
+        self.server = server
+        self.username = username
+        self.password = password
+        self.port = port
+        self.ssl = ssl
+        self.compress = compress
+        self.keepalive_interval = keepalive_interval
+        self.reconnect_attempts = reconnect_attempts
+        self.client = None
+        self.compressed = False
+        self.last_activity = time.monotonic()
+        # (args, kwargs) of the last select_folder call
+        self._selected = None
+        self._lock = threading.RLock()
+        self.connect()
+
+    def connect(self):
+        """Open and log in a new connection, replacing the current one."""
+        client = IMAPClient(self.server, port=self.port, use_uid=True, ssl=self.ssl)
+        client.login(self.username, self.password)
+        self.compressed = bool(
+            self.compress
+            and _Internals.supported
+            and client.has_capability('COMPRESS=DEFLATE')
+            and _Internals.enable_compression(client)
+        )
+        self.close()
+        self.client = client
+        self.last_activity = time.monotonic()
+
+    def reconnect(self):
+        """
+        Reconnect with backoff and re-select the selected folder, raising the last error
+        if every attempt fails.
+        """
+        for attempt in range(self.reconnect_attempts):
+            delay = min(RECONNECT_BACKOFF * 2 ** attempt, RECONNECT_BACKOFF_MAX)
+            time.sleep(delay * random.uniform(1, 1.1))
+            try:
+                self.connect()
+                if self._selected:
+                    args, kwargs = self._selected
+                    self.client.select_folder(*args, **kwargs)
+                metrics.increment("imap_reconnects_total")
+                return
+            except CONNECTION_ERRORS as e:
+                print(
+                    f"Reconnecting to {self.server} failed "
+                    f"(attempt {attempt + 1}/{self.reconnect_attempts}): {e}"
+                )
+                if attempt == self.reconnect_attempts - 1:
+                    raise
+
+    def logout(self):
+        """Log out and drop the current connection, if there is one."""
+        with self._lock:
+            if self.client is not None:
+                try:
+                    self.client.logout()
+                except Exception:
+                    pass
+            self.close()
+
+    def close(self):
+        """Drop the current connection without logging out."""
+        if self.client is not None:
+            try:
+                self.client.shutdown()
+            except Exception:
+                pass
+            self.client = None
+
+    def keepalive(self):
+        """Send a NOOP if the session has been idle for `keepalive_interval` seconds."""
+        if time.monotonic() - self.last_activity >= self.keepalive_interval:
+            self.noop()
+
+    def start_keepalive(self, stop_event):
+        """Call `keepalive` from a daemon thread until `stop_event` is set."""
+        def run():
+            while not stop_event.wait(self.keepalive_interval / 4):
+                try:
+                    self.keepalive()
+                except Exception as e:
+                    print(f"IMAP keepalive failed: {e}")
+
+        thread = threading.Thread(target=run, name="imap-keepalive", daemon=True)
+        thread.start()
+        return thread
+
+    def esearch(self, criteria):
+        """
+        The UIDs in the selected folder matching `criteria` as an IMAP sequence set
+        such as '1:5000,5002', from a single ESEARCH response. Needs the server's
+        ESEARCH capability.
+        """
+        return self._call("esearch", (criteria,), {}, _Internals.esearch)
+
+    def transfer(self, command, uids, folder):
+        """
+        COPY or MOVE (`command`) messages to a folder, returning the COPYUID response
+        data the server sent for it, if any. The response is read under the session lock
+        from the connection that ran the command, so a keepalive or reconnect can't lose
+        it.
+        """
+        return self._call(
+            command, (uids, folder), {},
+            lambda client, uids, folder: _Internals.transfer(
+                client, command, uids, folder
+            )
+        )
+
+    def has_capability(self, capability):
+        """
+        Whether the server offers a capability the session can use. Those in
+        INTERNAL_CAPABILITIES are only usable when `_Internals.supported`.
+        """
+        if capability.upper() in INTERNAL_CAPABILITIES and not _Internals.supported:
+            return False
+        return self._call("has_capability", (capability,), {})
+
+    @property
+    def selected_folder(self):
+        """The name of the selected folder, or None."""
+        return self._selected[0][0] if self._selected else None
+
+    def _call(self, name, args, kwargs, function=None):
+        """Run `function(client, *args, **kwargs)`, by default the method `name`."""
+        if function is None:
+            def function(client, *args, **kwargs):
+                return getattr(client, name)(*args, **kwargs)
+        with self._lock:
+            try:
+                if self.client is None:
+                    self.reconnect()
+                result = function(self.client, *args, **kwargs)
+            except CONNECTION_ERRORS as e:
+                print(f"IMAP connection to {self.server} lost ({e}), reconnecting...")
+                self.close()
+                self.reconnect()
+                if name not in RETRYABLE_COMMANDS:
+                    raise
+                result = function(self.client, *args, **kwargs)
+            if name == "select_folder":
+                self._selected = (args, kwargs)
+            elif name in ("close_folder", "unselect_folder"):
+                self._selected = None
+            self.last_activity = time.monotonic()
+            return result
+
+    def __getattr__(self, name):
+        if self.client is None:
+            with self._lock:
+                self.reconnect()
+        attribute = getattr(self.client, name)
+        if not callable(attribute):
+            return attribute
+        return lambda *args, **kwargs: self._call(name, args, kwargs)
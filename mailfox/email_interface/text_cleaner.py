@@ -0,0 +1,242 @@
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from email.utils import parseaddr
+
+# Attribution line above a quoted reply, e.g.
+# "On Mon, 1 Jan 2024 at 10:00, Ann <ann@x.com> wrote:". Mail clients wrap long
+# attributions, so it is matched against a line joined with the next one
+REPLY_HEADER = re.compile(
+    r'^(on|le|am|el|il|op)\s.{0,300}\s'
+    r'(wrote|a écrit|schrieb|escribió|ha scritto|schreef)\s?:$',
+    re.IGNORECASE
+)
+
+# Outlook and Lotus start the quoted message with a separator or its header block
+ORIGINAL_MESSAGE = re.compile(
+    r'^(-{2,}\s*original message\s*-{2,}|_{10,})$', re.IGNORECASE
+)
+OUTLOOK_HEADER = re.compile(r'^from:\s.+', re.IGNORECASE)
+OUTLOOK_HEADER_FIELD = re.compile(r'^(sent|date|to|subject):\s', re.IGNORECASE)
+
+# The same header block introduces a forwarded message, which is content to keep
+FORWARDED_MESSAGE = re.compile(
+    r'^(-{2,}\s*forwarded message\s*-{2,}|begin forwarded message:)$', re.IGNORECASE
+)
+
+# RFC 3676 signature separator ("-- "), and the signatures mobile clients append
+SIGNATURE_SEPARATOR = re.compile(r'^--\s?$')
+MOBILE_SIGNATURE = re.compile(
+    r'^(sent from my \w+.*|sent from (mail|outlook|yahoo mail) for .+'
+    r'|get outlook for \w+.*)$',
+    re.IGNORECASE
+)
+
+# Newsletter and notification footers start with one of these. They are phrased the way
+# footers are, so a personal "we should opt out of the contract" doesn't match
+FOOTER_MARKER = re.compile(
+    r'(click|tap) here to (unsubscribe|opt[ -]out)|\bto (unsubscribe|opt[ -]out)\b'
+    r'|^unsubscribe\b|\bunsubscribe\s*(\||$)|unsubscribe (here|now|at any time)'
+    r'|opt[ -]out of (these|this|all|future|our) (e-?mails|messages|mailings)'
+    r'|manage (your )?(email )?(preferences|subscriptions)'
+    r'|update your (email )?preferences|you are receiving this'
+    r'|you received this (e-?mail|message)|no longer wish to receive',
+    re.IGNORECASE
+)
+
+# What the lines after a footer marker look like: links, addresses, phone numbers,
+# copyright notices and link lists
+FOOTER_LINE = re.compile(
+    r'https?://|www\.|\S@\S|\d|©|\(c\)|copyright|all rights reserved|\|'
+    r'|mailing address|privacy|terms of (use|service)',
+    re.IGNORECASE
+)
+
+# Newsletters open with a link to their web version
+BROWSER_LINK = re.compile(
+    r'view (this (email|message) )?(online|in (your |a )?(web )?browser)'
+    r'|having trouble (viewing|reading) this',
+    re.IGNORECASE
+)
+
+# Only this many trailing lines are searched for signatures
+TAIL_LINES = 20
+
+# A footer marker must be among this many trailing non-blank lines
+FOOTER_LINES = 8
+
+# Only this many leading non-blank lines are searched for a browser link
+HEADER_LINES = 3
+
+# A trailing line becomes a learned footer of its sender once it ended at least
+# FOOTER_MIN_SUPPORT of their emails, and at least FOOTER_MIN_FRACTION of them
+FOOTER_MIN_SUPPORT = 3
+FOOTER_MIN_FRACTION = 0.6
+
+# Senders whose footers are remembered, least recently seen forgotten first
+MAX_FOOTER_SENDERS = 10000
+
+def _normalize(line):
+    """A line's footer fingerprint, ignoring case, spacing and digits (dates, ids)."""
+    return zlib.crc32(re.sub(r'\d+', '0', ' '.join(line.lower().split())).encode())
+
+class TextCleaner():
+    """
+    Strip what doesn't describe an email from its text before it is chunked and
+    embedded: quoted replies and their attribution lines, signatures, and newsletter
+    footers.
+
+    Besides fixed patterns, the trailing lines of every sender's emails are
+    fingerprinted, and lines that keep ending a sender's emails (a legal disclaimer, a
+    company address) are learned as that sender's footer and stripped from then on. Text
+    is never stripped down to nothing: a rule that would leave no lines is skipped.
+
+    Footers are only learned while `learning` is on. mailfox turns it on for the initial
+    sync (`initialize_database`), which stores the learned counts in emails.db with each
+    checkpoint, and keeps them frozen everywhere else: the daemon and later syncs load
+    them with `load_footers`, so they clean a message the same way whatever order mail
+    arrives in.
+    """
+    def __init__(self, *, min_support=FOOTER_MIN_SUPPORT,
+                 min_fraction=FOOTER_MIN_FRACTION, max_senders=MAX_FOOTER_SENDERS,
+                 learning=True):
+        self.min_support = min_support
+        self.min_fraction = min_fraction
+        self.max_senders = max_senders
+        self.learning = learning
+        # sender -> [emails seen, {fingerprint: emails it ended}]
+        self._footers = OrderedDict()
+        # Senders learned from or forgotten since the last `take_footer_changes`
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    def load_footers(self, footers):
+        """
+        Replace the learned footer counts with {sender: (emails seen, {fingerprint:
+        count})}.
+        """
+        with self._lock:
+            self._footers = OrderedDict(
+                (sender, [seen, dict(counts)])
+                for sender, (seen, counts) in footers.items()
+            )
+            self._changed = set()
+
+    def take_footer_changes(self):
+        """
+        The footer counts that changed since the last call, as {sender: (emails seen,
+        {fingerprint: count})}, with None for senders that were forgotten.
+        """
+        with self._lock:
+            changes = {}
+            for sender in self._changed:
+                footer = self._footers.get(sender)
+                changes[sender] = (footer[0], dict(footer[1])) if footer else None
+            self._changed = set()
+            return changes
+
+    def clean(self, text, sender=None):
+        """Return `text` without quoted replies, signatures and footers."""
+        lines = [line.rstrip() for line in text.splitlines()]
+        lines = self._strip_quotes(lines)
+        lines = self._strip_signature(lines)
+        lines = self._strip_footer(lines)
+        if sender:
+            address = parseaddr(sender)[1].lower() or sender
+            lines = self._strip_learned_footer(lines, address)
+        return '\n'.join(lines).strip()
+
+    @staticmethod
+    def _keep(lines, end):
+        """lines[:end], unless that leaves no text."""
+        return lines[:end] if any(line.strip() for line in lines[:end]) else lines
+
+    def _strip_quotes(self, lines):
+        lines = [line for line in lines if not line.lstrip().startswith('>')] or lines
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            joined = stripped
+            if i + 1 < len(lines):
+                joined = f"{stripped} {lines[i + 1].strip()}"
+            if (REPLY_HEADER.match(stripped) or REPLY_HEADER.match(joined)
+                    or ORIGINAL_MESSAGE.match(stripped)):
+                return self._keep(lines, i)
+            if OUTLOOK_HEADER.match(stripped) and any(
+                OUTLOOK_HEADER_FIELD.match(next_line.strip())
+                for next_line in lines[i + 1:i + 5]
+            ):
+                previous = next(
+                    (line.strip() for line in reversed(lines[:i]) if line.strip()), ''
+                )
+                if not FORWARDED_MESSAGE.match(previous):
+                    return self._keep(lines, i)
+        return lines
+
+    def _strip_signature(self, lines):
+        lines = [
+            line for line in lines if not MOBILE_SIGNATURE.match(line.strip())
+        ] or lines
+        for i in range(max(0, len(lines) - TAIL_LINES), len(lines)):
+            if SIGNATURE_SEPARATOR.match(lines[i]):
+                return self._keep(lines, i)
+        return lines
+
+    def _strip_footer(self, lines):
+        """
+        Cut the trailing footer block: from the earliest footer marker among the last
+        FOOTER_LINES non-blank lines, if every line after it is blank, another marker or
+        looks like footer (FOOTER_LINE). A short browser link among the first few lines
+        is dropped too.
+        """
+        end, seen = None, 0
+        for i in range(len(lines) - 1, -1, -1):
+            line = lines[i].strip()
+            if not line:
+                continue
+            seen += 1
+            if seen > FOOTER_LINES:
+                break
+            if FOOTER_MARKER.search(line):
+                end = i
+            elif not FOOTER_LINE.search(line):
+                break
+        if end is not None:
+            lines = self._keep(lines, end)
+
+        leading = [i for i, line in enumerate(lines) if line.strip()][:HEADER_LINES]
+        for i in leading:
+            if len(lines[i]) < 80 and BROWSER_LINK.search(lines[i]):
+                return [line for j, line in enumerate(lines) if j != i] or lines
+        return lines
+
+    def _strip_learned_footer(self, lines, sender):
+        tail_start = max(0, len(lines) - TAIL_LINES)
+        fingerprints = [_normalize(line) if line.strip() else None for line in lines]
+        with self._lock:
+            seen, counts = self._footers.get(sender) or [0, {}]
+            footer = set()
+            if seen >= self.min_support:
+                footer = {
+                    fp for fp, count in counts.items()
+                    if count >= self.min_support and count >= self.min_fraction * seen
+                }
+            if self.learning:
+                # Learn from this email before stripping it, its own tail counts too
+                for fp in set(fingerprints[tail_start:]) - {None}:
+                    counts[fp] = counts.get(fp, 0) + 1
+                if len(counts) > 20 * TAIL_LINES:
+                    counts = {fp: count for fp, count in counts.items() if count > 1}
+                self._footers.pop(sender, None)
+                self._footers[sender] = [seen + 1, counts]
+                self._changed.add(sender)
+                if len(self._footers) > self.max_senders:
+                    self._changed.add(self._footers.popitem(last=False)[0])
+
+        # Drop the trailing run of footer (and blank) lines
+        end = len(lines)
+        while end > tail_start and (
+            fingerprints[end - 1] is None or fingerprints[end - 1] in footer
+        ):
+            end -= 1
+        return self._keep(lines, end)
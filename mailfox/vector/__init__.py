@@ -1 +1,9 @@
-from .database import *
\ No newline at end of file
+from .enums import EmbeddingFunctions, SearchModes
+
+def __getattr__(name):
+    # Importing VectorDatabase loads chromadb and the embedding stack, so only do it on
+    # first use
+    if name == "VectorDatabase":
+        from .database import VectorDatabase
+        return VectorDatabase
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
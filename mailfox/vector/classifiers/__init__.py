@@ -0,0 +1,19 @@
+import importlib
+
+# Classifier name -> (module, class). Classes are imported on first use so that sklearn
+# is only loaded by commands that train or run a classifier.
+CLASSIFIER_CLASSES = {
+    "svm": (".linear_svm", "LinearSVMClassifier"),
+    "logistic": (".logistic_regression", "LogisticRegressionClassifier"),
+    "mlp": (".mlp", "MLPNeuralClassifier"),
+    "hashed": (".hashed", "HashedFeatureClassifier"),
+}
+
+# Classifiers trained on and applied to EmailRecords (from emails.db) rather than
+# embeddings
+EMBEDDING_FREE_CLASSIFIERS = frozenset({"hashed"})
+
+def get_classifier_class(name: str):
+    """Import and return the classifier class registered under `name`."""
+    module, class_name = CLASSIFIER_CLASSES[name]
+    return getattr(importlib.import_module(module, __name__), class_name)
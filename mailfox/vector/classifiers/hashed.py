@@ -0,0 +1,217 @@
+import re
+import zlib
+from collections import Counter
+from email.utils import parseaddr
+from typing import List, Dict, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix
+import pickle
+from ...core.email_record import EmailRecord
+from .numpy_models import linear_arrays, linear_model, load_arrays, save_arrays
+
+# Hashed feature space. Memory is fixed by this, however many senders and words appear
+HASH_FEATURES = 2 ** 18
+
+# Only the start of the body is tokenized, which is where most of the signal is
+MAX_BODY_CHARS = 5000
+
+# Emails vectorized per training step, and passes over the training emails
+TRAIN_BATCH_SIZE = 1000
+EPOCHS = 5
+
+TOKEN = re.compile(r"[a-z][a-z0-9']+")
+HTML_TAG = re.compile(r'<[^>]+>')
+
+def email_features(email: EmailRecord) -> List[str]:
+    """
+    The sparse features of an email: sender, domain, list headers, subject and body
+    tokens.
+    """
+    address = parseaddr(email.sender or '')[1].lower()
+    domain = address.rpartition('@')[2]
+    features = [f"sender:{address}", f"domain:{domain}"]
+    # Parent domains, so mail from a company's subdomains shares a feature
+    parts = domain.split('.')
+    features.extend(f"domain:{'.'.join(parts[i:])}" for i in range(1, len(parts) - 1))
+    features.append(f"list:{email.list_id or 'none'}")
+    if email.list_unsubscribe:
+        features.append("list_unsubscribe")
+    features.extend(
+        f"subject:{token}" for token in TOKEN.findall((email.subject or '').lower())
+    )
+    body = HTML_TAG.sub(' ', (email.raw_body or '')[:MAX_BODY_CHARS]).lower()
+    features.extend(f"body:{token}" for token in TOKEN.findall(body))
+    return features
+
+def hash_features(email: EmailRecord) -> Tuple[np.ndarray, np.ndarray]:
+    """An email's features hashed with crc32, as column indices and unit-norm counts."""
+    counts = Counter(
+        zlib.crc32(feature.encode()) % HASH_FEATURES
+        for feature in email_features(email)
+    )
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+    return indices, values / np.linalg.norm(values)
+
+def vectorize(emails: List[EmailRecord]) -> csr_matrix:
+    """The hashed features of emails as a sparse matrix, one row per email."""
+    rows = [hash_features(email) for email in emails]
+    indptr = np.cumsum([0] + [len(indices) for indices, _ in rows])
+    indices = (
+        np.concatenate([indices for indices, _ in rows])
+        if rows
+        else np.empty(0, dtype=np.int64)
+    )
+    values = np.concatenate([values for _, values in rows]) if rows else np.empty(0)
+    return csr_matrix((values, indices, indptr), shape=(len(rows), HASH_FEATURES))
+
+class HashedFeatureClassifier:
+    """
+    A linear classifier on hashed header and text features that needs no embeddings.
+
+    Unlike the other classifiers it is trained on and classifies EmailRecords, so
+    classifying an email costs hashing its tokens and summing a few hundred model
+    weights instead of an embedding call.
+    """
+    uses_embeddings = False
+
+    def __init__(self, **params):
+        # Keyword arguments override the SGDClassifier defaults, e.g. alpha for the
+        # regularization strength
+        self.params = params
+        # The fitted sklearn estimator, or after load_model its NumPy equivalent
+        self.model = None
+        self.folder_mapping = None
+
+    def new_model(self):
+        """A new, unfitted estimator. sklearn is only imported to train."""
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(**{
+            'loss': 'log_loss',
+            'alpha': 1e-5,
+            'random_state': 42,
+            **self.params
+        })
+
+    def fit(
+        self,
+        emails: List[EmailRecord],
+        folders: List[str],
+        sample_weight: np.ndarray = None,
+    ) -> Dict:
+        """
+        Fit the linear model and create folder mappings.
+
+        Args:
+            emails: EmailRecords to train on, with sender, subject, raw_body, list_id
+                and list_unsubscribe
+            folders: List of folder names corresponding to email indices
+            sample_weight: Optional weight of each email, used in training and
+                validation
+        """
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+
+        # Create numerical labels and folder mapping
+        unique_folders = list(set(folders))
+        self.folder_mapping = {i: folder for i, folder in enumerate(unique_folders)}
+        reverse_mapping = {folder: i for i, folder in self.folder_mapping.items()}
+
+        # Convert folder names to numerical labels
+        y = np.array([reverse_mapping[folder] for folder in folders])
+
+        if sample_weight is None:
+            sample_weight = np.ones(len(y))
+
+        # Split data for training and validation
+        train, val = train_test_split(np.arange(len(y)), test_size=0.2, random_state=42)
+
+        # Fit the model a batch at a time, so only one batch is ever vectorized
+        classes = np.arange(len(unique_folders))
+        self.model = self.new_model()
+        rng = np.random.default_rng(42)
+        for _ in range(EPOCHS):
+            order = rng.permutation(train)
+            for i in range(0, len(order), TRAIN_BATCH_SIZE):
+                batch = order[i:i + TRAIN_BATCH_SIZE]
+                X = vectorize([emails[j] for j in batch])
+                self.model.partial_fit(
+                    X, y[batch], classes=classes, sample_weight=sample_weight[batch]
+                )
+
+        # Calculate metrics
+        y_pred = self.model.predict(vectorize([emails[j] for j in val]))
+        accuracy = accuracy_score(y[val], y_pred, sample_weight=sample_weight[val])
+        precision, recall, f1, _ = precision_recall_fscore_support(
+            y[val], y_pred, average='weighted', sample_weight=sample_weight[val]
+        )
+
+        metrics = {
+            'accuracy': accuracy,
+            'precision': precision,
+            'recall': recall,
+            'f1': f1,
+            'num_samples': len(folders),
+            'num_folders': len(unique_folders)
+        }
+
+        return metrics
+
+    def classify_email(self, email: EmailRecord) -> str:
+        """
+        Classify an email into a folder from its hashed features.
+
+        Args:
+            email: The EmailRecord
+
+        Returns:
+            str: Predicted folder name
+        """
+        return self.classify_with_confidence(email)[0]
+
+    def classify_with_confidence(self, email: EmailRecord) -> Tuple[str, float]:
+        """
+        Classify an email and estimate the probability that the folder is right.
+
+        Args:
+            email: The EmailRecord
+
+        Returns:
+            Tuple[str, float]: Predicted folder name and its probability
+        """
+        if not email or self.folder_mapping is None:
+            return "UNKNOWN", 0.0
+
+        # The model's one-vs-rest probabilities, computed directly from the weights of
+        # the email's features rather than through sklearn's per-call input validation
+        indices, values = hash_features(email)
+        scores = self.model.coef_[:, indices] @ values + self.model.intercept_
+        probabilities = 1 / (1 + np.exp(-scores))
+        if len(probabilities) == 1:
+            probabilities = np.array([1 - probabilities[0], probabilities[0]])
+        probabilities = probabilities / probabilities.sum()
+        best = int(np.argmax(probabilities))
+        folder = self.folder_mapping[self.model.classes_[best]]
+        return folder, float(probabilities[best])
+
+    def save_model(self, path, metrics=None):
+        """Save the model weights, folder mapping, and metrics to disk as .npz"""
+        # Weights of hashed features no training email had stay zero, so they compress
+        # well
+        save_arrays(
+            path, "hashed", linear_arrays(self.model), self.folder_mapping, metrics,
+            compressed=True
+        )
+
+    def load_model(self, path) -> Dict:
+        """Load the model, folder mapping and metrics from disk, even pickled models"""
+        data = load_arrays(path, "hashed")
+        if data is None:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+            self.model = data['model']
+            self.folder_mapping = data['folder_mapping']
+            return data.get('metrics', {})
+        self.model = linear_model(data)
+        self.folder_mapping = data['folder_mapping']
+        return data['metrics']
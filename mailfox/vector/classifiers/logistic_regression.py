@@ -1,24 +1,41 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import numpy as np
-from sklearn.linear_model import LogisticRegression
 from collections import Counter
 import pickle
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+from .numpy_models import linear_arrays, linear_model, load_arrays, save_arrays
 
 class LogisticRegressionClassifier:
-    def __init__(self):
-        self.model = LogisticRegression(max_iter=1000)
+    def __init__(self, **params):
+        # Keyword arguments override the LogisticRegression defaults, e.g. C for the
+        # regularization strength
+        self.params = params
+        # The fitted sklearn estimator, or after load_model its NumPy equivalent
+        self.model = None
         self.folder_mapping = None
 
-    def fit(self, embeddings: np.ndarray, folders: List[str]) -> Dict:
+    def new_model(self):
+        """A new, unfitted estimator. sklearn is only imported to train."""
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(**{'max_iter': 1000, **self.params})
+
+    def fit(
+        self,
+        embeddings: np.ndarray,
+        folders: List[str],
+        sample_weight: np.ndarray = None,
+    ) -> Dict:
         """
         Fit the logistic regression model and create folder mappings.
         
         Args:
             embeddings: Input embeddings to train on
             folders: List of folder names corresponding to embedding indices
+            sample_weight: Optional weight of each embedding, used in training and
+                validation
         """
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+
         # Create numerical labels and folder mapping
         unique_folders = list(set(folders))
         self.folder_mapping = {i: folder for i, folder in enumerate(unique_folders)}
@@ -27,16 +44,24 @@ class LogisticRegressionClassifier:
         # Convert folder names to numerical labels
         y = np.array([reverse_mapping[folder] for folder in folders])
         
+        if sample_weight is None:
+            sample_weight = np.ones(len(y))
+
         # Split data for training and validation
-        X_train, X_val, y_train, y_val = train_test_split(embeddings, y, test_size=0.2, random_state=42)
+        X_train, X_val, y_train, y_val, w_train, w_val = train_test_split(
+            embeddings, y, sample_weight, test_size=0.2, random_state=42
+        )
         
         # Fit the model
-        self.model.fit(X_train, y_train)
+        self.model = self.new_model()
+        self.model.fit(X_train, y_train, sample_weight=w_train)
         
         # Calculate metrics
         y_pred = self.model.predict(X_val)
-        accuracy = accuracy_score(y_val, y_pred)
-        precision, recall, f1, _ = precision_recall_fscore_support(y_val, y_pred, average='weighted')
+        accuracy = accuracy_score(y_val, y_pred, sample_weight=w_val)
+        precision, recall, f1, _ = precision_recall_fscore_support(
+            y_val, y_pred, average='weighted', sample_weight=w_val
+        )
         
         metrics = {
             'accuracy': accuracy,
@@ -80,19 +105,44 @@ class LogisticRegressionClassifier:
         most_common_folder, _ = Counter(predictions).most_common(1)[0]
         return most_common_folder
 
+    def classify_with_confidence(
+        self, email_embeddings: List[np.ndarray]
+    ) -> Tuple[str, float]:
+        """
+        Classify an email and estimate the probability that the folder is right.
+
+        Args:
+            email_embeddings: List of embeddings from the email
+
+        Returns:
+            Tuple[str, float]: Predicted folder name and the logistic regression
+            probability of that folder, averaged over the embeddings
+        """
+        if not email_embeddings or self.model is None:
+            return "UNKNOWN", 0.0
+
+        chunk_probabilities = self.model.predict_proba(np.vstack(email_embeddings))
+        probabilities = chunk_probabilities.mean(axis=0)
+        best = int(np.argmax(probabilities))
+        folder = self.folder_mapping[self.model.classes_[best]]
+        return folder, float(probabilities[best])
+
     def save_model(self, path, metrics=None):
-        """Save the model, folder mapping, and metrics to disk"""
-        with open(path, 'wb') as f:
-            pickle.dump({
-                'model': self.model,
-                'folder_mapping': self.folder_mapping,
-                'metrics': metrics
-            }, f)
+        """Save the model weights, folder mapping, and metrics to disk as .npz"""
+        save_arrays(
+            path, "logistic_regression", linear_arrays(self.model),
+            self.folder_mapping, metrics
+        )
 
     def load_model(self, path) -> Dict:
-        """Load the model, folder mapping, and metrics from disk"""
-        with open(path, 'rb') as f:
-            data = pickle.load(f)
+        """Load the model, folder mapping and metrics from disk, even pickled models"""
+        data = load_arrays(path, "logistic_regression")
+        if data is None:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
             self.model = data['model']
             self.folder_mapping = data['folder_mapping']
             return data.get('metrics', {})
+        self.model = linear_model(data)
+        self.folder_mapping = data['folder_mapping']
+        return data['metrics']
@@ -0,0 +1,171 @@
+import json
+from typing import Dict, Optional
+
+import numpy as np
+from scipy.special import expit
+
+# Version of the exported model format, stored in every file
+FORMAT_VERSION = 1
+
+# Every .npz file is a zip archive; models saved before the format existed are pickles
+NPZ_MAGIC = b'PK\x03\x04'
+
+def _softmax(X: np.ndarray) -> np.ndarray:
+    """Row-wise softmax in place, in the same order of operations as sklearn."""
+    X -= X.max(axis=1).reshape((-1, 1))
+    np.exp(X, out=X)
+    X /= X.sum(axis=1).reshape((-1, 1))
+    return X
+
+def _relu(X: np.ndarray) -> None:
+    np.maximum(X, 0, out=X)
+
+def _logistic(X: np.ndarray) -> None:
+    expit(X, out=X)
+
+def _tanh(X: np.ndarray) -> None:
+    np.tanh(X, out=X)
+
+# MLP activations by their sklearn names, applied in place
+ACTIVATIONS = {
+    'identity': lambda X: None,
+    'relu': _relu,
+    'logistic': _logistic,
+    'tanh': _tanh,
+    'softmax': _softmax,
+}
+
+class LinearModel():
+    """
+    Predictions of a fitted sklearn linear classifier (LinearSVC, LogisticRegression,
+    SGDClassifier) from its weights alone, identical to the estimator's own.
+    """
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, classes: np.ndarray):
+        self.coef_ = coef
+        self.intercept_ = intercept
+        self.classes_ = classes
+
+    def decision_function(self, X) -> np.ndarray:
+        scores = np.asarray(X) @ self.coef_.T + self.intercept_
+        return scores.reshape(-1) if scores.shape[1] == 1 else scores
+
+    def predict(self, X) -> np.ndarray:
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            indices = (scores > 0).astype(int)
+        else:
+            indices = scores.argmax(axis=1)
+        return self.classes_[indices]
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Class probabilities as LogisticRegression computes them."""
+        scores = self.decision_function(X)
+        if len(self.classes_) <= 2:
+            probabilities = expit(scores, out=scores)
+            return np.stack([1 - probabilities, probabilities], axis=1)
+        return _softmax(scores)
+
+class MLPModel():
+    """
+    Predictions of a fitted sklearn MLPClassifier from its weights alone, identical to
+    the estimator's own.
+    """
+    def __init__(self, coefs: list, intercepts: list, activation: str,
+                 out_activation: str, classes: np.ndarray):
+        self.coefs_ = coefs
+        self.intercepts_ = intercepts
+        self.activation = activation
+        self.out_activation_ = out_activation
+        self.classes_ = classes
+
+    def _forward(self, X) -> np.ndarray:
+        activation = np.asarray(X)
+        for i, (coef, intercept) in enumerate(zip(self.coefs_, self.intercepts_)):
+            activation = activation @ coef
+            activation += intercept
+            if i != len(self.coefs_) - 1:
+                ACTIVATIONS[self.activation](activation)
+        ACTIVATIONS[self.out_activation_](activation)
+        return activation
+
+    def predict_proba(self, X) -> np.ndarray:
+        output = self._forward(X)
+        if output.shape[1] == 1:
+            output = output.ravel()
+            return np.vstack([1 - output, output]).T
+        return output
+
+    def predict(self, X) -> np.ndarray:
+        output = self._forward(X)
+        if output.shape[1] == 1:
+            return self.classes_[(output.ravel() > 0.5).astype(int)]
+        return self.classes_.take(output.argmax(axis=1))
+
+def linear_arrays(model) -> Dict[str, np.ndarray]:
+    """The weights of a fitted linear classifier, sklearn or LinearModel."""
+    return {
+        'coef': model.coef_,
+        'intercept': model.intercept_,
+        'classes': model.classes_,
+    }
+
+def mlp_arrays(model) -> Dict[str, np.ndarray]:
+    """The weights and activations of a fitted MLP, sklearn or MLPModel."""
+    arrays = {
+        'activation': np.array(model.activation),
+        'out_activation': np.array(model.out_activation_),
+        'classes': model.classes_,
+        'layers': np.array(len(model.coefs_)),
+    }
+    for i, (coef, intercept) in enumerate(zip(model.coefs_, model.intercepts_)):
+        arrays[f'coef_{i}'] = coef
+        arrays[f'intercept_{i}'] = intercept
+    return arrays
+
+def linear_model(arrays: Dict[str, np.ndarray]) -> LinearModel:
+    return LinearModel(arrays['coef'], arrays['intercept'], arrays['classes'])
+
+def mlp_model(arrays: Dict[str, np.ndarray]) -> MLPModel:
+    layers = int(arrays['layers'])
+    return MLPModel(
+        [arrays[f'coef_{i}'] for i in range(layers)],
+        [arrays[f'intercept_{i}'] for i in range(layers)],
+        str(arrays['activation']),
+        str(arrays['out_activation']),
+        arrays['classes']
+    )
+
+def _json_default(value):
+    """NumPy scalars in metrics as Python numbers, anything else as a string."""
+    return value.item() if hasattr(value, 'item') else str(value)
+
+def save_arrays(path, kind: str, arrays: Dict[str, np.ndarray], folder_mapping: Dict,
+                metrics: Optional[Dict] = None, compressed: bool = False) -> None:
+    """Save a model's weights, folder mapping and metrics as a .npz file."""
+    with open(path, 'wb') as f:
+        (np.savez_compressed if compressed else np.savez)(
+            f,
+            format_version=np.array(FORMAT_VERSION),
+            kind=np.array(kind),
+            folder_ids=np.array(list(folder_mapping.keys()), dtype=np.int64),
+            folder_names=np.array(list(folder_mapping.values()), dtype=str),
+            metrics=np.array(json.dumps(metrics, default=_json_default)),
+            **arrays
+        )
+
+def load_arrays(path, kind: str) -> Optional[Dict]:
+    """
+    Load a model saved by `save_arrays` without unpickling anything. Returns None if the
+    file is a pickled model from before the format existed.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(NPZ_MAGIC)) != NPZ_MAGIC:
+            return None
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    if str(arrays['kind']) != kind:
+        raise ValueError(f"{path} holds a {arrays['kind']} model, not {kind}")
+    folders = zip(arrays.pop('folder_ids'), arrays.pop('folder_names'))
+    arrays['folder_mapping'] = {int(i): str(name) for i, name in folders}
+    arrays['metrics'] = json.loads(str(arrays['metrics'])) or {}
+    return arrays
@@ -0,0 +1,160 @@
+import math
+import time
+import warnings
+from typing import Dict, List
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold
+
+from . import get_classifier_class
+
+# Configurations tried per classifier type
+SEARCH_SPACE = {
+    "svm": [{'C': C} for C in (0.01, 0.1, 1.0, 10.0)],
+    "logistic": [{'C': C} for C in (0.01, 0.1, 1.0, 10.0)],
+    "mlp": [
+        {'alpha': alpha, 'hidden_layer_sizes': sizes}
+        for alpha in (1e-4, 1e-2)
+        for sizes in ((64,), (128, 64))
+    ],
+}
+
+# Each successive halving round keeps 1/HALVING_FACTOR of the candidates and trains them
+# on HALVING_FACTOR times as many vectors
+HALVING_FACTOR = 3
+
+# Smallest training sample of a halving round, per folder
+MIN_SAMPLES_PER_FOLDER = 10
+
+# Validation vectors classified one at a time to measure predict latency
+LATENCY_SAMPLES = 50
+
+def _evaluate_fold(name, params, X, y, w, train, test):
+    """Fit a configuration on one fold: (accuracy, fit seconds, predict seconds)."""
+    classifier = get_classifier_class(name)(**params)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        start = time.perf_counter()
+        classifier.model = classifier.new_model()
+        classifier.model.fit(X[train], y[train], sample_weight=w[train])
+        fit_seconds = time.perf_counter() - start
+    predicted = classifier.model.predict(X[test])
+    accuracy = accuracy_score(y[test], predicted, sample_weight=w[test])
+
+    # The daemon classifies one email at a time, so time single-email calls
+    classifier.folder_mapping = {label: label for label in np.unique(y)}
+    sample = X[test][:LATENCY_SAMPLES]
+    start = time.perf_counter()
+    for row in sample:
+        classifier.classify_email([row])
+    predict_seconds = (time.perf_counter() - start) / len(sample)
+    return accuracy, fit_seconds, predict_seconds
+
+def _folds(y, folds, seed):
+    """Stratified train/test splits, with fewer folds if the smallest folder is tiny."""
+    folds = max(2, min(folds, np.unique(y, return_counts=True)[1].min()))
+    with warnings.catch_warnings():
+        # Folders with fewer vectors than folds are left out of some test splits
+        warnings.simplefilter("ignore", UserWarning)
+        splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+        return list(splitter.split(np.zeros(len(y)), y))
+
+def search_classifiers(
+    embeddings: np.ndarray,
+    folders: List[str],
+    sample_weight: np.ndarray = None,
+    classifiers: List[str] = None,
+    folds: int = 3,
+    n_jobs: int = -1,
+    tolerance: float = 0.01,
+    halving: bool = True,
+    seed: int = 42
+) -> Dict:
+    """
+    Cross-validate classifier types and regularization strengths in parallel.
+
+    With `halving`, every configuration is first scored on a small random sample of the
+    vectors and only the best 1/HALVING_FACTOR advance to the next round, which uses
+    HALVING_FACTOR times more vectors, until the last round uses all of them. Otherwise
+    every configuration is scored on all vectors (a grid search). Folds of every
+    configuration run in parallel across `n_jobs` processes. Fits and accuracies use
+    `sample_weight` if given.
+
+    Returns a dict with every scored configuration in `results` and the `best` one: the
+    configuration with the lowest predict latency among those whose final-round
+    accuracy is within `tolerance` of the most accurate.
+    """
+    X = np.asarray(embeddings, dtype=np.float32)
+    labels = {folder: i for i, folder in enumerate(sorted(set(folders)))}
+    y = np.array([labels[folder] for folder in folders])
+    if sample_weight is None:
+        w = np.ones(len(y))
+    else:
+        w = np.asarray(sample_weight, dtype=np.float64)
+    candidates = [
+        (name, params)
+        for name in (classifiers or list(SEARCH_SPACE))
+        for params in SEARCH_SPACE[name]
+    ]
+
+    rounds = 1
+    if halving:
+        rounds = max(1, math.ceil(math.log(len(candidates), HALVING_FACTOR)))
+    rng = np.random.default_rng(seed)
+    results = []
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for round_index in range(rounds):
+            samples = len(X) // HALVING_FACTOR ** (rounds - 1 - round_index)
+            samples = min(len(X), max(samples, MIN_SAMPLES_PER_FOLDER * len(labels)))
+            if samples < len(X):
+                subset = np.sort(rng.choice(len(X), samples, replace=False))
+            else:
+                subset = np.arange(len(X))
+            X_round, y_round, w_round = X[subset], y[subset], w[subset]
+            splits = _folds(y_round, folds, seed)
+
+            scores = parallel(
+                delayed(_evaluate_fold)(
+                    name, params, X_round, y_round, w_round, train, test
+                )
+                for name, params in candidates
+                for train, test in splits
+            )
+
+            round_results = []
+            for i, (name, params) in enumerate(candidates):
+                fold_scores = scores[i * len(splits):(i + 1) * len(splits)]
+                accuracy, fit_seconds, predict_seconds = zip(*fold_scores)
+                round_results.append({
+                    'classifier': name,
+                    'params': params,
+                    'round': round_index,
+                    'samples': samples,
+                    'accuracy': float(np.mean(accuracy)),
+                    'accuracy_std': float(np.std(accuracy)),
+                    'fit_seconds': float(np.mean(fit_seconds)),
+                    'predict_ms': float(np.mean(predict_seconds)) * 1000,
+                })
+            results.extend(round_results)
+
+            # Keep the most accurate configurations, preferring the faster fit on ties
+            round_results.sort(
+                key=lambda result: (-result['accuracy'], result['fit_seconds'])
+            )
+            keep = math.ceil(len(round_results) / HALVING_FACTOR)
+            if round_index < rounds - 1:
+                candidates = [
+                    (result['classifier'], result['params'])
+                    for result in round_results[:keep]
+                ]
+
+    best_accuracy = round_results[0]['accuracy']
+    eligible = [
+        result for result in round_results
+        if result['accuracy'] >= best_accuracy - tolerance
+    ]
+    best = min(eligible, key=lambda result: result['predict_ms'])
+    return {'results': results, 'best': best}
@@ -0,0 +1,78 @@
+import contextlib
+import sqlite3
+import threading
+
+class ThreadConnections():
+    """
+    One SQLite connection per thread to a database file.
+
+    Pipeline stages read and write emails.db concurrently, so instead of sharing a
+    single connection behind a lock every thread gets its own. The database runs in WAL
+    mode, so readers never wait on the writer, and writes go through `transaction()`,
+    which takes the write lock up front (BEGIN IMMEDIATE) so concurrent read-then-write
+    transactions wait for each other instead of failing with "database is locked".
+    """
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._generation = 0
+
+    def get(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            # isolation_level=None: statements autocommit unless inside transaction()
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None,
+                check_same_thread=False
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._lock:
+                self._connections.append(conn)
+                local.conn, local.depth, local.generation = conn, 0, self._generation
+        return local.conn
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Run a block as one write transaction on the calling thread's connection.
+
+        Nested uses join the outermost transaction, which commits when it exits cleanly
+        and rolls back if it raises.
+        """
+        conn = self.get()
+        local = self._local
+        if local.depth:
+            local.depth += 1
+            try:
+                yield conn
+            finally:
+                local.depth -= 1
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+        local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            local.depth = 0
+
+    def close(self) -> None:
+        """Close every thread's connection. Threads reconnect on their next use."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
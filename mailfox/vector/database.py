@@ -1,57 +1,134 @@
 import chromadb
+import json
 from chromadb.utils import embedding_functions
 import numpy as np
 from tqdm.auto import tqdm
-from enum import Enum
 import sqlite3
+import threading
 import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
 import os
+import queue
 import tiktoken
 from ..core.auth import read_credentials
-
-class EmbeddingFunctions(str, Enum):
-    SENTENCE_TRANSFORMER = "st"
-    OPENAI = "openai"
+from ..core import metrics
+from ..core.email_record import EmailRecord, display_date_timestamp
+from ..core.uid_set import UIDSet
+from .connections import ThreadConnections
+from .enums import EmbeddingFunctions, SearchModes
+from .near_duplicates import NearDuplicateIndex
+from .sender_rules import SenderRuleIndex
+from .training_set import build_training_set
 
 MAX_TOKENS = {
     "text-embedding-3-small": 8191,
     "all-MiniLM-L6-v2": 384
 }
 
-class VectorDatabase():
-    def __init__(self, db_path="./data/", *, embedding_function=None, openai_api_key=None):
-        self.chroma_client = chromadb.PersistentClient(os.path.join(db_path, "chroma"))
-        self.embedding_function_type = embedding_function
-        if embedding_function == EmbeddingFunctions.OPENAI:
-            if not openai_api_key:
-                raise ValueError("OpenAI API key is required for OpenAI embeddings")
-                
-            self.default_ef = embedding_functions.OpenAIEmbeddingFunction(api_key=openai_api_key, model_name="text-embedding-3-small")
-            self.max_tokens = MAX_TOKENS["text-embedding-3-small"]
+# Model behind each embedding function, recorded with the stored vectors
+EMBEDDING_MODELS = {
+    EmbeddingFunctions.SENTENCE_TRANSFORMER: "all-MiniLM-L6-v2",
+    EmbeddingFunctions.OPENAI: "text-embedding-3-small",
+}
+
+# Number of chunks sent to the embedding function per call
+EMBED_BATCH_SIZE = 256
+
+# Chunks the background worker embeds per call when completing progressive embeddings
+DEFERRED_BATCH_SIZE = 64
+
+# Stored vectors read from Chroma per call when loading training data
+TRAINING_PAGE_SIZE = 5000
+
+# Emails whose vectors are read from Chroma per call when loading a time window of
+# training data
+TRAINING_WINDOW_PAGE_SIZE = 500
+
+# Emails whose vectors are relabeled per Chroma call after they are moved
+RELABEL_PAGE_SIZE = 500
+
+# Message-IDs looked up per query when matching emails to rows stored under older uuids
+RESOLVE_PAGE_SIZE = 500
+
+# Concurrent embedding calls when re-embedding the stored emails
+REEMBED_WORKERS = 4
+
+# Emails read from SQLite per page while reindexing
+REINDEX_PAGE_SIZE = 1000
+
+# Columns of the emails table that make up an EmailRecord
+EMAIL_COLUMNS = (
+    "uuid, uid, folder, sender, recipient, subject, date, message_id, raw_body, "
+    "list_id, list_unsubscribe, date_ts"
+)
+
+# Constant from the reciprocal rank fusion paper, dampens the weight of top ranks
+RRF_K = 60
+
+# Process-wide caches, so every VectorDatabase on a path shares one Chroma client and
+# every user of an embedding model shares one loaded copy of it
+_factory_lock = threading.RLock()
+_chroma_clients = {}
+_embedding_functions = {}
+_databases = {}
+
+def get_chroma_client(path: str):
+    """Return the shared persistent Chroma client for a directory."""
+    path = os.path.abspath(os.path.expanduser(path))
+    with _factory_lock:
+        if path not in _chroma_clients:
+            _chroma_clients[path] = chromadb.PersistentClient(path)
+        return _chroma_clients[path]
+
+def get_embedding_function(embedding_function=None, openai_api_key=None):
+    """Return the shared embedding function of a type, loading its model once."""
+    if embedding_function == EmbeddingFunctions.OPENAI and not openai_api_key:
+        raise ValueError("OpenAI API key is required for OpenAI embeddings")
+    if embedding_function == EmbeddingFunctions.OPENAI:
+        key = (EmbeddingFunctions.OPENAI, openai_api_key)
+    else:
+        key = EmbeddingFunctions.SENTENCE_TRANSFORMER
+    with _factory_lock:
+        if key not in _embedding_functions:
+            if embedding_function == EmbeddingFunctions.OPENAI:
+                function = embedding_functions.OpenAIEmbeddingFunction(
+                    api_key=openai_api_key, model_name="text-embedding-3-small"
+                )
+            else:
+                function = embedding_functions.DefaultEmbeddingFunction()
+            _embedding_functions[key] = function
+        return _embedding_functions[key]
+
+class EmbeddingModel():
+    """An embedding function together with the chunking rules of its model."""
+    def __init__(self, embedding_function=None, openai_api_key=None):
+        self.function_type = (
+            EmbeddingFunctions.OPENAI if embedding_function == EmbeddingFunctions.OPENAI
+            else EmbeddingFunctions.SENTENCE_TRANSFORMER
+        )
+        self.name = EMBEDDING_MODELS[self.function_type]
+        self.ef = get_embedding_function(self.function_type, openai_api_key)
+        self.max_tokens = MAX_TOKENS[self.name]
+        if self.function_type == EmbeddingFunctions.OPENAI:
             self.tokenizer = tiktoken.get_encoding("cl100k_base")  # OpenAI's encoding
         else:
-            self.default_ef = embedding_functions.DefaultEmbeddingFunction()
-            self.max_tokens = MAX_TOKENS["all-MiniLM-L6-v2"]
             self.tokenizer = None
-        
-        self.emails_collection = self.chroma_client.get_or_create_collection(name="emails", embedding_function=self.default_ef)
-        self.email_db_path = os.path.join(db_path, "emails.db")
-        self._init_email_db()
 
-    def _count_tokens(self, text: str) -> int:
+    def count_tokens(self, text: str) -> int:
         """Count the number of tokens in a text string."""
-        if self.embedding_function_type == EmbeddingFunctions.OPENAI:
+        if self.function_type == EmbeddingFunctions.OPENAI:
             return len(self.tokenizer.encode(text))
         else:
             # Rough estimate for sentence transformers
             return len(text.split())
 
-    def _chunk_text(self, text: str) -> list[str]:
+    def chunk_text(self, text: str) -> list[str]:
         """Break text into chunks that fit within token limit."""
         if not text:
             return []
 
-        if self.embedding_function_type == EmbeddingFunctions.OPENAI:
+        if self.function_type == EmbeddingFunctions.OPENAI:
             # Split into sentences first
             sentences = text.replace('\n', ' ').split('. ')
             chunks = []
@@ -60,7 +137,7 @@ class VectorDatabase():
 
             for sentence in sentences:
                 sentence = sentence.strip() + '.'
-                sentence_length = self._count_tokens(sentence)
+                sentence_length = self.count_tokens(sentence)
 
                 # If single sentence is too long, split it
                 if sentence_length > self.max_tokens:
@@ -68,7 +145,7 @@ class VectorDatabase():
                     temp_chunk = []
                     temp_length = 0
                     for word in words:
-                        word_length = self._count_tokens(word + ' ')
+                        word_length = self.count_tokens(word + ' ')
                         if temp_length + word_length > self.max_tokens:
                             chunks.append(' '.join(temp_chunk))
                             temp_chunk = [word]
@@ -100,20 +177,91 @@ class VectorDatabase():
             # For sentence transformers, use simpler chunking
             return textwrap.wrap(text, width=self.max_tokens * 4, break_long_words=True)
 
-    def embed_paragraphs(self, paragraphs: list[str]):
+    def chunk_paragraphs(self, paragraphs: list[str]) -> list[str]:
+        """Split paragraphs into the chunks that are embedded, one vector per chunk."""
         chunked_paragraphs = []
         for p in paragraphs:
-            chunks = self._chunk_text(p)
+            chunks = self.chunk_text(p)
             chunked_paragraphs.extend(chunks)
         
-        if not chunked_paragraphs:
-            return []
-            
         # For OpenAI, ensure no chunk exceeds the token limit
-        if self.embedding_function_type == EmbeddingFunctions.OPENAI:
+        if self.function_type == EmbeddingFunctions.OPENAI:
             chunked_paragraphs = [chunk for chunk in chunked_paragraphs 
-                                if self._count_tokens(chunk) <= self.max_tokens]
+                                if self.count_tokens(chunk) <= self.max_tokens]
             
+        return chunked_paragraphs
+
+    @metrics.timed("embed")
+    def embed(self, text: list[str]):
+        metrics.increment("chunks_embedded_total", len(text))
+        return self.ef(text)
+
+def get_vector_database(db_path="./data/", *, embedding_function=None,
+                        openai_api_key=None, **options) -> "VectorDatabase":
+    """
+    Return the process-wide VectorDatabase for a path, creating it on first use.
+
+    Later calls with the same path, embedding function and options get the same
+    initialized instance, so commands and pipeline stages share its clients, model and
+    connections. Different options (e.g. `near_duplicate_threshold`) get an instance of
+    their own.
+    """
+    key = (
+        os.path.abspath(os.path.expanduser(db_path)), embedding_function,
+        openai_api_key, tuple(sorted(options.items()))
+    )
+    with _factory_lock:
+        if key not in _databases:
+            _databases[key] = VectorDatabase(
+                db_path,
+                embedding_function=embedding_function,
+                openai_api_key=openai_api_key,
+                **options
+            )
+        return _databases[key]
+
+class VectorDatabase():
+    def __init__(self, db_path="./data/", *, embedding_function=None,
+                 openai_api_key=None, near_duplicate_threshold=0.9,
+                 sender_rule_min_support=5,
+                 sender_rule_min_purity=0.95):
+        self.chroma_client = get_chroma_client(os.path.join(db_path, "chroma"))
+        self.openai_api_key = openai_api_key
+        # The configured model; the active collection may still hold another until
+        # reindexed
+        self.embedding_function_type = embedding_function
+        self.embedding_model = EMBEDDING_MODELS[
+            EmbeddingFunctions.OPENAI if embedding_function == EmbeddingFunctions.OPENAI
+            else EmbeddingFunctions.SENTENCE_TRANSFORMER
+        ]
+        self.email_db_path = os.path.join(db_path, "emails.db")
+        self.connections = ThreadConnections(self.email_db_path)
+        # Remaining chunks of progressively embedded emails, for a background worker
+        self._deferred = queue.Queue()
+        self._deferred_worker = None
+        self._deferred_lock = threading.Lock()
+        self._init_email_db()
+        self._open_active_collection()
+        self.near_duplicates = NearDuplicateIndex(
+            self.connections, threshold=near_duplicate_threshold
+        )
+        self.sender_rules = SenderRuleIndex(
+            self.connections,
+            min_support=sender_rule_min_support,
+            min_purity=sender_rule_min_purity
+        )
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's connection to emails.db."""
+        return self.connections.get()
+
+    def _chunk_paragraphs(self, paragraphs: list[str]) -> list[str]:
+        """Split paragraphs into the chunks the active model embeds, one vector each."""
+        return self.model.chunk_paragraphs(paragraphs)
+
+    def embed_paragraphs(self, paragraphs: list[str]):
+        chunked_paragraphs = self._chunk_paragraphs(paragraphs)
         if not chunked_paragraphs:
             return []
             
@@ -121,116 +269,578 @@ class VectorDatabase():
         return embeddings
 
     def _init_email_db(self):
-        self.conn = sqlite3.connect(self.email_db_path)
-        self.cursor = self.conn.cursor()
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS emails (
-                uuid TEXT PRIMARY KEY,
-                uid TEXT,
-                folder TEXT,
-                sender TEXT,
-                recipient TEXT,
-                subject TEXT,
-                date TEXT,
-                message_id TEXT,
-                raw_body TEXT
+        with self.connections.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS emails (
+                    uuid TEXT PRIMARY KEY,
+                    uid TEXT,
+                    folder TEXT,
+                    sender TEXT,
+                    recipient TEXT,
+                    subject TEXT,
+                    date TEXT,
+                    message_id TEXT,
+                    raw_body TEXT,
+                    list_id TEXT,
+                    list_unsubscribe TEXT,
+                    date_ts INTEGER,
+                    auto_filed INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            self._migrate_email_db(conn)
+            # Seen UIDs as inclusive ranges, which stay few even for huge folders
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS seen_uid_ranges (
+                    folder TEXT,
+                    first_uid INTEGER,
+                    last_uid INTEGER,
+                    PRIMARY KEY (folder, first_uid)
+                )
+            ''')
+            self._migrate_seen_uids(conn)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_checkpoints (
+                    folder TEXT PRIMARY KEY,
+                    uidvalidity INTEGER,
+                    last_uid INTEGER,
+                    batches INTEGER,
+                    completed INTEGER
+                )
+            ''')
+            # Footer line counts TextCleaner learned during the initial sync
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sender_footers (
+                    sender TEXT PRIMARY KEY,
+                    seen INTEGER,
+                    counts TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS vector_collections (
+                    name TEXT PRIMARY KEY,
+                    embedding_function TEXT,
+                    embedding_model TEXT,
+                    status TEXT,
+                    created_at REAL,
+                    activated_at REAL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS reindex_progress (
+                    collection TEXT,
+                    uuid TEXT,
+                    PRIMARY KEY (collection, uuid)
+                )
+            ''')
+            self._init_fts(conn)
+
+    def _migrate_email_db(self, conn):
+        """Add columns introduced after the emails table was first created."""
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(emails)')}
+        if 'list_id' not in columns:
+            conn.execute('ALTER TABLE emails ADD COLUMN list_id TEXT')
+        if 'list_unsubscribe' not in columns:
+            conn.execute('ALTER TABLE emails ADD COLUMN list_unsubscribe TEXT')
+        if 'date_ts' not in columns:
+            conn.execute('ALTER TABLE emails ADD COLUMN date_ts INTEGER')
+            # Older rows only have the display date, written in this machine's local
+            # time
+            rows = conn.execute(
+                'SELECT uuid, date FROM emails WHERE date IS NOT NULL'
+            ).fetchall()
+            updates = [(display_date_timestamp(date), uuid) for uuid, date in rows]
+            conn.executemany(
+                'UPDATE emails SET date_ts = ? WHERE uuid = ?',
+                [update for update in updates if update[0] is not None]
             )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS seen_uids (
-                uid INTEGER,
-                folder TEXT,
-                PRIMARY KEY (uid, folder)
+        conn.execute('CREATE INDEX IF NOT EXISTS emails_date_ts ON emails (date_ts)')
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS emails_message_id ON emails (message_id)'
+        )
+        if 'auto_filed' not in columns:
+            # Whether mailfox filed the email itself; older rows count as the user's
+            conn.execute(
+                'ALTER TABLE emails ADD COLUMN auto_filed INTEGER NOT NULL DEFAULT 0'
             )
-        ''')
-        self.conn.commit()
+
+    def _migrate_seen_uids(self, conn):
+        """Convert the one-row-per-UID seen_uids table of older databases to ranges."""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'seen_uids'"
+        ).fetchone()
+        if exists is None:
+            return
+        folder_uids = {}
+        for uid, folder in conn.execute('SELECT uid, folder FROM seen_uids'):
+            folder_uids.setdefault(folder, []).append(uid)
+        for folder, uids in folder_uids.items():
+            self._add_seen_uids(conn, folder, uids)
+        conn.execute('DROP TABLE seen_uids')
+
+    def _init_fts(self, conn):
+        """Create the FTS5 index over subject, sender and body, and backfill it."""
+        try:
+            conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+                    uuid UNINDEXED,
+                    subject,
+                    sender,
+                    raw_body
+                )
+            ''')
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable, SQLite was built without FTS5: {e}")
+            self.fts_enabled = False
+            return
+
+        fts_populated = conn.execute(
+            'SELECT EXISTS (SELECT 1 FROM emails_fts)'
+        ).fetchone()[0]
+        emails_populated = conn.execute(
+            'SELECT EXISTS (SELECT 1 FROM emails)'
+        ).fetchone()[0]
+        if emails_populated and not fts_populated:
+            rows = conn.execute(
+                'SELECT uuid, subject, sender, raw_body FROM emails'
+            ).fetchall()
+            conn.executemany(
+                'INSERT INTO emails_fts (rowid, uuid, subject, sender, raw_body) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(self._fts_rowid(row[0]), *row) for row in rows]
+            )
+
+    @staticmethod
+    def _fts_rowid(uuid):
+        """A stable FTS rowid derived from the email uuid, so updates are lookups."""
+        return int(uuid[:15], 16)
+
+    def _index_email_text(self, uuid, subject, sender, raw_body):
+        """Keep the FTS index in sync with the emails table."""
+        if not self.fts_enabled:
+            return
+        rowid = self._fts_rowid(uuid)
+        self.conn.execute('DELETE FROM emails_fts WHERE rowid = ?', (rowid,))
+        self.conn.execute(
+            'INSERT INTO emails_fts (rowid, uuid, subject, sender, raw_body) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (rowid, uuid, subject, sender, raw_body)
+        )
 
     def is_emails_empty(self):
         docs = self.emails_collection.get(include=[])
         return len(docs['ids']) == 0
 
     def embed(self, text: list[str]):
-        return self.default_ef(text)
+        """Embed text with the model of the active collection."""
+        return self.model.embed(text)
+
+    def resolve_uuids(self, emails: list[EmailRecord]) -> dict:
+        """
+        Give emails stored under an older uuid that uuid again, so they aren't stored
+        twice.
+
+        Emails with a Message-ID used to be hashed with their body, so their stored rows
+        don't match the uuid `EmailHandler.hash_email` gives them now. A stored row is
+        the same email if its Message-ID, sender, recipient, subject and date all match.
+        Rewrites the emails' uuids in place and returns {new uuid: stored uuid} for
+        those that changed.
+        """
+        by_key = {}
+        for mail in emails:
+            if mail.message_id:
+                key = (
+                    mail.message_id, mail.sender, mail.recipient, mail.subject,
+                    mail.date
+                )
+                by_key.setdefault(key, []).append(mail)
+        message_ids = list({key[0] for key in by_key})
+        resolved = {}
+        for i in range(0, len(message_ids), RESOLVE_PAGE_SIZE):
+            page = message_ids[i:i + RESOLVE_PAGE_SIZE]
+            placeholders = ', '.join('?' * len(page))
+            rows = self.conn.execute(
+                'SELECT message_id, sender, recipient, subject, date, MIN(uuid) '
+                f'FROM emails WHERE message_id IN ({placeholders}) '
+                'GROUP BY message_id, sender, recipient, subject, date',
+                page
+            ).fetchall()
+            for *key, uuid in rows:
+                for mail in by_key.get(tuple(key), []):
+                    if mail.uuid != uuid:
+                        resolved[mail.uuid] = uuid
+                        mail.uuid = uuid
+        return resolved
+
+    def _get_stored_embeddings(self, uuids):
+        """The stored paragraph embeddings of emails by uuid, in paragraph order."""
+        if not uuids:
+            return {}
+        docs = self.emails_collection.get(
+            where={'uuid': {'$in': list(uuids)}},
+            include=['embeddings', 'metadatas']
+        )
+        order = sorted(
+            range(len(docs['ids'])),
+            key=lambda i: docs['metadatas'][i]['paragraph_index']
+        )
+        stored = {}
+        for i in order:
+            uuid = docs['metadatas'][i]['uuid']
+            stored.setdefault(uuid, []).append(docs['embeddings'][i])
+        return stored
+
+    def embed_emails(
+        self,
+        emails: list[EmailRecord],
+        batch_size: int = EMBED_BATCH_SIZE,
+        progressive=(),
+    ) -> dict:
+        """
+        Compute the paragraph embeddings of a batch of emails without storing them.
+
+        Emails already in the vector store reuse their stored vectors, and new emails
+        that are near-duplicates of a stored (or earlier in the batch) email reuse that
+        email's vectors. Everything else is chunked and embedded in batched calls. Of
+        the new emails whose uuid is in `progressive`, only the first chunk is embedded;
+        `embed_more` embeds more of them.
+
+        Returns a dict with the stacked `embeddings` matrix, the `offsets` (start, end)
+        rows of each email's chunks keyed by uuid, the `new_uuids` that still need to be
+        stored, their near-duplicate `signatures`, the chunks of progressive emails
+        still to embed (`remaining`, keyed by uuid) and the `collection` whose model
+        produced the vectors. The result can be used for classification and then passed
+        to `store_emails` so nothing is embedded or read back twice.
+        """
+        emails = [mail for mail in emails if mail.paragraphs]
+        resolved = self.resolve_uuids(emails)
+        progressive = {resolved.get(uuid, uuid) for uuid in progressive}
+        stored = self._get_stored_embeddings({mail.uuid for mail in emails})
+
+        sources = {}
+        signatures = {}
+        batch_buckets = {}
+        pending_chunks = []
+        remaining = {}
+        reused = 0
+        for mail in emails:
+            uuid = mail.uuid
+            if uuid in stored or uuid in sources:
+                continue
+
+            signature = self.near_duplicates.signature(' '.join(mail.paragraphs))
+            signatures[uuid] = signature
+            duplicate_uuid = self.near_duplicates.find(signature)
+            duplicate_uuid = duplicate_uuid or self.near_duplicates.find_in(
+                signature, batch_buckets
+            )
+            if (duplicate_uuid and duplicate_uuid not in stored
+                    and duplicate_uuid not in sources):
+                stored.update(self._get_stored_embeddings([duplicate_uuid]))
+            if duplicate_uuid and (
+                duplicate_uuid in stored or duplicate_uuid in sources
+            ):
+                sources[uuid] = ('duplicate', duplicate_uuid)
+                reused += 1
+                continue
+
+            chunks = self._chunk_paragraphs(mail.paragraphs)
+            if uuid in progressive and len(chunks) > 1:
+                remaining[uuid] = chunks[1:]
+                chunks = chunks[:1]
+            start = len(pending_chunks)
+            sources[uuid] = ('pending', start, start + len(chunks))
+            pending_chunks.extend(chunks)
+            # Duplicates later in the batch would only get the first chunk's vector
+            if uuid not in remaining:
+                self.near_duplicates.add_to(uuid, signature, batch_buckets)
+
+        metrics.increment(
+            "embedding_cache_hits_total", len(emails) - len(signatures) + reused
+        )
+        metrics.increment("embedding_cache_misses_total", len(signatures) - reused)
+
+        pending_embeddings = []
+        for i in range(0, len(pending_chunks), batch_size):
+            pending_embeddings.extend(self.embed(pending_chunks[i:i + batch_size]))
+
+        def email_embeddings(uuid):
+            if uuid in stored:
+                return stored[uuid]
+            source = sources[uuid]
+            if source[0] == 'duplicate':
+                return email_embeddings(source[1])
+            return pending_embeddings[source[1]:source[2]]
 
-    def store_emails(self, emails: list[dict]):
-        for idx, mail in enumerate(tqdm(emails, desc="Saving Emails to Database")):
+        rows = []
+        offsets = {}
+        for mail in emails:
+            uuid = mail.uuid
+            if uuid in offsets:
+                continue
+            vectors = email_embeddings(uuid)
+            offsets[uuid] = (len(rows), len(rows) + len(vectors))
+            rows.extend(vectors)
+
+        if reused:
+            print(
+                f"Reused embeddings of near-duplicate emails for {reused} of "
+                f"{len(emails)} emails"
+            )
+
+        return {
+            'embeddings': np.array(rows) if rows else np.empty((0, 0)),
+            'offsets': offsets,
+            'new_uuids': set(sources),
+            'signatures': signatures,
+            'remaining': remaining,
+            'collection': self.active_collection,
+        }
+
+    def embed_more(
+        self,
+        embedded: dict,
+        uuids,
+        max_chunks: int = 1,
+        batch_size: int = EMBED_BATCH_SIZE,
+    ) -> dict:
+        """
+        Embed up to `max_chunks` more of the remaining chunks of progressively embedded
+        emails.
+
+        Returns `embedded` (from `embed_emails`) extended with the new vectors.
+        """
+        remaining = dict(embedded['remaining'])
+        pending_chunks = []
+        spans = {}
+        for uuid in uuids:
+            chunks = remaining.get(uuid, [])[:max_chunks]
+            spans[uuid] = (len(pending_chunks), len(pending_chunks) + len(chunks))
+            pending_chunks.extend(chunks)
+            remaining[uuid] = remaining.get(uuid, [])[len(chunks):]
+
+        pending_embeddings = []
+        for i in range(0, len(pending_chunks), batch_size):
+            pending_embeddings.extend(self.embed(pending_chunks[i:i + batch_size]))
+
+        rows = []
+        offsets = {}
+        for uuid, (start, end) in embedded['offsets'].items():
+            vectors = list(embedded['embeddings'][start:end])
+            if uuid in spans:
+                vectors.extend(pending_embeddings[spans[uuid][0]:spans[uuid][1]])
+            offsets[uuid] = (len(rows), len(rows) + len(vectors))
+            rows.extend(vectors)
+
+        return {
+            **embedded,
+            'embeddings': np.array(rows) if rows else np.empty((0, 0)),
+            'offsets': offsets,
+            'remaining': {uuid: chunks for uuid, chunks in remaining.items() if chunks},
+        }
+
+    @metrics.timed("store_emails")
+    def store_emails(self, emails: list[EmailRecord], embedded: dict = None,
+                     batch_size: int = EMBED_BATCH_SIZE, auto_filed=()):
+        """
+        Store emails and their paragraph embeddings.
+
+        `embedded` is the result of `embed_emails` for these emails. If it is not given,
+        the emails are embedded here in batches of `batch_size`. `auto_filed` holds the
+        uuids of emails mailfox filed into their folder itself; only the others teach
+        sender rules.
+        """
+        resolved = self.resolve_uuids(emails)
+        auto_filed = {resolved.get(uuid, uuid) for uuid in auto_filed}
+        if (embedded is not None
+                and embedded.get('collection') != self.active_collection):
+            # Embedded before a reindex swapped the collection, so the vectors are from
+            # the old model
+            embedded = None
+        if embedded is None:
+            for i in range(0, len(emails), batch_size):
+                batch = emails[i:i + batch_size]
+                self._store_embedded(batch, self.embed_emails(batch), auto_filed)
+            return
+
+        # Emails the caller didn't need embeddings for (e.g. classified by a sender
+        # rule)
+        missing = [
+            mail
+            for mail in emails
+            if mail.paragraphs and mail.uuid not in embedded['offsets']
+        ]
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            self._store_embedded(batch, self.embed_emails(batch), auto_filed)
+
+        self._store_embedded(emails, embedded, auto_filed)
+
+    def _store_embedded(self, emails: list[EmailRecord], embedded: dict,
+                        auto_filed=frozenset()):
+        for mail in tqdm(emails, desc="Saving Emails to Database", leave=False):
             try:
-                uuid = mail['uuid']
-                paragraphs = mail.get('paragraphs', [])
-                if not paragraphs:
+                uuid = mail.uuid
+                if uuid not in embedded['offsets']:
                     continue
 
-                # Check if email exists in ChromaDB first
-                test_ids = [f"{uuid}_0"]  # Check first paragraph ID
-                existing = self.emails_collection.get(
-                    ids=test_ids,
-                    include=[]
-                )
-                email_exists = len(existing['ids']) > 0
+                with self.connections.transaction() as conn:
+                    previous = conn.execute(
+                        'SELECT sender, list_id, folder, auto_filed FROM emails '
+                        'WHERE uuid = ?',
+                        (uuid,)
+                    ).fetchone()
+                    # Seen again where mailfox filed it (e.g. on a recache), it is still
+                    # mailfox's decision rather than the user's
+                    auto = uuid in auto_filed or bool(
+                        previous is not None
+                        and previous[3]
+                        and previous[2] == mail.folder
+                    )
+
+                    # Store email metadata in SQLite database
+                    conn.execute('''
+                        INSERT OR REPLACE INTO emails (
+                            uuid, uid, folder, sender, recipient, subject, date,
+                            message_id, raw_body, list_id, list_unsubscribe, date_ts,
+                            auto_filed
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        uuid, mail.uid, mail.folder, mail.sender, mail.recipient,
+                        mail.subject, mail.date, mail.message_id, mail.raw_body,
+                        mail.list_id, mail.list_unsubscribe, mail.date_ts, int(auto)
+                    ))
+                    self._index_email_text(
+                        uuid, mail.subject, mail.sender, mail.raw_body
+                    )
 
-                # Store email metadata in SQLite database
-                self.cursor.execute('''
-                    INSERT OR REPLACE INTO emails (uuid, uid, folder, sender, recipient, subject, date, message_id, raw_body)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (uuid, mail['uid'], mail['folder'], mail['from'], mail['to'], mail['subject'], mail['date'], mail['message_id'], mail['raw_body']))
-                self.conn.commit()
+                    # Keep the sender rule counts in step with where the user filed the
+                    # email. Mail mailfox filed would otherwise confirm its own rules
+                    counted = previous is not None and not previous[3]
+                    if counted and (auto or previous[2] != mail.folder):
+                        self.sender_rules.record(*previous[:3], delta=-1)
+                    if not auto and not (counted and previous[2] == mail.folder):
+                        self.sender_rules.record(mail.sender, mail.list_id, mail.folder)
 
-                if email_exists:
+                start, end = embedded['offsets'][uuid]
+                if start == end:
+                    continue
+                ids = [f"{uuid}_{i}" for i in range(end - start)]
+                metadatas = [
+                    {'uuid': uuid, 'folder': mail.folder, 'paragraph_index': i}
+                    for i in range(end - start)
+                ]
+
+                if uuid not in embedded['new_uuids']:
                     # Only update metadata if email exists
-                    ids = [f"{uuid}_{i}" for i in range(len(paragraphs))]
-                    metadatas = [{'uuid': uuid, 'folder': mail['folder'], 'paragraph_index': i} for i in range(len(paragraphs))]
-                    existing_ids = set(self.emails_collection.get(
-                        ids=ids,
-                        include=[]
-                    )['ids'])
-                    for i, vec_id in enumerate(ids):
-                        if vec_id in existing_ids:
-                            self.emails_collection.update(
-                                ids=[vec_id],
-                                metadatas=[metadatas[i]]
-                            )
+                    self.emails_collection.update(ids=ids, metadatas=metadatas)
                 else:
-                    # Only calculate embeddings for new emails
-                    try:
-                        embeddings = self.embed_paragraphs(paragraphs)
-                        if embeddings:
-                            ids = [f"{uuid}_{i}" for i in range(len(embeddings))]
-                            metadatas = [{'uuid': uuid, 'folder': mail['folder'], 'paragraph_index': i} for i in range(len(embeddings))]
-                            self.emails_collection.add(
-                                ids=ids,
-                                embeddings=embeddings,
-                                metadatas=metadatas
-                            )
-                    except Exception as e:
-                        print(f"Error embedding new email {uuid}: {e}")
+                    self.emails_collection.add(
+                        ids=ids,
+                        embeddings=embedded['embeddings'][start:end],
+                        metadatas=metadatas
+                    )
+                    with self.connections.transaction():
+                        self.near_duplicates.add(uuid, embedded['signatures'].get(uuid))
+                    if embedded.get('remaining', {}).get(uuid):
+                        self._defer_chunks(
+                            uuid,
+                            mail.folder,
+                            end - start,
+                            embedded['remaining'][uuid],
+                            embedded['collection'],
+                        )
+                metrics.increment("emails_stored_total")
             except Exception as e:
                 print(f"Error storing embeddings for email {uuid}: {e}")
 
+    def _defer_chunks(self, uuid, folder, first_index, chunks, collection):
+        """
+        Queue the chunks of a stored email that weren't embedded yet, starting the
+        worker if needed.
+        """
+        metrics.increment("chunks_deferred_total", len(chunks))
+        self._deferred.put((uuid, folder, first_index, chunks, collection))
+        with self._deferred_lock:
+            if self._deferred_worker is None:
+                self._deferred_worker = threading.Thread(
+                    target=self._embed_deferred, name="deferred-embedding", daemon=True
+                )
+                self._deferred_worker.start()
+
+    def _embed_deferred(self):
+        """
+        Embed and store deferred chunks in batches, one at a time so the embedding model
+        stays free for classification most of the time.
+        """
+        while True:
+            batch = [self._deferred.get()]
+            chunks = len(batch[0][3])
+            while chunks < DEFERRED_BATCH_SIZE:
+                try:
+                    batch.append(self._deferred.get_nowait())
+                except queue.Empty:
+                    break
+                chunks += len(batch[-1][3])
+            try:
+                # A reindex re-embeds every email anew, so skip old collections' work
+                items = [item for item in batch if item[4] == self.active_collection]
+                if items:
+                    embeddings = self.embed(
+                        [chunk for item in items for chunk in item[3]]
+                    )
+                    # The email may have been moved, or its move undone, since it
+                    # was queued
+                    uuids = [item[0] for item in items]
+                    placeholders = ', '.join('?' * len(uuids))
+                    current = dict(self.conn.execute(
+                        'SELECT uuid, folder FROM emails '
+                        f'WHERE uuid IN ({placeholders})',
+                        uuids
+                    ).fetchall())
+                    ids, metadatas = [], []
+                    for uuid, folder, first_index, item_chunks, _ in items:
+                        folder = current.get(uuid, folder)
+                        for i in range(first_index, first_index + len(item_chunks)):
+                            ids.append(f"{uuid}_{i}")
+                            metadatas.append(
+                                {'uuid': uuid, 'folder': folder, 'paragraph_index': i}
+                            )
+                    self.emails_collection.add(
+                        ids=ids, embeddings=list(embeddings), metadatas=metadatas
+                    )
+            except Exception as e:
+                print(f"Error storing deferred embeddings: {e}")
+            finally:
+                for _ in batch:
+                    self._deferred.task_done()
+
+    def flush_deferred(self):
+        """Wait until every deferred chunk is embedded and stored."""
+        self._deferred.join()
+
     def get_all_emails(self):
         """Retrieve all emails from the SQLite database."""
-        self.cursor.execute('''
-            SELECT uuid, uid, folder, sender, recipient, subject, date, message_id, raw_body 
-            FROM emails
-        ''')
-        rows = self.cursor.fetchall()
-        
-        emails = []
-        for row in rows:
-            email = {
-                'uuid': row[0],
-                'uid': row[1],
-                'folder': row[2],
-                'from': row[3],
-                'to': row[4],
-                'subject': row[5],
-                'date': row[6],
-                'message_id': row[7],
-                'raw_body': row[8],
-                'paragraphs': self._get_paragraphs_from_raw_body(row[8])
-            }
-            emails.append(email)
-        
-        return emails
+        rows = self.conn.execute(f'SELECT {EMAIL_COLUMNS} FROM emails').fetchall()
+        return [self._email_from_row(row) for row in rows]
+
+    def _email_from_row(self, row):
+        return EmailRecord(
+            uuid=row[0],
+            uid=row[1],
+            folder=row[2],
+            sender=row[3],
+            recipient=row[4],
+            subject=row[5],
+            date=row[6],
+            message_id=row[7],
+            raw_body=row[8],
+            list_id=row[9],
+            list_unsubscribe=row[10],
+            date_ts=row[11],
+            paragraphs=self._get_paragraphs_from_raw_body(row[8])
+        )
 
     def _get_paragraphs_from_raw_body(self, raw_body):
         """Extract paragraphs from raw body text."""
@@ -243,61 +853,675 @@ class VectorDatabase():
         paragraphs = [p for p in paragraphs if p]
         return paragraphs
 
+    def _get_model(self, embedding_function) -> EmbeddingModel:
+        api_key = self.openai_api_key
+        if embedding_function == EmbeddingFunctions.OPENAI and not api_key:
+            # Serving an OpenAI collection after the config moved to another model
+            try:
+                _, _, api_key = read_credentials()
+            except FileNotFoundError:
+                pass
+        return EmbeddingModel(embedding_function, api_key)
+
+    def _open_collection(self, name, model: EmbeddingModel):
+        return self.chroma_client.get_or_create_collection(
+            name=name,
+            embedding_function=model.ef,
+            metadata={
+                'embedding_function': model.function_type.value,
+                'embedding_model': model.name
+            }
+        )
+
+    def _get_active_collection(self):
+        return self.conn.execute(
+            "SELECT name, embedding_function FROM vector_collections "
+            "WHERE status = 'active'"
+        ).fetchone()
+
+    def _open_active_collection(self):
+        """Serve from the active collection, registering the original "emails" one."""
+        active = self._get_active_collection()
+        if active is None:
+            # Stores from before collections were tracked have a single "emails"
+            # collection, embedded with the model recorded on it or else the configured
+            # one
+            legacy = self.chroma_client.get_or_create_collection(
+                name="emails", embedding_function=None
+            )
+            stored_model = (legacy.metadata or {}).get(
+                'embedding_model', self.embedding_model
+            )
+            functions = {
+                model: function for function, model in EMBEDDING_MODELS.items()
+            }
+            function = functions.get(
+                stored_model, EmbeddingFunctions.SENTENCE_TRANSFORMER
+            )
+            with self.connections.transaction() as conn:
+                conn.execute('''
+                    INSERT OR IGNORE INTO vector_collections
+                        (name, embedding_function, embedding_model, status, created_at,
+                         activated_at)
+                    VALUES ('emails', ?, ?, 'active', ?, ?)
+                ''', (function.value, stored_model, time.time(), time.time()))
+            active = self._get_active_collection()
+
+        name, function = active
+        self.model = self._get_model(EmbeddingFunctions(function))
+        self.emails_collection = self._open_collection(name, self.model)
+        self.active_collection = name
+
+    def refresh_active_collection(self) -> bool:
+        """
+        Switch to the active collection if another process swapped in a reindexed one.
+
+        Emails stored in the old collection after the reindex finished are embedded into
+        the new one first. Returns whether the collection changed.
+        """
+        active = self._get_active_collection()
+        if active is None or active[0] == self.active_collection:
+            return False
+        name, function = active
+        model = self._get_model(EmbeddingFunctions(function))
+        collection = self._open_collection(name, model)
+        self._reindex_missing(name, collection, model)
+        self.model, self.emails_collection = model, collection
+        self.active_collection = name
+        print(f"Switched to the {model.name} embeddings in collection {name}")
+        return True
+
+    @property
+    def stored_embedding_model(self):
+        """The embedding model the stored vectors were computed with."""
+        return self.model.name
+
+    def embedding_model_changed(self) -> bool:
+        """Whether the stored vectors come from a different model than configured."""
+        return self.stored_embedding_model != self.embedding_model
+
+    def get_training_vectors(self, page_size: int = TRAINING_PAGE_SIZE,
+                             include_uuids: bool = False, since: float = None):
+        """
+        Return every stored paragraph vector and its folder as (embeddings, folders),
+        plus the uuid of each vector's email if `include_uuids` is set.
+
+        Vectors are read from Chroma a page at a time into one preallocated float32
+        matrix, so training never re-embeds text and peak memory stays close to the
+        matrix itself. With `since` (UTC epoch seconds) only the vectors of emails dated
+        at or after it are read: the emails are found with the date index and their
+        vectors fetched by uuid, so loading costs as much as the window holds rather
+        than the whole history.
+        """
+        if since is not None:
+            embeddings, folders, uuids = self._get_window_vectors(since)
+            if include_uuids:
+                return embeddings, folders, uuids
+            return embeddings, folders
+
+        total = self.emails_collection.count()
+        embeddings = None
+        folders = []
+        uuids = []
+        for offset in range(0, total, page_size):
+            page = self.emails_collection.get(
+                limit=page_size, offset=offset, include=['embeddings', 'metadatas']
+            )
+            if not len(page['ids']):
+                break
+            vectors = np.asarray(page['embeddings'], dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.empty((total, vectors.shape[1]), dtype=np.float32)
+            embeddings[len(folders):len(folders) + len(vectors)] = vectors
+            folders.extend(metadata['folder'] for metadata in page['metadatas'])
+            uuids.extend(metadata['uuid'] for metadata in page['metadatas'])
+
+        if embeddings is None:
+            embeddings = np.empty((0, 0), dtype=np.float32)
+        else:
+            embeddings = embeddings[:len(folders)]
+        if include_uuids:
+            return embeddings, folders, uuids
+        return embeddings, folders
+
+    def _get_window_vectors(self, since: float):
+        """The stored vectors, folders and uuids of emails dated at or after `since`."""
+        window = [
+            row[0] for row in self.conn.execute(
+                'SELECT uuid FROM emails WHERE date_ts >= ?', (int(since),)
+            )
+        ]
+        pages, folders, uuids = [], [], []
+        for i in range(0, len(window), TRAINING_WINDOW_PAGE_SIZE):
+            page = self.emails_collection.get(
+                where={'uuid': {'$in': window[i:i + TRAINING_WINDOW_PAGE_SIZE]}},
+                include=['embeddings', 'metadatas']
+            )
+            if not len(page['ids']):
+                continue
+            pages.append(np.asarray(page['embeddings'], dtype=np.float32))
+            folders.extend(metadata['folder'] for metadata in page['metadatas'])
+            uuids.extend(metadata['uuid'] for metadata in page['metadatas'])
+        if pages:
+            embeddings = np.concatenate(pages)
+        else:
+            embeddings = np.empty((0, 0), dtype=np.float32)
+        return embeddings, folders, uuids
+
+    def get_training_set(self, since: float = None, **options):
+        """
+        Return a deduplicated, weighted training set from the stored vectors as
+        (embeddings, folders, sample_weight). `options` are passed to
+        `build_training_set`.
+
+        With `since` (UTC epoch seconds) only emails dated at or after it are trained
+        on. With a `half_life_days` option, each vector is weighted by the age of its
+        email.
+        """
+        embeddings, folders, uuids = self.get_training_vectors(
+            include_uuids=True, since=since
+        )
+        if options.get('half_life_days'):
+            query, params = 'SELECT uuid, date_ts FROM emails', ()
+            if since is not None:
+                query, params = query + ' WHERE date_ts >= ?', (int(since),)
+            dates = dict(self.conn.execute(query, params).fetchall())
+            options['timestamps'] = [dates.get(uuid) for uuid in uuids]
+        return build_training_set(embeddings, folders, uuids, **options)
+
+    def get_training_emails(self, since: float = None):
+        """
+        Return every stored email as (emails, folders), for classifiers that train on
+        EmailRecords instead of vectors. The records carry only the fields those
+        classifiers use. With `since` (UTC epoch seconds) only emails dated at or after
+        it are returned.
+        """
+        query = (
+            'SELECT sender, subject, raw_body, list_id, list_unsubscribe, folder, '
+            'date_ts FROM emails WHERE folder IS NOT NULL'
+        )
+        params = ()
+        if since is not None:
+            query, params = query + ' AND date_ts >= ?', (int(since),)
+        rows = self.conn.execute(query, params).fetchall()
+        emails = [
+            EmailRecord(
+                sender=row[0], subject=row[1], raw_body=row[2], list_id=row[3],
+                list_unsubscribe=row[4], date_ts=row[6]
+            )
+            for row in rows
+        ]
+        return emails, [row[5] for row in rows]
+
+    def reindex(self, batch_size: int = EMBED_BATCH_SIZE,
+                workers: int = REEMBED_WORKERS,
+                page_size: int = REINDEX_PAGE_SIZE) -> bool:
+        """
+        Re-embed every stored email with the configured model into a new collection and
+        swap it in.
+
+        The old collection keeps serving searches and classification while the new one
+        is built. Progress is recorded per email, so an interrupted reindex resumes
+        where it stopped. Once every email is embedded the active collection is switched
+        in a single transaction; other processes pick it up through
+        `refresh_active_collection`.
+        Returns False if the active collection already uses the configured model.
+        """
+        if not self.embedding_model_changed():
+            return False
+        self._drop_retired_collections()
+
+        model = self._get_model(self.embedding_function_type)
+        row = self.conn.execute(
+            "SELECT name FROM vector_collections "
+            "WHERE status = 'building' AND embedding_model = ?",
+            (model.name,)
+        ).fetchone()
+        if row is None:
+            name = f"emails-{model.name}-{int(time.time())}"
+            with self.connections.transaction() as conn:
+                # Abandon builds for any other model
+                conn.execute(
+                    "UPDATE vector_collections SET status = 'retired' "
+                    "WHERE status = 'building'"
+                )
+                conn.execute('''
+                    INSERT INTO vector_collections
+                        (name, embedding_function, embedding_model, status, created_at)
+                    VALUES (?, ?, ?, 'building', ?)
+                ''', (name, model.function_type.value, model.name, time.time()))
+        else:
+            name = row[0]
+        collection = self._open_collection(name, model)
+
+        self._reindex_missing(name, collection, model, batch_size, workers, page_size)
+        with self.connections.transaction() as conn:
+            conn.execute(
+                "UPDATE vector_collections SET status = 'retired' "
+                "WHERE status = 'active'"
+            )
+            conn.execute(
+                "UPDATE vector_collections SET status = 'active', activated_at = ? "
+                "WHERE name = ?",
+                (time.time(), name)
+            )
+        self.refresh_active_collection()
+        return True
+
+    def _reindex_missing(self, name, collection, model: EmbeddingModel,
+                         batch_size: int = EMBED_BATCH_SIZE,
+                         workers: int = REEMBED_WORKERS,
+                         page_size: int = REINDEX_PAGE_SIZE):
+        """Embed the stored emails that aren't in a collection yet, a page at a time."""
+        total, done = self.conn.execute('''
+            SELECT COUNT(*), COUNT(progress.uuid) FROM emails
+            LEFT JOIN reindex_progress AS progress
+                ON progress.collection = ? AND progress.uuid = emails.uuid
+        ''', (name,)).fetchone()
+        if done == total:
+            return
+
+        def embed_task(task):
+            chunks = [chunk for _, mail_chunks in task for chunk in mail_chunks]
+            vectors = model.embed(chunks) if chunks else []
+            results, start = [], 0
+            for mail, mail_chunks in task:
+                results.append((mail, vectors[start:start + len(mail_chunks)]))
+                start += len(mail_chunks)
+            return results
+
+        with ThreadPoolExecutor(max_workers=workers) as executor, \
+                tqdm(total=total, initial=done, unit="email",
+                     desc=f"Embedding emails with {model.name}") as progress:
+            while True:
+                rows = self.conn.execute(f'''
+                    SELECT {EMAIL_COLUMNS} FROM emails
+                    WHERE uuid NOT IN (
+                        SELECT uuid FROM reindex_progress WHERE collection = ?
+                    )
+                    LIMIT ?
+                ''', (name, page_size)).fetchall()
+                if not rows:
+                    break
+                emails = [self._email_from_row(row) for row in rows]
+
+                # Group emails into tasks of about one embedding call (batch_size
+                # chunks) each
+                tasks, task, task_chunks = [], [], 0
+                for mail in emails:
+                    chunks = model.chunk_paragraphs(mail.paragraphs)
+                    task.append((mail, chunks))
+                    task_chunks += len(chunks)
+                    if task_chunks >= batch_size:
+                        tasks.append(task)
+                        task, task_chunks = [], 0
+                if task:
+                    tasks.append(task)
+
+                for results in executor.map(embed_task, tasks):
+                    for mail, vectors in results:
+                        if len(vectors):
+                            collection.upsert(
+                                ids=[f"{mail.uuid}_{i}" for i in range(len(vectors))],
+                                embeddings=vectors,
+                                metadatas=[
+                                    {
+                                        'uuid': mail.uuid,
+                                        'folder': mail.folder,
+                                        'paragraph_index': i,
+                                    }
+                                    for i in range(len(vectors))
+                                ],
+                            )
+                    with self.connections.transaction() as conn:
+                        conn.executemany(
+                            'INSERT OR IGNORE INTO reindex_progress (collection, uuid) '
+                            'VALUES (?, ?)',
+                            [(name, mail.uuid) for mail, _ in results]
+                        )
+                    progress.update(len(results))
+
+    def _drop_retired_collections(self):
+        """Delete collections replaced by an earlier reindex, no longer served."""
+        rows = self.conn.execute(
+            "SELECT name FROM vector_collections WHERE status = 'retired'"
+        ).fetchall()
+        for (name,) in rows:
+            try:
+                self.chroma_client.delete_collection(name)
+            except Exception:
+                pass  # already deleted
+            with self.connections.transaction() as conn:
+                conn.execute(
+                    'DELETE FROM reindex_progress WHERE collection = ?', (name,)
+                )
+                conn.execute('DELETE FROM vector_collections WHERE name = ?', (name,))
+
+    def collection_status(self):
+        """Return every tracked collection with its model, status and progress."""
+        total = self.conn.execute('SELECT COUNT(*) FROM emails').fetchone()[0]
+        rows = self.conn.execute('''
+            SELECT name, embedding_model, status, created_at, activated_at,
+                (SELECT COUNT(*) FROM reindex_progress WHERE collection = name)
+            FROM vector_collections ORDER BY created_at
+        ''').fetchall()
+        return [
+            {
+                'name': row[0],
+                'embedding_model': row[1],
+                'status': row[2],
+                'created_at': row[3],
+                'activated_at': row[4],
+                'embedded': row[5],
+                'emails': total,
+            }
+            for row in rows
+        ]
+
     def get_all_embeddings(self):
         docs = self.emails_collection.get(include=['embeddings'])
         ids = docs['ids']
         embeddings = np.array(docs['embeddings'])
         return {'ids': ids, 'embeddings': embeddings}
 
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """Quote every term, so user input is matched literally rather than as FTS5."""
+        terms = query.split()
+        return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+    def _exact_search(self, query: str, limit: int) -> list[str]:
+        """Rank emails by BM25 over the FTS index, best match first."""
+        if not self.fts_enabled:
+            return []
+        fts_query = self._fts_query(query)
+        if not fts_query:
+            return []
+        rows = self.conn.execute('''
+            SELECT uuid FROM emails_fts
+            WHERE emails_fts MATCH ?
+            ORDER BY bm25(emails_fts)
+            LIMIT ?
+        ''', (fts_query, limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def _semantic_search(self, query: str, limit: int) -> list[str]:
+        """Rank emails by the distance of their closest paragraph to the query."""
+        # Several paragraphs of one email can match, so over-fetch before collapsing to
+        # emails
+        results = self.emails_collection.query(
+            query_texts=[query],
+            n_results=limit * 5,
+            include=['metadatas']
+        )
+        ranked = []
+        for metadata in results['metadatas'][0]:
+            if metadata['uuid'] not in ranked:
+                ranked.append(metadata['uuid'])
+        return ranked[:limit]
+
+    def search_emails(self, query: str, n_results: int = 10,
+                      mode: SearchModes = SearchModes.HYBRID):
+        """
+        Search stored emails.
+
+        Exact mode only uses the FTS5 index and never calls the embedding model. Hybrid
+        mode fuses the BM25 and vector rankings with reciprocal rank fusion.
+        """
+        if mode == SearchModes.EXACT:
+            ranked = self._exact_search(query, n_results)
+        elif mode == SearchModes.SEMANTIC:
+            ranked = self._semantic_search(query, n_results)
+        else:
+            scores = {}
+            rankings = (
+                self._exact_search(query, n_results * 2),
+                self._semantic_search(query, n_results * 2),
+            )
+            for ranking in rankings:
+                for rank, uuid in enumerate(ranking):
+                    scores[uuid] = scores.get(uuid, 0.0) + 1.0 / (RRF_K + rank + 1)
+            ranked = sorted(scores, key=scores.get, reverse=True)[:n_results]
+
+        if not ranked:
+            return []
+
+        placeholders = ','.join('?' * len(ranked))
+        rows = self.conn.execute(f'''
+            SELECT uuid, folder, sender, subject, date FROM emails
+            WHERE uuid IN ({placeholders})
+        ''', ranked).fetchall()
+        rows = {row[0]: row for row in rows}
+        return [
+            {
+                'uuid': uuid,
+                'folder': rows[uuid][1],
+                'from': rows[uuid][2],
+                'subject': rows[uuid][3],
+                'date': rows[uuid][4],
+            }
+            for uuid in ranked if uuid in rows
+        ]
+
     def get_email_by_uuid(self, uuid):
-        self.cursor.execute('SELECT * FROM emails WHERE uuid=?', (uuid,))
-        return self.cursor.fetchone()
+        return self.conn.execute(
+            'SELECT * FROM emails WHERE uuid=?', (uuid,)
+        ).fetchone()
 
     def update_email_folder(self, uuid, new_folder):
-        self.cursor.execute('UPDATE emails SET folder=? WHERE uuid=?', (new_folder, uuid))
-        self.conn.commit()
+        with self.connections.transaction() as conn:
+            previous = conn.execute(
+                'SELECT sender, list_id, folder FROM emails WHERE uuid=?', (uuid,)
+            ).fetchone()
+            conn.execute('UPDATE emails SET folder=? WHERE uuid=?', (new_folder, uuid))
+            if previous is not None and previous[2] != new_folder:
+                self.sender_rules.record(*previous, delta=-1)
+                self.sender_rules.record(previous[0], previous[1], new_folder)
+
+    def record_moves(self, moves: dict, folder):
+        """
+        Record emails moved into a folder, in one transaction.
+
+        `moves` maps email uuid to the message's UID in the destination folder (None if
+        the server didn't report it). Known UIDs are marked seen so the next poll of the
+        folder doesn't ingest them again. Stored email rows, and the folder labels of
+        their vectors, are pointed at the new location. The moves are mailfox's own, so
+        the emails are marked auto-filed and stop counting towards sender rules.
+        """
+        try:
+            with self.connections.transaction() as conn:
+                for uuid, uid in moves.items():
+                    previous = conn.execute(
+                        'SELECT sender, list_id, folder, auto_filed FROM emails '
+                        'WHERE uuid=?',
+                        (uuid,)
+                    ).fetchone()
+                    if previous is not None:
+                        conn.execute(
+                            'UPDATE emails SET folder=?, uid=?, auto_filed=1 '
+                            'WHERE uuid=?',
+                            (folder, uid, uuid)
+                        )
+                        # mailfox moved it, so it no longer shows where the user
+                        # files it
+                        if not previous[3]:
+                            self.sender_rules.record(*previous[:3], delta=-1)
+                new_uids = [uid for uid in moves.values() if uid is not None]
+                self._add_seen_uids(conn, folder, new_uids)
+            self._relabel_vectors(list(moves), folder)
+        except Exception as e:
+            print(f"Error recording moved emails: {e}")
+
+    def restore_location(self, uuid, folder, uid):
+        """
+        Point a stored email, and the folder labels of its vectors, back at where it is.
+
+        Used when a move fails after the email was stored under its predicted folder, so
+        the vectors never keep a folder the email didn't reach. Unlike `record_moves`,
+        the UID isn't marked seen, so the email is picked up again by the next poll.
+        """
+        try:
+            with self.connections.transaction() as conn:
+                conn.execute(
+                    'UPDATE emails SET folder=?, uid=? WHERE uuid=?',
+                    (folder, uid, uuid)
+                )
+            self._relabel_vectors([uuid], folder)
+        except Exception as e:
+            print(f"Error restoring the location of email {uuid}: {e}")
+
+    def _relabel_vectors(self, uuids, folder):
+        """Set the folder of emails' vectors, which training reads its labels from."""
+        for i in range(0, len(uuids), RELABEL_PAGE_SIZE):
+            docs = self.emails_collection.get(
+                where={'uuid': {'$in': uuids[i:i + RELABEL_PAGE_SIZE]}},
+                include=['metadatas']
+            )
+            if len(docs['ids']):
+                metadatas = [
+                    {**metadata, 'folder': folder} for metadata in docs['metadatas']
+                ]
+                self.emails_collection.update(ids=docs['ids'], metadatas=metadatas)
 
     def add_seen_uids(self, uids, folder):
         """Store UIDs that have been seen in a folder."""
         try:
-            self.cursor.executemany(
-                'INSERT OR IGNORE INTO seen_uids (uid, folder) VALUES (?, ?)',
-                [(int(uid), folder) for uid in uids]
-            )
-            self.conn.commit()
+            with self.connections.transaction() as conn:
+                self._add_seen_uids(conn, folder, uids)
         except Exception as e:
             print(f"Error storing seen UIDs: {e}")
 
+    def _add_seen_uids(self, conn, folder, uids):
+        """
+        Merge UIDs into a folder's seen ranges. Only the stored ranges overlapping or
+        touching the span of the new UIDs are read and rewritten.
+        """
+        uids = UIDSet(uids)
+        if not uids:
+            return
+        span = (folder, uids.min() - 1, uids.max() + 1)
+        overlapping = 'folder = ? AND last_uid >= ? AND first_uid <= ?'
+        rows = conn.execute(
+            f'SELECT first_uid, last_uid FROM seen_uid_ranges WHERE {overlapping}', span
+        ).fetchall()
+        if rows:
+            uids = uids | UIDSet.from_ranges(*zip(*rows))
+            conn.execute(f'DELETE FROM seen_uid_ranges WHERE {overlapping}', span)
+        conn.executemany(
+            'INSERT INTO seen_uid_ranges (folder, first_uid, last_uid) '
+            'VALUES (?, ?, ?)',
+            [(folder, first, last) for first, last in uids.ranges()]
+        )
+
+    def _folder_seen_uids(self, folder):
+        """The seen UIDs of one folder."""
+        rows = self.conn.execute(
+            'SELECT first_uid, last_uid FROM seen_uid_ranges WHERE folder = ?',
+            (folder,)
+        ).fetchall()
+        return UIDSet.from_ranges(*zip(*rows)) if rows else UIDSet()
+
+    def get_sync_checkpoint(self, folder):
+        """Return the initial sync progress of a folder, or None if it never started."""
+        row = self.conn.execute(
+            'SELECT uidvalidity, last_uid, batches, completed FROM sync_checkpoints '
+            'WHERE folder = ?',
+            (folder,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'uidvalidity': row[0],
+            'last_uid': row[1],
+            'batches': row[2],
+            'completed': bool(row[3]),
+        }
+
+    def reset_sync_checkpoint(self, folder, uidvalidity):
+        """Restart a folder's sync, forgetting its seen UIDs (UIDVALIDITY changed)."""
+        with self.connections.transaction() as conn:
+            conn.execute('DELETE FROM seen_uid_ranges WHERE folder = ?', (folder,))
+            conn.execute(
+                'INSERT OR REPLACE INTO sync_checkpoints '
+                '(folder, uidvalidity, last_uid, batches, completed) '
+                'VALUES (?, ?, 0, 0, 0)',
+                (folder, uidvalidity)
+            )
+
+    def record_sync_batch(self, folder, uidvalidity, uids, completed=False,
+                          footers=None):
+        """
+        Checkpoint a stored sync batch: its UIDs are marked seen and the folder's
+        progress advanced in a single transaction, so a resumed sync fetches exactly the
+        UIDs that were never checkpointed. `footers` are the footer counts learned from
+        the batch (`TextCleaner.take_footer_changes`), saved in the same transaction.
+        """
+        uids = UIDSet(uids)
+        with self.connections.transaction() as conn:
+            self._add_seen_uids(conn, folder, uids)
+            if footers:
+                self._save_sender_footers(conn, footers)
+            conn.execute('''
+                INSERT INTO sync_checkpoints
+                    (folder, uidvalidity, last_uid, batches, completed)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (folder) DO UPDATE SET
+                    uidvalidity = excluded.uidvalidity,
+                    last_uid = MAX(last_uid, excluded.last_uid),
+                    batches = batches + excluded.batches,
+                    completed = excluded.completed
+            ''', (folder, uidvalidity, uids.max() if uids else 0, 1 if uids else 0,
+                  int(completed)))
+
+    def get_sender_footers(self):
+        """The learned footer counts, as {sender: (seen, {fingerprint: count})}."""
+        rows = self.conn.execute('SELECT sender, seen, counts FROM sender_footers')
+        return {
+            sender: (seen, {int(fp): count for fp, count in json.loads(counts)})
+            for sender, seen, counts in rows
+        }
+
+    def _save_sender_footers(self, conn, footers):
+        """Write changed footer counts, deleting senders whose counts are None."""
+        conn.executemany(
+            'DELETE FROM sender_footers WHERE sender = ?',
+            [(sender,) for sender, footer in footers.items() if footer is None]
+        )
+        conn.executemany(
+            'INSERT OR REPLACE INTO sender_footers (sender, seen, counts) '
+            'VALUES (?, ?, ?)',
+            [
+                (sender, footer[0], json.dumps(list(footer[1].items())))
+                for sender, footer in footers.items() if footer is not None
+            ]
+        )
+
     def check_seen_uids(self, uids, folder):
         """Check which UIDs have been seen before in a folder."""
         try:
-            seen_uids = set()
-            for uid in uids:
-                self.cursor.execute(
-                    'SELECT uid FROM seen_uids WHERE uid = ? AND folder = ?',
-                    (int(uid), folder)
-                )
-                if self.cursor.fetchone():
-                    seen_uids.add(int(uid))
-            return seen_uids
+            uids = [int(uid) for uid in uids]
+            seen = self._folder_seen_uids(folder).contains(uids)
+            return {uid for uid, is_seen in zip(uids, seen) if is_seen}
         except Exception as e:
             print(f"Error checking seen UIDs: {e}")
             return set()
 
     def get_seen_uids(self):
-        """Get all seen UIDs and their folders."""
+        """Get the seen UIDs of every folder, as {folder: UIDSet}."""
         try:
-            self.cursor.execute('SELECT uid, folder FROM seen_uids')
-            rows = self.cursor.fetchall()
-            folder_uids = {}
-            for uid, folder in rows:
-                if folder not in folder_uids:
-                    folder_uids[folder] = set()
-                folder_uids[folder].add(int(uid))
-            return folder_uids
+            ranges = {}
+            rows = self.conn.execute(
+                'SELECT folder, first_uid, last_uid FROM seen_uid_ranges'
+            )
+            for folder, first, last in rows:
+                ranges.setdefault(folder, []).append((first, last))
+            return {
+                folder: UIDSet.from_ranges(*zip(*folder_ranges))
+                for folder, folder_ranges in ranges.items()
+            }
         except Exception as e:
             print(f"Error getting seen UIDs: {e}")
             return {}
 
     def close(self):
-        self.conn.close()
+        self.connections.close()
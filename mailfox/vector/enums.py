@@ -0,0 +1,10 @@
+from enum import Enum
+
+class EmbeddingFunctions(str, Enum):
+    SENTENCE_TRANSFORMER = "st"
+    OPENAI = "openai"
+
+class SearchModes(str, Enum):
+    HYBRID = "hybrid"
+    EXACT = "exact"
+    SEMANTIC = "semantic"
@@ -0,0 +1,148 @@
+import hashlib
+import zlib
+import numpy as np
+
+# Mersenne prime used as the modulus for the MinHash permutations
+MERSENNE_PRIME = (1 << 31) - 1
+
+class NearDuplicateIndex():
+    """
+    Locality-sensitive index of MinHash signatures over word shingles of email bodies.
+
+    Signatures are split into bands and every band is hashed into a bucket, so emails
+    that share a bucket in any band become candidates. Candidates are then verified by
+    their estimated Jaccard similarity before being reported as near-duplicates.
+    """
+    def __init__(self, connections, *, num_perm=64, bands=8, shingle_size=5,
+                 threshold=0.9, seed=42):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.connections = connections
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._init_tables()
+
+    def _init_tables(self):
+        with self.connections.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS minhash_signatures (
+                    uuid TEXT PRIMARY KEY,
+                    signature BLOB
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS minhash_bands (
+                    band INTEGER,
+                    bucket INTEGER,
+                    uuid TEXT
+                )
+            ''')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_minhash_bands '
+                'ON minhash_bands (band, bucket)'
+            )
+
+    def _shingles(self, text: str) -> set:
+        words = text.lower().split()
+        if len(words) <= self.shingle_size:
+            return {' '.join(words)} if words else set()
+        return {
+            ' '.join(words[i:i + self.shingle_size])
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str):
+        """Compute the MinHash signature of a text, or None if it has no words."""
+        shingles = self._shingles(text)
+        if not shingles:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode()) for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+        # a < 2^31 and hashes < 2^32, so the products fit in 64 bits
+        permuted = (self._a * hashes[np.newaxis, :] + self._b) % MERSENNE_PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _buckets(self, signature):
+        for band in range(self.bands):
+            band_bytes = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(band_bytes, digest_size=8).digest()
+            yield band, int.from_bytes(digest, 'big', signed=True)
+
+    def similarity(self, signature, other) -> float:
+        """Estimate the Jaccard similarity of two signatures."""
+        return float(np.mean(signature == other))
+
+    def find(self, signature, max_candidates=50):
+        """The uuid of the most similar indexed email over the threshold, or None."""
+        if signature is None:
+            return None
+
+        cursor = self.connections.get().cursor()
+        candidates = set()
+        for band, bucket in self._buckets(signature):
+            cursor.execute(
+                'SELECT uuid FROM minhash_bands WHERE band = ? AND bucket = ? LIMIT ?',
+                (band, bucket, max_candidates)
+            )
+            candidates.update(row[0] for row in cursor.fetchall())
+            if len(candidates) >= max_candidates:
+                break
+
+        best_uuid, best_similarity = None, self.threshold
+        for uuid in candidates:
+            cursor.execute(
+                'SELECT signature FROM minhash_signatures WHERE uuid = ?', (uuid,)
+            )
+            row = cursor.fetchone()
+            if not row:
+                continue
+            stored = np.frombuffer(row[0], dtype=np.uint32)
+            similarity = self.similarity(signature, stored)
+            if similarity >= best_similarity:
+                best_uuid, best_similarity = uuid, similarity
+        return best_uuid
+
+    def find_in(self, signature, buckets: dict):
+        """Like `find`, but against an in-memory bucket map filled by `add_to`."""
+        if signature is None:
+            return None
+        best_uuid, best_similarity = None, self.threshold
+        for key in self._buckets(signature):
+            for uuid, other in buckets.get(key, ()):
+                similarity = self.similarity(signature, other)
+                if similarity >= best_similarity:
+                    best_uuid, best_similarity = uuid, similarity
+        return best_uuid
+
+    def add_to(self, uuid, signature, buckets: dict):
+        """Index a signature in an in-memory bucket map, for emails not stored yet."""
+        if signature is None:
+            return
+        for key in self._buckets(signature):
+            buckets.setdefault(key, []).append((uuid, signature))
+
+    def add(self, uuid, signature):
+        """Index an email's signature, in the caller's transaction if one is open."""
+        if signature is None:
+            return
+        cursor = self.connections.get().cursor()
+        cursor.execute(
+            'INSERT OR IGNORE INTO minhash_signatures (uuid, signature) VALUES (?, ?)',
+            (uuid, signature.tobytes())
+        )
+        if cursor.rowcount:
+            cursor.executemany(
+                'INSERT INTO minhash_bands (band, bucket, uuid) VALUES (?, ?, ?)',
+                [(band, bucket, uuid) for band, bucket in self._buckets(signature)]
+            )
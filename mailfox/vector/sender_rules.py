@@ -0,0 +1,135 @@
+from collections import Counter
+from email.utils import parseaddr
+
+# Mail that is still in the inbox hasn't been filed, so it says nothing about where it
+# belongs
+UNFILED_FOLDERS = {"INBOX"}
+
+# Most specific keys first, a List-Id identifies a mailing list better than its sender
+KEY_TYPES = ("list_id", "sender", "domain")
+
+class SenderRuleIndex():
+    """
+    Learned (List-Id / sender address / sender domain) -> folder table.
+
+    Per-key folder counts are kept in emails.db and updated as mail is filed, so a key
+    only becomes a rule once it has at least `min_support` filed emails of which at
+    least a `min_purity` fraction went to the same folder. Only mail the user filed is
+    counted, never mail mailfox filed itself (`auto_filed`), so a rule can't confirm its
+    own decisions. Lookups are a few primary key reads.
+    """
+    def __init__(self, connections, *, min_support=5, min_purity=0.95):
+        self.connections = connections
+        self.min_support = min_support
+        self.min_purity = min_purity
+        self._init_tables()
+
+    def _init_tables(self):
+        with self.connections.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sender_rule_counts (
+                    key_type TEXT,
+                    key TEXT,
+                    folder TEXT,
+                    count INTEGER,
+                    PRIMARY KEY (key_type, key, folder)
+                )
+            ''')
+            counts_populated = conn.execute(
+                'SELECT EXISTS (SELECT 1 FROM sender_rule_counts)'
+            ).fetchone()[0]
+            emails_populated = conn.execute(
+                'SELECT EXISTS (SELECT 1 FROM emails)'
+            ).fetchone()[0]
+            if emails_populated and not counts_populated:
+                self.rebuild()
+
+    @staticmethod
+    def rule_keys(sender, list_id=None):
+        """The (key_type, key) pairs an email can be matched on, most specific first."""
+        keys = []
+        if list_id:
+            # List-Id: "Some List <list.example.com>", only the bracketed id is stable
+            _, _, bracketed = list_id.partition('<')
+            list_key = bracketed.partition('>')[0] if bracketed else list_id
+            list_key = list_key.strip().lower()
+            if list_key:
+                keys.append(("list_id", list_key))
+        address = parseaddr(sender or '')[1].strip().lower()
+        if address:
+            keys.append(("sender", address))
+            domain = address.rpartition('@')[2]
+            if domain and domain != address:
+                keys.append(("domain", domain))
+        return keys
+
+    def record(self, sender, list_id, folder, delta=1):
+        """Count an email as filed in a folder, or as removed with a negative delta."""
+        if folder in UNFILED_FOLDERS:
+            return
+        self.connections.get().executemany('''
+            INSERT INTO sender_rule_counts (key_type, key, folder, count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (key_type, key, folder)
+            DO UPDATE SET count = count + excluded.count
+        ''', [
+            (key_type, key, folder, delta)
+            for key_type, key in self.rule_keys(sender, list_id)
+        ])
+
+    def rebuild(self):
+        """Recount every key from the emails table."""
+        with self.connections.transaction() as conn:
+            counts = Counter()
+            rows = conn.execute(
+                'SELECT sender, list_id, folder FROM emails WHERE NOT auto_filed'
+            )
+            for sender, list_id, folder in rows:
+                if folder in UNFILED_FOLDERS:
+                    continue
+                for key_type, key in self.rule_keys(sender, list_id):
+                    counts[(key_type, key, folder)] += 1
+
+            conn.execute('DELETE FROM sender_rule_counts')
+            conn.executemany(
+                'INSERT INTO sender_rule_counts (key_type, key, folder, count) '
+                'VALUES (?, ?, ?, ?)',
+                [(*key, count) for key, count in counts.items()]
+            )
+
+    def _match(self, key_type, key):
+        rows = self.connections.get().execute(
+            'SELECT folder, count FROM sender_rule_counts '
+            'WHERE key_type = ? AND key = ? AND count > 0',
+            (key_type, key)
+        ).fetchall()
+        support = sum(count for _, count in rows)
+        if support < self.min_support:
+            return None
+        folder, count = max(rows, key=lambda row: row[1])
+        return folder if count / support >= self.min_purity else None
+
+    def lookup(self, sender, list_id=None):
+        """The folder a learned rule assigns to this email, or None if none applies."""
+        for key_type, key in self.rule_keys(sender, list_id):
+            folder = self._match(key_type, key)
+            if folder:
+                return folder
+        return None
+
+    def rules(self):
+        """
+        Every key that currently qualifies as a rule, as (key_type, key, folder,
+        support, purity).
+        """
+        rows = self.connections.get().execute('''
+            SELECT key_type, key, folder, count,
+                SUM(count) OVER (PARTITION BY key_type, key) AS support
+            FROM sender_rule_counts
+            WHERE count > 0
+        ''').fetchall()
+        rules = []
+        for key_type, key, folder, count, support in rows:
+            if support >= self.min_support and count / support >= self.min_purity:
+                rules.append((key_type, key, folder, support, count / support))
+        return sorted(rules, key=lambda rule: (KEY_TYPES.index(rule[0]), -rule[3]))
@@ -0,0 +1,175 @@
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# How samples are weighted: every email or every folder contributes the same total
+# weight, or every chunk vector counts once
+WEIGHTINGS = ("email", "folder", "none")
+
+# Seconds in a day, the unit of training windows and half-lives
+DAY_SECONDS = 86400
+
+# Random-hyperplane LSH bands used to find near-identical vectors; two vectors are
+# compared if all the bits of any one band agree
+DEDUP_BANDS = 4
+DEDUP_BAND_BITS = 12
+
+def training_set_options(config: dict) -> dict:
+    """The `build_training_set` options set in the config."""
+    return {
+        'dedup_threshold': config.get("training_dedup_threshold", 0.98),
+        'weighting': config.get("training_weighting", "email"),
+        'max_per_folder': config.get("training_max_per_folder"),
+        'half_life_days': config.get("training_half_life_days"),
+    }
+
+def training_since(
+    max_age_days: Optional[float] = None,
+    since: Optional[float] = None,
+    now: Optional[float] = None
+) -> Optional[float]:
+    """
+    The UTC epoch seconds training emails must be dated at or after: the later of
+    `since` and `max_age_days` before `now`, or None to train on every email.
+    """
+    bounds = [since] if since is not None else []
+    if max_age_days is not None:
+        now = time.time() if now is None else now
+        bounds.append(now - max_age_days * DAY_SECONDS)
+    return max(bounds) if bounds else None
+
+def recency_weights(
+    timestamps: Sequence[Optional[float]],
+    half_life_days: float,
+    now: Optional[float] = None
+) -> np.ndarray:
+    """
+    Weights that halve every `half_life_days` of age, for emails dated `timestamps` (UTC
+    epoch seconds). Emails without a date, or dated in the future, get the full weight
+    of 1.
+    """
+    now = time.time() if now is None else now
+    ages = (now - np.array(timestamps, dtype=float)) / DAY_SECONDS
+    weights = 0.5 ** (np.maximum(ages, 0) / half_life_days)
+    return np.where(np.isnan(weights), 1.0, weights)
+
+def _deduplicate(
+    embeddings: np.ndarray, labels: np.ndarray, threshold: float, seed: int
+) -> np.ndarray:
+    """
+    Map every row to the row that represents it: itself, or an earlier row of the same
+    folder whose cosine similarity is at least `threshold`.
+    """
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    unit = embeddings / np.where(norms == 0, 1, norms)
+    planes = np.random.default_rng(seed).standard_normal(
+        (embeddings.shape[1], DEDUP_BANDS * DEDUP_BAND_BITS)
+    )
+    bits = (unit @ planes.astype(unit.dtype)) > 0
+    powers = 1 << np.arange(DEDUP_BAND_BITS, dtype=np.int64)
+
+    representative = np.arange(len(embeddings))
+    for band in range(DEDUP_BANDS):
+        candidates = np.flatnonzero(representative == np.arange(len(embeddings)))
+        # Only vectors of the same folder can be duplicates of each other
+        columns = slice(band * DEDUP_BAND_BITS, (band + 1) * DEDUP_BAND_BITS)
+        keys = bits[candidates, columns] @ powers
+        keys += labels[candidates].astype(np.int64) << DEDUP_BAND_BITS
+        order = np.argsort(keys, kind='stable')
+        boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+        for bucket in np.split(candidates[order], boundaries):
+            if len(bucket) < 2:
+                continue
+            kept = [bucket[0]]
+            for row in bucket[1:]:
+                similarity = unit[kept] @ unit[row]
+                best = int(np.argmax(similarity))
+                if similarity[best] >= threshold:
+                    representative[row] = kept[best]
+                else:
+                    kept.append(row)
+
+    # Representatives merged in a later band point at their own representative
+    while True:
+        resolved = representative[representative]
+        if np.array_equal(resolved, representative):
+            return representative
+        representative = resolved
+
+def build_training_set(
+    embeddings: np.ndarray,
+    folders: List[str],
+    uuids: List[str],
+    dedup_threshold: float = 0.98,
+    weighting: str = "email",
+    max_per_folder: int = None,
+    timestamps: Sequence[Optional[float]] = None,
+    half_life_days: float = None,
+    seed: int = 42
+) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """
+    Turn stored chunk vectors into a weighted classifier training set.
+
+    Each chunk is weighted so every email (or every folder) contributes the same total
+    weight, rather than a long newsletter counting as many samples as its paragraphs.
+    Chunks whose vectors are near-identical to another chunk of the same folder are
+    dropped and their weight added to the chunk that is kept, and with `max_per_folder`
+    larger folders are randomly subsampled with their total weight preserved. Set
+    `dedup_threshold` to None to skip deduplication. With `half_life_days` and the
+    `timestamps` of each chunk's email, weights also decay exponentially with age, so
+    recent filing habits count the most.
+
+    Returns (embeddings, folders, sample_weight) with weights averaging 1.
+    """
+    if weighting not in WEIGHTINGS:
+        raise ValueError(
+            f"Invalid weighting: {weighting}. Must be one of: {', '.join(WEIGHTINGS)}"
+        )
+    embeddings = np.asarray(embeddings)
+    if not len(folders):
+        return embeddings, [], np.ones(0)
+
+    folder_names, labels = np.unique(
+        np.asarray(folders, dtype=object), return_inverse=True
+    )
+    if weighting == "email":
+        _, email_index, chunk_counts = np.unique(
+            np.asarray(uuids, dtype=object), return_inverse=True, return_counts=True
+        )
+        weights = 1.0 / chunk_counts[email_index]
+    elif weighting == "folder":
+        weights = 1.0 / np.bincount(labels)[labels]
+    else:
+        weights = np.ones(len(folders))
+    if half_life_days and timestamps is not None:
+        weights = weights * recency_weights(timestamps, half_life_days)
+
+    keep = np.arange(len(folders))
+    if dedup_threshold:
+        representative = _deduplicate(embeddings, labels, dedup_threshold, seed)
+        merged = np.zeros(len(folders))
+        np.add.at(merged, representative, weights)
+        keep = np.flatnonzero(representative == np.arange(len(folders)))
+        weights = merged
+
+    if max_per_folder:
+        rng = np.random.default_rng(seed)
+        capped = []
+        for label in range(len(folder_names)):
+            rows = keep[labels[keep] == label]
+            if len(rows) > max_per_folder:
+                sample = np.sort(rng.choice(rows, max_per_folder, replace=False))
+                weights[sample] *= weights[rows].sum() / weights[sample].sum()
+                rows = sample
+            capped.append(rows)
+        keep = np.sort(np.concatenate(capped))
+
+    weights = weights[keep]
+    weights *= len(weights) / weights.sum()
+    if len(keep) < len(folders):
+        print(
+            f"Training on {len(keep)} of {len(folders)} vectors after deduplication "
+            "and folder caps"
+        )
+    return embeddings[keep], [folder_names[label] for label in labels[keep]], weights
@@ -0,0 +1,79 @@
+import hashlib
+import time
+import zlib
+
+import numpy as np
+import pytest
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from mailfox.core.email_record import EmailRecord
+from mailfox.vector import database
+from mailfox.vector.enums import EmbeddingFunctions
+
+class StubEmbeddingFunction(EmbeddingFunction):
+    """Bag-of-words vectors hashed into 32 dimensions, so tests never load a model."""
+    def __init__(self):
+        self.calls = []
+
+    @staticmethod
+    def name():
+        return "stub"
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return StubEmbeddingFunction()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        self.calls.append(list(input))
+        vectors = []
+        for text in input:
+            vector = np.zeros(32, dtype=np.float32)
+            for word in text.lower().split():
+                vector[zlib.crc32(word.encode()) % 32] += 1
+            norm = np.linalg.norm(vector)
+            vectors.append(vector / norm if norm else vector)
+        return vectors
+
+@pytest.fixture
+def embedding_function(monkeypatch):
+    function = StubEmbeddingFunction()
+    # The OpenAI model is keyed by its API key, use 'test-key'
+    for key in (EmbeddingFunctions.SENTENCE_TRANSFORMER,
+                (EmbeddingFunctions.OPENAI, 'test-key')):
+        monkeypatch.setitem(database._embedding_functions, key, function)
+    return function
+
+@pytest.fixture
+def new_york_time(monkeypatch):
+    """Set the local time zone to US Eastern, as a POSIX rule so no tzdata is needed."""
+    monkeypatch.setenv('TZ', 'EST+05EDT,M3.2.0,M11.1.0')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+@pytest.fixture
+def vector_db(tmp_path, embedding_function):
+    return database.VectorDatabase(str(tmp_path / "db"))
+
+@pytest.fixture
+def make_email():
+    """Build EmailRecords with a uuid derived from the subject."""
+    def make(subject, paragraphs, folder="INBOX", uid=1, **fields):
+        fields.setdefault('sender', 'ann@example.com')
+        fields.setdefault('recipient', 'bob@example.com')
+        fields.setdefault('date', 'Mon, 01 Jan 2024 10:00:00')
+        fields.setdefault('date_ts', 1704103200)
+        fields.setdefault('raw_body', '\n'.join(paragraphs))
+        return EmailRecord(
+            uid=uid,
+            folder=folder,
+            uuid=hashlib.sha256(subject.encode()).hexdigest(),
+            subject=subject,
+            paragraphs=list(paragraphs),
+            **fields
+        )
+    return make
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from mailfox.vector.classifiers.search import _folds, search_classifiers
+
+@pytest.fixture(scope="module")
+def clusters():
+    rng = np.random.default_rng(0)
+    centers = np.eye(3, 8) * 4
+    embeddings = np.concatenate([
+        center + rng.normal(0, 0.5, (30, 8)) for center in centers
+    ])
+    folders = ['Bills'] * 30 + ['Travel'] * 30 + ['Friends'] * 30
+    return embeddings, folders
+
+def test_folds_shrink_to_the_smallest_folder():
+    y = np.array([0] * 10 + [1] * 2)
+
+    splits = _folds(y, 5, seed=42)
+
+    assert len(splits) == 2
+    for train, test in splits:
+        assert sorted(np.concatenate([train, test]).tolist()) == list(range(12))
+
+def test_grid_search_scores_every_configuration_on_all_vectors(clusters):
+    embeddings, folders = clusters
+
+    search = search_classifiers(
+        embeddings, folders, classifiers=['logistic'], halving=False, n_jobs=1
+    )
+
+    results = search['results']
+    assert [result['params'] for result in results] == [
+        {'C': C} for C in (0.01, 0.1, 1.0, 10.0)
+    ]
+    assert {(result['round'], result['samples']) for result in results} == {(0, 90)}
+    assert search['best']['accuracy'] > 0.9
+
+def test_successive_halving_keeps_the_best_third(clusters):
+    embeddings, folders = clusters
+
+    search = search_classifiers(
+        embeddings, folders, classifiers=['svm', 'logistic'], n_jobs=1,
+        sample_weight=np.linspace(0.5, 1.5, len(folders))
+    )
+
+    first = [result for result in search['results'] if result['round'] == 0]
+    last = [result for result in search['results'] if result['round'] == 1]
+    assert len(first) == 8 and len(last) == 3
+    # The first round uses a third of the vectors, at least 10 per folder
+    assert first[0]['samples'] == 30 and last[0]['samples'] == 90
+    ranked = sorted(
+        first, key=lambda result: (-result['accuracy'], result['fit_seconds'])
+    )
+    advanced = [(result['classifier'], result['params']) for result in ranked[:3]]
+    assert [(result['classifier'], result['params']) for result in last] == advanced
+
+    best = search['best']
+    assert best in last
+    assert best['accuracy'] >= max(result['accuracy'] for result in last) - 0.01
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from mailfox.vector import database
+from mailfox.vector.connections import ThreadConnections
+
+@pytest.fixture
+def connections(tmp_path):
+    connections = ThreadConnections(str(tmp_path / "emails.db"))
+    connections.get().execute('CREATE TABLE counts (name TEXT PRIMARY KEY, n INTEGER)')
+    yield connections
+    connections.close()
+
+def in_thread(function):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+def test_each_thread_gets_its_own_connection(connections):
+    conn = connections.get()
+
+    assert connections.get() is conn
+    assert in_thread(connections.get) is not conn
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+def test_transactions_commit_or_roll_back(connections):
+    with connections.transaction() as conn:
+        conn.execute("INSERT INTO counts VALUES ('a', 1)")
+        # Nested transactions join the outer one
+        with connections.transaction() as nested:
+            nested.execute("INSERT INTO counts VALUES ('b', 2)")
+
+    with pytest.raises(ValueError):
+        with connections.transaction() as conn:
+            conn.execute("INSERT INTO counts VALUES ('c', 3)")
+            raise ValueError("roll back")
+
+    rows = in_thread(
+        lambda: connections.get().execute('SELECT name FROM counts').fetchall()
+    )
+    assert sorted(rows) == [('a',), ('b',)]
+
+def test_concurrent_read_then_write_transactions_wait_for_each_other(connections):
+    connections.get().execute("INSERT INTO counts VALUES ('total', 0)")
+
+    def add():
+        for _ in range(50):
+            with connections.transaction() as conn:
+                n = conn.execute(
+                    "SELECT n FROM counts WHERE name = 'total'"
+                ).fetchone()[0]
+                conn.execute("UPDATE counts SET n = ? WHERE name = 'total'", (n + 1,))
+
+    threads = [threading.Thread(target=add) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    total = connections.get().execute("SELECT n FROM counts WHERE name = 'total'")
+    assert total.fetchone()[0] == 200
+
+def test_threads_reconnect_after_close(connections):
+    conn = connections.get()
+
+    connections.close()
+
+    assert connections.get() is not conn
+    assert connections.get().execute('SELECT COUNT(*) FROM counts').fetchone() == (0,)
+
+def test_vector_databases_are_shared_per_path_and_options(tmp_path, embedding_function,
+                                                          monkeypatch):
+    monkeypatch.setattr(database, '_databases', {})
+    path = str(tmp_path / "db")
+
+    shared = database.get_vector_database(path)
+
+    assert database.get_vector_database(path) is shared
+    # Paths are compared once normalized
+    assert database.get_vector_database(str(tmp_path / "db" / ".")) is shared
+    other = database.get_vector_database(path, near_duplicate_threshold=0.8)
+    assert other is not shared
+    assert in_thread(lambda: database.get_vector_database(path)) is shared
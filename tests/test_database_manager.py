@@ -0,0 +1,131 @@
+from email.message import EmailMessage
+
+import pytest
+
+from benchmarks.fake_imap import FakeIMAPServer, Mailbox
+from mailfox.core.database_manager import initialize_database
+from mailfox.email_interface.email_handler import EmailHandler
+
+FOOTER = "This message is confidential. Ref 1234."
+
+def message(i, sender="legal@example.com"):
+    mail = EmailMessage()
+    mail['From'] = sender
+    mail['To'] = 'bob@example.com'
+    mail['Subject'] = f'Update {i}'
+    mail['Date'] = f'Mon, {i + 1:02d} Jan 2024 10:00:00 +0000'
+    mail['Message-ID'] = f'<update-{i}@example.com>'
+    mail.set_content(f"Status report number {i} for the {'abcdefgh'[i % 8]} team.\n\n"
+                     f"{FOOTER}")
+    return mail.as_bytes()
+
+@pytest.fixture
+def server():
+    mailbox = Mailbox()
+    mailbox.folder('Legal')
+    for i in range(6):
+        mailbox.add('Legal', message(i))
+    with FakeIMAPServer(mailbox) as server:
+        yield server
+
+@pytest.fixture
+def connect(server):
+    handlers = []
+
+    def connect():
+        handler = EmailHandler('user', 'password', server='127.0.0.1', port=server.port,
+                               ssl=False, compress=False)
+        handlers.append(handler)
+        return handler
+    yield connect
+    for handler in handlers:
+        handler.stop_event.set()
+        handler.mail.close()
+
+def test_footers_are_learned_by_the_initial_sync_and_then_frozen(connect, vector_db):
+    handler = connect()
+    assert not handler.text_cleaner.learning
+
+    initialize_database(handler, vector_db, ['Legal'], batch_size=2)
+
+    assert not handler.text_cleaner.learning
+    footers = vector_db.get_sender_footers()
+    assert footers['legal@example.com'][0] == 6
+
+    # Any handler loading the stored footers cleans a message the same way
+    first, second = connect(), connect()
+    for other in (first, second):
+        other.text_cleaner.load_footers(vector_db.get_sender_footers())
+    texts = [
+        [' '.join(mail.paragraphs) for mail in other.get_mail('all', ['Legal'])]
+        for other in (first, second, first)
+    ]
+    assert texts[0] == texts[1] == texts[2]
+    assert all(FOOTER not in text for text in texts[0])
+
+def interrupt_second_batch(vector_db, monkeypatch):
+    store_emails = vector_db.store_emails
+    calls = []
+
+    def interrupted(emails, *args, **kwargs):
+        calls.append(emails)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return store_emails(emails, *args, **kwargs)
+    monkeypatch.setattr(vector_db, 'store_emails', interrupted)
+
+def fetched_batches(handler, monkeypatch):
+    fetch_mail = handler.fetch_mail
+    batches = []
+
+    def recording(folder, uids, **kwargs):
+        batches.append(list(uids))
+        return fetch_mail(folder, uids, **kwargs)
+    monkeypatch.setattr(handler, 'fetch_mail', recording)
+    return batches
+
+def stored_count(vector_db):
+    return vector_db.conn.execute('SELECT COUNT(*) FROM emails').fetchone()[0]
+
+def test_an_interrupted_sync_resumes_from_its_checkpoint(connect, vector_db,
+                                                         monkeypatch):
+    handler = connect()
+    with monkeypatch.context() as patch:
+        interrupt_second_batch(vector_db, patch)
+        with pytest.raises(KeyboardInterrupt):
+            initialize_database(handler, vector_db, ['Legal'], batch_size=2)
+
+    checkpoint = vector_db.get_sync_checkpoint('Legal')
+    assert (checkpoint['batches'], checkpoint['last_uid']) == (1, 2)
+    assert not checkpoint['completed']
+    assert not handler.text_cleaner.learning
+
+    batches = fetched_batches(handler, monkeypatch)
+    initialize_database(handler, vector_db, ['Legal'], batch_size=2)
+
+    # The batch that was fetched but never checkpointed is fetched again
+    assert batches == [[3, 4], [5, 6]]
+    assert vector_db.get_sync_checkpoint('Legal')['completed']
+    assert stored_count(vector_db) == 6
+
+    # Completed folders aren't listed or fetched again
+    monkeypatch.setattr(handler, 'list_uids', None)
+    initialize_database(handler, vector_db, ['Legal'], batch_size=2)
+    assert len(batches) == 2
+
+def test_a_uidvalidity_change_restarts_the_sync(connect, server, vector_db,
+                                                monkeypatch):
+    handler = connect()
+    with monkeypatch.context() as patch:
+        interrupt_second_batch(vector_db, patch)
+        with pytest.raises(KeyboardInterrupt):
+            initialize_database(handler, vector_db, ['Legal'], batch_size=2)
+    server.mailbox.folder('Legal').uidvalidity += 1
+
+    batches = fetched_batches(handler, monkeypatch)
+    initialize_database(handler, vector_db, ['Legal'], batch_size=2)
+
+    assert batches == [[1, 2], [3, 4], [5, 6]]
+    checkpoint = vector_db.get_sync_checkpoint('Legal')
+    assert checkpoint['uidvalidity'] == server.mailbox.folder('Legal').uidvalidity
+    assert checkpoint['completed']
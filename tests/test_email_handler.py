@@ -0,0 +1,98 @@
+from contextlib import ExitStack
+from email.message import EmailMessage
+
+import pytest
+
+from benchmarks.fake_imap import DEFAULT_CAPABILITIES, FakeIMAPServer, Mailbox
+from mailfox.email_interface.email_handler import EmailHandler
+
+def message(i):
+    mail = EmailMessage()
+    mail['From'] = 'ann@example.com'
+    mail['To'] = 'bob@example.com'
+    mail['Subject'] = f'Receipt {i}'
+    mail['Date'] = f'Mon, {i + 1:02d} Jan 2024 10:00:00 +0000'
+    mail['Message-ID'] = f'<receipt-{i}@example.com>'
+    mail.set_content(f"Thanks for your order number {i}.")
+    return mail.as_bytes()
+
+def without(*capabilities):
+    return [c for c in DEFAULT_CAPABILITIES if c not in capabilities]
+
+@pytest.fixture
+def mailbox():
+    mailbox = Mailbox()
+    mailbox.folder('INBOX')
+    mailbox.folder('Receipts')
+    for i in range(4):
+        mailbox.add('INBOX', message(i))
+    return mailbox
+
+@pytest.fixture
+def serve(mailbox):
+    with ExitStack() as stack:
+        def serve(capabilities=DEFAULT_CAPABILITIES):
+            server = stack.enter_context(
+                FakeIMAPServer(mailbox, capabilities=capabilities)
+            )
+            handler = EmailHandler('user', 'password', server='127.0.0.1',
+                                   port=server.port, ssl=False, compress=False)
+            stack.callback(handler.close)
+            return handler
+        yield serve
+
+def folder_uids(mailbox, name):
+    return [message.uid for message in mailbox.folder(name).messages]
+
+def test_parse_copyuid_pairs_up_uid_sets():
+    responses = [b'7 3:5,9 20:22,30', '7 12:10 40:42', b'unrelated']
+
+    assert EmailHandler._parse_copyuid(responses) == {
+        3: 20, 4: 21, 5: 22, 9: 30,
+        # Ranges are ascending whichever way round they are written
+        10: 40, 11: 41, 12: 42,
+    }
+
+def test_move_mail_maps_uids_from_copyuid(serve, mailbox):
+    handler = serve()
+
+    uid_map = handler.move_mail([1, 3], 'Receipts', source_folder='INBOX')
+
+    assert uid_map == {1: 1, 3: 2}
+    assert folder_uids(mailbox, 'INBOX') == [2, 4]
+
+def test_move_mail_finds_uids_by_message_id_without_uidplus(serve, mailbox):
+    handler = serve(without('UIDPLUS'))
+
+    uid_map = handler.move_mail(
+        [1, 2, 3], 'Receipts', source_folder='INBOX',
+        message_ids={1: '<receipt-0@example.com>', 2: '<receipt-1@example.com>'}
+    )
+
+    # The message without a Message-ID given can't be found
+    assert uid_map == {1: 1, 2: 2}
+    assert folder_uids(mailbox, 'Receipts') == [1, 2, 3]
+    # The source folder is selected again for the commands that follow
+    assert handler.mail.selected_folder == 'INBOX'
+
+def test_move_mail_copies_and_expunges_without_move(serve, mailbox):
+    handler = serve(without('MOVE', 'UIDPLUS'))
+
+    uid_map = handler.move_mail(
+        [2], 'Receipts', source_folder='INBOX',
+        message_ids={2: '<receipt-1@example.com>'}
+    )
+
+    assert uid_map == {2: 1}
+    assert folder_uids(mailbox, 'INBOX') == [1, 3, 4]
+
+def test_find_moved_takes_the_newest_copy(serve, mailbox):
+    mailbox.add('Receipts', message(0))
+    handler = serve(without('UIDPLUS'))
+
+    uid_map = handler.move_mail(
+        [1], 'Receipts', source_folder='INBOX',
+        message_ids={1: '<receipt-0@example.com>'}
+    )
+
+    assert uid_map == {1: 2}
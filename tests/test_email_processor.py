@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from mailfox.core.email_processor import predict_folders
+
+PARAGRAPHS = [f"Paragraph {word} of the report." for word in
+              ("one", "two", "three", "four", "five", "six")]
+
+class ConfidenceClassifier():
+    """Confident about emails whose first chunk is `confident_vector`, only."""
+    def __init__(self, confident_vector):
+        self.confident_vector = confident_vector
+        self.calls = []
+
+    def classify_with_confidence(self, embeddings):
+        self.calls.append(len(embeddings))
+        if np.allclose(embeddings[0], self.confident_vector):
+            return "Bills", 0.95
+        return "Reports", 0.2
+
+@pytest.fixture
+def emails(make_email):
+    return {
+        'confident': make_email("Invoice", ["Invoice attached."] + PARAGRAPHS[:3]),
+        'uncertain': make_email("Report", PARAGRAPHS, uid=2),
+    }
+
+def test_embed_more_extends_progressive_emails(vector_db, emails,
+                                               embedding_function):
+    confident, uncertain = emails['confident'], emails['uncertain']
+    embedded = vector_db.embed_emails(
+        [confident, uncertain], progressive=[uncertain.uuid]
+    )
+    assert embedded['offsets'][uncertain.uuid] == (4, 5)
+    assert len(embedded['remaining'][uncertain.uuid]) == 5
+
+    embedded = vector_db.embed_more(embedded, [uncertain.uuid], max_chunks=2)
+
+    assert embedded['offsets'] == {confident.uuid: (0, 4), uncertain.uuid: (4, 7)}
+    assert len(embedded['remaining'][uncertain.uuid]) == 3
+    assert embedding_function.calls[-1] == PARAGRAPHS[1:3]
+    assert np.allclose(embedded['embeddings'][5:7], embedding_function(PARAGRAPHS[1:3]))
+
+def test_confident_emails_stop_after_one_chunk(vector_db, emails,
+                                               embedding_function):
+    confident = emails['confident']
+    classifier = ConfidenceClassifier(embedding_function(["Invoice attached."])[0])
+
+    predictions, embedded = predict_folders(
+        [confident], vector_db, classifier=classifier, confidence_threshold=0.9
+    )
+
+    assert predictions == {confident.uuid: ("Bills", "classifier")}
+    assert classifier.calls == [1]
+    # The rest is left for the background worker once the email is stored
+    assert len(embedded['remaining'][confident.uuid]) == 3
+
+def test_uncertain_emails_grow_until_every_chunk_is_embedded(vector_db, emails,
+                                                             embedding_function):
+    confident, uncertain = emails['confident'], emails['uncertain']
+    classifier = ConfidenceClassifier(embedding_function(["Invoice attached."])[0])
+
+    predictions, embedded = predict_folders(
+        [confident, uncertain], vector_db, classifier=classifier,
+        confidence_threshold=0.9
+    )
+
+    # Each round doubles the chunks embedded so far
+    assert classifier.calls == [1, 1, 2, 4, 6]
+    assert predictions[uncertain.uuid] == ("Reports", "classifier")
+    assert embedded['offsets'][uncertain.uuid] == (1, 7)
+    assert uncertain.uuid not in embedded['remaining']
+    assert confident.uuid in embedded['remaining']
@@ -0,0 +1,66 @@
+import pytest
+
+from mailfox.core.email_record import (
+    EMAIL_KEYS,
+    EmailRecord,
+    display_date,
+    display_date_timestamp,
+)
+
+def test_records_round_trip_email_dicts():
+    mail = {
+        'uid': 3,
+        'folder': 'INBOX',
+        'from': 'ann@example.com',
+        'to': 'bob@example.com',
+        'subject': 'Hello',
+        'paragraphs': ['Hi Bob.'],
+        'unknown': 'ignored',
+    }
+
+    record = EmailRecord.from_dict(mail)
+
+    assert record.sender == 'ann@example.com'
+    assert record.recipient == 'bob@example.com'
+    assert record.date is None
+    assert {key: value for key, value in record.to_dict().items() if value} == {
+        key: value for key, value in mail.items() if key != 'unknown'
+    }
+
+def test_records_are_accessed_like_dicts():
+    record = EmailRecord(sender='ann@example.com', subject='Hello')
+
+    assert record['from'] == 'ann@example.com'
+    assert record.get('list_id', 'none') is None
+    assert record.get('unknown', 'none') == 'none'
+    record['to'] = 'bob@example.com'
+    assert record.recipient == 'bob@example.com'
+    assert 'from' in record and 'sender' not in record
+    assert list(record) == record.keys() == list(EMAIL_KEYS)
+    with pytest.raises(KeyError):
+        record['unknown']
+
+def test_records_have_no_per_instance_dict():
+    record = EmailRecord(uuid='abc', folder='INBOX', uid=1, subject='Hello')
+
+    with pytest.raises(AttributeError):
+        record.extra = 'value'
+    assert not hasattr(record, '__dict__')
+    assert repr(record) == (
+        "EmailRecord(uuid='abc', folder='INBOX', uid=1, subject='Hello')"
+    )
+
+def test_display_dates_are_local_time_of_utc_timestamps(new_york_time):
+    # 2024-01-01 10:00 UTC is 05:00 in New York (EST), 2024-07-01 10:00 UTC is 06:00
+    assert display_date(1704103200) == 'Mon, 01 Jan 2024 05:00:00'
+    assert display_date(1719828000) == 'Mon, 01 Jul 2024 06:00:00'
+
+def test_display_date_timestamps_convert_local_time_to_utc(new_york_time):
+    assert display_date_timestamp('Mon, 01 Jan 2024 05:00:00') == 1704103200
+    assert display_date_timestamp('Mon, 01 Jul 2024 06:00:00') == 1719828000
+    for date_ts in (1704103200, 1719828000, 1710054000):
+        assert display_date_timestamp(display_date(date_ts)) == date_ts
+
+def test_unparseable_display_dates_have_no_timestamp():
+    assert display_date_timestamp('yesterday') is None
+    assert display_date_timestamp(None) is None
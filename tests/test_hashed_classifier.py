@@ -0,0 +1,94 @@
+import pickle
+
+import pytest
+
+from mailfox.core.email_record import EmailRecord
+from mailfox.vector.classifiers.hashed import HashedFeatureClassifier, email_features
+
+FOLDERS = {
+    'Bills': ('billing@power.example.com', ['invoice', 'amount', 'due', 'payment']),
+    'Travel': ('trips@air.example.org', ['flight', 'boarding', 'gate', 'seat']),
+    'Friends': ('sam@mail.example.net', ['dinner', 'weekend', 'party', 'movie']),
+}
+
+def record(folder, i):
+    sender, words = FOLDERS[folder]
+    return EmailRecord(
+        sender=sender,
+        subject=f"{words[i % 4]} {i}",
+        raw_body=' '.join(words[(i + j) % 4] for j in range(6)),
+    )
+
+@pytest.fixture(scope="module")
+def trained():
+    emails, folders = [], []
+    for folder in FOLDERS:
+        for i in range(20):
+            emails.append(record(folder, i))
+            folders.append(folder)
+    classifier = HashedFeatureClassifier()
+    metrics = classifier.fit(emails, folders)
+    return classifier, metrics
+
+def test_email_features_cover_headers_and_text():
+    mail = EmailRecord(
+        sender='News <News@mail.shop.example.com>',
+        subject='Weekly deals',
+        raw_body='<p>Big <b>sale</b></p>',
+        list_id='<deals.shop.example.com>',
+        list_unsubscribe='<mailto:unsubscribe@shop.example.com>',
+    )
+
+    assert email_features(mail) == [
+        'sender:news@mail.shop.example.com',
+        'domain:mail.shop.example.com',
+        'domain:shop.example.com',
+        'domain:example.com',
+        'list:<deals.shop.example.com>',
+        'list_unsubscribe',
+        'subject:weekly',
+        'subject:deals',
+        'body:big',
+        'body:sale',
+    ]
+
+def test_fitted_classifiers_predict_folders(trained):
+    classifier, metrics = trained
+
+    assert metrics['num_folders'] == 3
+    assert metrics['accuracy'] == 1.0
+    for folder in FOLDERS:
+        predicted, confidence = classifier.classify_with_confidence(record(folder, 21))
+        assert predicted == folder
+        assert 1 / 3 < confidence <= 1.0
+
+def test_save_and_load_round_trip(trained, tmp_path):
+    classifier, metrics = trained
+    path = tmp_path / "hashed.npz"
+    classifier.save_model(path, metrics)
+
+    loaded = HashedFeatureClassifier()
+    assert loaded.load_model(path) == pytest.approx(metrics)
+
+    for folder in FOLDERS:
+        mail = record(folder, 22)
+        folder, confidence = loaded.classify_with_confidence(mail)
+        assert folder == classifier.classify_email(mail)
+        assert confidence == pytest.approx(classifier.classify_with_confidence(mail)[1])
+
+def test_pickled_models_still_load(trained, tmp_path):
+    classifier, metrics = trained
+    path = tmp_path / "hashed.pkl"
+    with open(path, 'wb') as f:
+        pickle.dump({'model': classifier.model,
+                     'folder_mapping': classifier.folder_mapping}, f)
+
+    loaded = HashedFeatureClassifier()
+    assert loaded.load_model(path) == {}
+    assert loaded.classify_email(record('Travel', 23)) == 'Travel'
+
+def test_unfitted_classifiers_predict_unknown():
+    classifier = HashedFeatureClassifier()
+
+    assert classifier.classify_with_confidence(record('Bills', 0)) == ("UNKNOWN", 0.0)
+    assert HashedFeatureClassifier.uses_embeddings is False
@@ -0,0 +1,16 @@
+# The wall-clock budget depends on the machine, so it's only checked by running
+# benchmarks/import_time.py
+from benchmarks.import_time import DEFERRED_MODULES, check, measure
+
+def test_cli_defers_heavy_dependencies():
+    imported = {name.split(".")[0] for name in measure("mailfox.cli.app")}
+
+    assert imported.isdisjoint(DEFERRED_MODULES)
+
+def test_check_reports_eager_imports_and_slow_imports():
+    timings = {"mailfox.cli.app": 400_000, "numpy.core": 1000, "sklearn": 1000}
+
+    assert check(timings, budget_ms=300) == [
+        "importing mailfox.cli.app took 400.0 ms, budget is 300 ms",
+        "imported eagerly: numpy, sklearn",
+    ]
@@ -0,0 +1,111 @@
+import json
+import threading
+import urllib.request
+
+import pytest
+
+from mailfox.core import metrics
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, '_gauges', {})
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+def test_metrics_are_not_recorded_until_enabled(monkeypatch):
+    monkeypatch.setattr(metrics, '_gauges', {})
+    metrics.reset()
+
+    metrics.increment("emails_moved_total")
+    metrics.observe("embed_seconds", 0.2)
+
+    snapshot = metrics.snapshot()
+    assert (snapshot['counters'], snapshot['histograms']) == ({}, {})
+
+def test_histograms_count_each_latency_in_one_bucket():
+    histogram = metrics.Histogram()
+    for seconds in (0.0005, 0.003, 0.003, 100.0):
+        histogram.observe(seconds)
+
+    cumulative = dict(histogram.cumulative())
+    assert cumulative[0.001] == 1
+    assert cumulative[0.005] == 3
+    assert cumulative[30.0] == 3
+    assert cumulative[float("inf")] == histogram.count == 4
+    assert histogram.sum == pytest.approx(100.0065)
+
+def test_timed_records_latencies_and_keeps_results(enabled):
+    @metrics.timed("work")
+    def work(value):
+        if value is None:
+            raise ValueError("no value")
+        return value * 2
+
+    assert work(21) == 42
+    with pytest.raises(ValueError):
+        work(None)
+
+    histogram = metrics.snapshot()['histograms']['work_seconds']
+    assert histogram['count'] == 2
+
+def test_snapshots_report_hit_rates_and_gauges(enabled):
+    metrics.increment("embedding_cache_hits_total", 3)
+    metrics.increment("embedding_cache_misses_total")
+    metrics.register_gauge("pipeline_queue_depth", lambda: {"fetch": 2}, label="stage")
+
+    def broken():
+        raise RuntimeError("gone")
+    metrics.register_gauge("broken", broken)
+
+    snapshot = metrics.snapshot()
+
+    assert snapshot['counters']['embedding_cache_hits_total'] == 3
+    assert snapshot['hit_rates'] == {'embedding_cache': 0.75}
+    # Gauges that fail to read are left out
+    assert snapshot['gauges'] == {'pipeline_queue_depth': {'fetch': 2}}
+
+def test_prometheus_text_exposition(enabled):
+    metrics.increment("emails_moved_total", 2)
+    metrics.observe("embed_seconds", 0.02)
+    metrics.register_gauge("pipeline_processed", lambda: {"move": 5}, label="stage")
+    metrics.register_gauge("deferred_chunks", lambda: 7)
+
+    lines = metrics.prometheus_text().splitlines()
+
+    assert "# TYPE mailfox_emails_moved_total counter" in lines
+    assert "mailfox_emails_moved_total 2" in lines
+    assert 'mailfox_embed_seconds_bucket{le="0.01"} 0' in lines
+    assert 'mailfox_embed_seconds_bucket{le="0.025"} 1' in lines
+    assert 'mailfox_embed_seconds_bucket{le="+Inf"} 1' in lines
+    assert "mailfox_embed_seconds_count 1" in lines
+    assert 'mailfox_pipeline_processed{stage="move"} 5' in lines
+    assert "mailfox_deferred_chunks 7" in lines
+
+def test_http_server_serves_metrics(enabled):
+    metrics.increment("emails_moved_total")
+    server = metrics.start_http_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            body = response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert "mailfox_emails_moved_total 1" in body.splitlines()
+
+def test_snapshot_writer_writes_a_last_snapshot_on_stop(enabled, tmp_path):
+    path = tmp_path / "metrics" / "snapshot.json"
+    stop_event = threading.Event()
+    thread = metrics.start_snapshot_writer(str(path), 60, stop_event)
+    metrics.increment("emails_moved_total")
+
+    stop_event.set()
+    thread.join(5)
+
+    with open(path) as f:
+        assert json.load(f)['counters'] == {'emails_moved_total': 1}
+    assert not (tmp_path / "metrics" / "snapshot.json.tmp").exists()
@@ -0,0 +1,58 @@
+import pytest
+
+from mailfox.vector.connections import ThreadConnections
+from mailfox.vector.near_duplicates import NearDuplicateIndex
+
+NEWSLETTER = (
+    "Hello subscriber, here are this week's top stories from around the world. "
+    "Markets rallied on Tuesday after the central bank held rates steady, while "
+    "technology shares led the gains. In sports, the home team won the final in "
+    "extra time. Our editors also picked three long reads for the weekend, from "
+    "a profile of a lighthouse keeper to the history of the humble pencil."
+)
+
+@pytest.fixture
+def index(tmp_path):
+    return NearDuplicateIndex(ThreadConnections(str(tmp_path / "emails.db")))
+
+def test_signatures_are_deterministic_and_need_words(index):
+    assert (index.signature(NEWSLETTER) == index.signature(NEWSLETTER.upper())).all()
+    assert index.signature("   ") is None
+
+def test_similarity_estimates_jaccard_similarity(index):
+    signature = index.signature(NEWSLETTER)
+    edited = index.signature(NEWSLETTER.replace("Tuesday", "Wednesday"))
+    unrelated = index.signature("Your order has shipped and will arrive on Friday.")
+
+    assert index.similarity(signature, signature) == 1.0
+    assert 0.5 < index.similarity(signature, edited) < 1.0
+    assert index.similarity(signature, unrelated) < 0.1
+
+def test_find_returns_indexed_near_duplicates(index):
+    index.add("stored", index.signature(NEWSLETTER))
+    index.add("other", index.signature("Your order has shipped and will arrive soon."))
+
+    assert index.find(index.signature(NEWSLETTER + " See you next week.")) == "stored"
+    assert index.find(index.signature("Meeting moved to three o'clock today.")) is None
+    assert index.find(None) is None
+
+def test_add_ignores_uuids_already_indexed(index):
+    signature = index.signature(NEWSLETTER)
+    index.add("stored", signature)
+    index.add("stored", signature)
+
+    bands = index.connections.get().execute('SELECT COUNT(*) FROM minhash_bands')
+    assert bands.fetchone()[0] == index.bands
+
+def test_find_in_matches_emails_of_the_same_batch(index):
+    buckets = {}
+    index.add_to("first", index.signature(NEWSLETTER), buckets)
+
+    assert index.find_in(index.signature(NEWSLETTER), buckets) == "first"
+    assert index.find_in(index.signature("Lunch at noon?"), buckets) is None
+
+def test_num_perm_must_split_into_bands(tmp_path):
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(
+            ThreadConnections(str(tmp_path / "emails.db")), num_perm=60, bands=8
+        )
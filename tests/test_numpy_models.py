@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from mailfox.vector.classifiers import get_classifier_class
+from mailfox.vector.classifiers.numpy_models import LinearModel, MLPModel
+
+# Small models keep training fast, the predictions are compared all the same
+PARAMS = {
+    "svm": {},
+    "logistic": {},
+    "mlp": {"hidden_layer_sizes": (16, 8), "max_iter": 50, "early_stopping": False},
+}
+
+def training_data(folder_count, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((folder_count, 32)) * 2
+    labels = rng.integers(0, folder_count, 300)
+    embeddings = centers[labels] + rng.standard_normal((300, 32))
+    return embeddings, [f"folder-{label}" for label in labels]
+
+@pytest.fixture(params=[2, 4], ids=["binary", "multiclass"])
+def folder_count(request):
+    return request.param
+
+@pytest.mark.filterwarnings("ignore::sklearn.exceptions.ConvergenceWarning")
+@pytest.mark.parametrize("classifier_type", ["svm", "logistic", "mlp"])
+def test_numpy_predictions_match_sklearn(tmp_path, classifier_type, folder_count):
+    embeddings, folders = training_data(folder_count)
+    classifier = get_classifier_class(classifier_type)(**PARAMS[classifier_type])
+    classifier.fit(embeddings, folders)
+    classifier.save_model(tmp_path / "model.npz")
+
+    loaded = get_classifier_class(classifier_type)()
+    loaded.load_model(tmp_path / "model.npz")
+
+    assert isinstance(loaded.model, (LinearModel, MLPModel))
+    X = training_data(folder_count, seed=1)[0]
+    assert np.array_equal(loaded.model.predict(X), classifier.model.predict(X))
+    if hasattr(classifier.model, "predict_proba"):
+        assert np.allclose(
+            loaded.model.predict_proba(X), classifier.model.predict_proba(X)
+        )
+    if hasattr(classifier.model, "decision_function"):
+        assert np.allclose(
+            loaded.model.decision_function(X), classifier.model.decision_function(X)
+        )
+    for rows in (list(X[:1]), list(X[:5])):
+        assert loaded.classify_email(rows) == classifier.classify_email(rows)
+        folder, confidence = loaded.classify_with_confidence(rows)
+        expected_folder, expected = classifier.classify_with_confidence(rows)
+        assert folder == expected_folder
+        assert confidence == pytest.approx(expected)
+
+def test_load_model_rejects_another_classifiers_file(tmp_path):
+    embeddings, folders = training_data(2)
+    classifier = get_classifier_class("logistic")()
+    classifier.fit(embeddings, folders)
+    classifier.save_model(tmp_path / "model.npz")
+
+    with pytest.raises(ValueError):
+        get_classifier_class("svm")().load_model(tmp_path / "model.npz")
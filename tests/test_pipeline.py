@@ -0,0 +1,170 @@
+import queue
+import threading
+
+import pytest
+
+from mailfox.core.email_processor import build_mail_pipeline
+from mailfox.core.pipeline import Pipeline, Stage
+
+@pytest.fixture
+def stop_event():
+    stop_event = threading.Event()
+    yield stop_event
+    stop_event.set()
+
+def test_stages_take_up_to_batch_size_items(stop_event):
+    batches = []
+    stage = Stage("collect", batches.append, batch_size=3)
+    for i in range(7):
+        stage.put(i, stop_event)
+
+    stage.start(stop_event)
+    stage.queue.join()
+
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert stage.stats()['processed'] == 7
+
+def test_pipelines_feed_each_stage_to_the_next():
+    collected = []
+    pipeline = Pipeline([
+        Stage("double", lambda items: [item * 2 for item in items], workers=2,
+              batch_size=4),
+        Stage("collect", collected.extend),
+    ])
+    pipeline.start()
+    for i in range(10):
+        assert pipeline.submit(i)
+
+    # Drain the stages in order, so every item has made it through
+    for stage in pipeline.stages:
+        stage.queue.join()
+    pipeline.stop()
+
+    assert sorted(collected) == [i * 2 for i in range(10)]
+    assert pipeline.stats()['collect']['processed'] == 10
+
+def test_items_can_skip_to_a_named_stage():
+    collected = []
+    pipeline = Pipeline([
+        Stage("first", lambda items: None),
+        Stage("last", collected.extend),
+    ])
+    pipeline.start()
+
+    pipeline.submit("late", stage="last")
+    pipeline["last"].queue.join()
+    pipeline.stop()
+
+    assert collected == ["late"]
+    with pytest.raises(KeyError):
+        pipeline["missing"]
+
+def test_failed_batches_are_counted_and_the_stage_keeps_going(stop_event):
+    handled = []
+
+    def handler(items):
+        if "bad" in items:
+            raise ValueError("bad item")
+        handled.extend(items)
+
+    stage = Stage("check", handler, batch_size=2)
+    for item in ("a", "bad", "b", "c"):
+        stage.put(item, stop_event)
+    stage.start(stop_event)
+    stage.queue.join()
+
+    stats = stage.stats()
+    assert handled == ["b", "c"]
+    assert (stats['processed'], stats['errors']) == (2, 2)
+
+def test_stop_ends_the_workers_and_refuses_new_items():
+    pipeline = Pipeline([Stage("idle", lambda items: None, workers=2)])
+    pipeline.start()
+
+    pipeline.stop()
+
+    assert not any(thread.is_alive() for thread in pipeline["idle"]._threads)
+    assert not pipeline.submit("late")
+
+class FakeIMAP():
+    def __init__(self, raw=None, error=None):
+        self.raw = raw or {}
+        self.error = error
+
+    def fetch_raw(self, folder, uids):
+        if self.error:
+            raise self.error
+        return {uid: self.raw[uid] for uid in uids if uid in self.raw}
+
+    def move_mail(self, uids, folder, source_folder=None, message_ids=None):
+        raise ConnectionError("connection reset")
+
+class FakeVectorDatabase():
+    def __init__(self):
+        self.restored = []
+        self.moves = []
+
+    def restore_location(self, uuid, folder, uid):
+        self.restored.append((uuid, folder, uid))
+
+    def record_moves(self, moves, folder):
+        self.moves.append((moves, folder))
+
+class FakeParser():
+    def parse_raw(self, uid, folder, raw_email, flags):
+        return None
+
+def mail_pipeline(imap, vector_db=None):
+    released = queue.SimpleQueue()
+    pipeline = build_mail_pipeline(
+        FakeParser(), lambda: imap, vector_db or FakeVectorDatabase(), {},
+        queue.SimpleQueue(), released
+    )
+    pipeline.start()
+    return pipeline, released
+
+def released_uids(released):
+    uids = []
+    while not released.empty():
+        uids.extend(released.get())
+    return sorted(uids)
+
+def test_uids_of_failed_batches_are_released():
+    pipeline, released = mail_pipeline(FakeIMAP(error=ConnectionError("reset")))
+    pipeline.submit({"folder": "INBOX", "uid": 1, "classify": True})
+    pipeline.submit({"folder": "INBOX", "uid": 2, "classify": True})
+    # Only emails to classify are tracked by the poller
+    pipeline.submit({"folder": "Archive", "uid": 3, "classify": False})
+
+    pipeline["fetch"].queue.join()
+    pipeline.stop()
+
+    assert released_uids(released) == [1, 2]
+    assert pipeline.stats()["fetch"]["errors"] == 3
+
+def test_uids_the_server_did_not_return_are_released():
+    pipeline, released = mail_pipeline(FakeIMAP(raw={1: (b"raw", ())}))
+    pipeline.submit({"folder": "INBOX", "uid": 1, "classify": True})
+    pipeline.submit({"folder": "INBOX", "uid": 2, "classify": True})
+
+    pipeline["fetch"].queue.join()
+    pipeline["parse"].queue.join()
+    pipeline.stop()
+
+    # The returned email doesn't parse, so it's given up on rather than released
+    assert released_uids(released) == [2]
+
+def test_failed_moves_release_the_uids_and_restore_the_location():
+    vector_db = FakeVectorDatabase()
+    pipeline, released = mail_pipeline(FakeIMAP(), vector_db)
+
+    pipeline.submit({
+        "folder": "Bills",
+        "moves": [("uuid-1", "INBOX", 7, "<1@example.com>", "svm")],
+    }, stage="move")
+    pipeline["move"].queue.join()
+    pipeline.stop()
+
+    assert released_uids(released) == [7]
+    assert vector_db.restored == [("uuid-1", "INBOX", 7)]
+    assert vector_db.moves == []
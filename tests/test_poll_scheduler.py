@@ -0,0 +1,54 @@
+from mailfox.core.poll_scheduler import FolderPollScheduler
+
+class Clock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_every_folder_is_due_at_first():
+    scheduler = FolderPollScheduler(60, 600, clock=Clock())
+
+    assert scheduler.due(["INBOX", "Archive"]) == ["INBOX", "Archive"]
+
+def test_unchanged_folders_back_off_up_to_the_max_interval():
+    clock = Clock()
+    scheduler = FolderPollScheduler(60, 300, clock=clock)
+    status = {"MESSAGES": 10, "UIDNEXT": 11}
+
+    intervals = []
+    for _ in range(5):
+        scheduler.record("Archive", status, changed=False)
+        intervals.append(scheduler.intervals["Archive"])
+
+    assert intervals == [120, 240, 300, 300, 300]
+    clock.now += 200
+    assert scheduler.due(["Archive"]) == []
+    # Due up to half of min_interval early
+    clock.now += 70
+    assert scheduler.due(["Archive"]) == ["Archive"]
+
+def test_a_change_resets_the_interval():
+    clock = Clock()
+    scheduler = FolderPollScheduler(60, 600, clock=clock)
+    scheduler.record("INBOX", {"UIDNEXT": 5}, changed=False)
+    scheduler.record("INBOX", {"UIDNEXT": 5}, changed=False)
+
+    assert scheduler.changed("INBOX", {"UIDNEXT": 6})
+    assert not scheduler.changed("INBOX", {"UIDNEXT": 5})
+
+    scheduler.record("INBOX", {"UIDNEXT": 6}, changed=True)
+    assert scheduler.intervals["INBOX"] == 60
+    assert scheduler.next_due["INBOX"] == clock.now + 60
+
+def test_folders_never_polled_count_as_changed():
+    scheduler = FolderPollScheduler(60, 600, clock=Clock())
+
+    assert scheduler.changed("INBOX", {"UIDNEXT": 1})
+
+def test_max_interval_is_at_least_the_min_interval():
+    scheduler = FolderPollScheduler(60, 30, clock=Clock())
+    scheduler.record("INBOX", {}, changed=False)
+
+    assert scheduler.intervals["INBOX"] == 60
@@ -0,0 +1,86 @@
+import pytest
+
+from mailfox.vector.connections import ThreadConnections
+from mailfox.vector.sender_rules import SenderRuleIndex
+
+@pytest.fixture
+def connections(tmp_path):
+    connections = ThreadConnections(str(tmp_path / "emails.db"))
+    connections.get().execute(
+        'CREATE TABLE emails '
+        '(sender TEXT, list_id TEXT, folder TEXT, auto_filed INTEGER)'
+    )
+    return connections
+
+def file_emails(connections, rows):
+    connections.get().executemany(
+        'INSERT INTO emails (sender, list_id, folder, auto_filed) VALUES (?, ?, ?, ?)',
+        rows
+    )
+
+def test_rule_keys_are_most_specific_first():
+    keys = SenderRuleIndex.rule_keys(
+        'News <News@Example.com>', 'Weekly News <weekly.example.com>'
+    )
+
+    assert keys == [
+        ("list_id", "weekly.example.com"),
+        ("sender", "news@example.com"),
+        ("domain", "example.com"),
+    ]
+    assert SenderRuleIndex.rule_keys(None) == []
+
+def test_a_key_becomes_a_rule_with_enough_pure_support(connections):
+    rules = SenderRuleIndex(connections, min_support=3, min_purity=0.75)
+
+    for _ in range(2):
+        rules.record('bills@power.com', None, 'Bills')
+    assert rules.lookup('bills@power.com') is None
+
+    rules.record('bills@power.com', None, 'Bills')
+    assert rules.lookup('Power <bills@power.com>') == 'Bills'
+    # The domain rule covers the company's other addresses
+    assert rules.lookup('alerts@power.com') == 'Bills'
+
+    rules.record('bills@power.com', None, 'Receipts')
+    rules.record('bills@power.com', None, 'Receipts')
+    assert rules.lookup('bills@power.com') is None
+
+def test_list_id_rules_take_precedence_over_the_sender(connections):
+    rules = SenderRuleIndex(connections, min_support=2, min_purity=0.9)
+    for _ in range(2):
+        rules.record('team@example.com', None, 'Work')
+        rules.record('team@example.com', '<dev.lists.example.com>', 'Lists')
+
+    assert rules.lookup('team@example.com', 'Dev <dev.lists.example.com>') == 'Lists'
+    assert rules.lookup('team@example.com') is None
+
+def test_unfiled_mail_and_removals_are_not_counted(connections):
+    rules = SenderRuleIndex(connections, min_support=2, min_purity=0.9)
+    for _ in range(3):
+        rules.record('shop@store.com', None, 'INBOX')
+    assert rules.lookup('shop@store.com') is None
+
+    for _ in range(2):
+        rules.record('shop@store.com', None, 'Shopping')
+    assert rules.lookup('shop@store.com') == 'Shopping'
+
+    rules.record('shop@store.com', None, 'Shopping', delta=-1)
+    assert rules.lookup('shop@store.com') is None
+
+def test_rebuild_counts_only_mail_the_user_filed(connections):
+    file_emails(connections, [
+        ('ann@friends.org', None, 'Friends', 0),
+        ('ann@friends.org', None, 'Friends', 0),
+        ('ann@friends.org', None, 'Spam', 1),
+        ('ann@friends.org', None, 'Spam', 1),
+        ('ann@friends.org', None, 'INBOX', 0),
+    ])
+
+    rules = SenderRuleIndex(connections, min_support=2, min_purity=0.9)
+
+    assert rules.lookup('ann@friends.org') == 'Friends'
+    assert rules.rules() == [
+        ("sender", "ann@friends.org", "Friends", 2, 1.0),
+        ("domain", "friends.org", "Friends", 2, 1.0),
+    ]
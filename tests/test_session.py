@@ -0,0 +1,142 @@
+import io
+import threading
+import time
+import zlib
+from email.message import EmailMessage
+
+import pytest
+
+from benchmarks.fake_imap import FakeIMAPServer, Mailbox
+from mailfox.email_interface import session
+from mailfox.email_interface.email_handler import EmailHandler
+from mailfox.email_interface.session import IMAPSession, _InflatingFile, _Internals
+
+def message(i):
+    mail = EmailMessage()
+    mail['From'] = 'ann@example.com'
+    mail['To'] = 'bob@example.com'
+    mail['Subject'] = f'Note {i}'
+    mail['Date'] = 'Mon, 01 Jan 2024 10:00:00 +0000'
+    mail['Message-ID'] = f'<note-{i}@example.com>'
+    mail.set_content(f"Note number {i}.")
+    return mail.as_bytes()
+
+@pytest.fixture
+def mailbox():
+    mailbox = Mailbox()
+    mailbox.folder('INBOX')
+    mailbox.folder('Notes')
+    for i in range(3):
+        mailbox.add('INBOX', message(i))
+    return mailbox
+
+@pytest.fixture
+def server(mailbox):
+    with FakeIMAPServer(mailbox) as server:
+        yield server
+
+@pytest.fixture
+def open_session(server, monkeypatch):
+    monkeypatch.setattr(session, 'RECONNECT_BACKOFF', 0.0)
+    sessions = []
+
+    def open_session(**options):
+        imap = IMAPSession('127.0.0.1', 'user', 'password', port=server.port,
+                           ssl=False, **options)
+        sessions.append(imap)
+        return imap
+    yield open_session
+    for imap in sessions:
+        imap.logout()
+
+def compressed(data):
+    deflater = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return deflater.compress(data) + deflater.flush(zlib.Z_SYNC_FLUSH)
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_inflating_file_round_trips_lines_and_literals():
+    lines = [b'* 1 FETCH (BODY[] {%d}\r\n' % 5000, b'x' * 5000, b')\r\n', b'A1 OK\r\n']
+    raw = compressed(b''.join(lines))
+    # Compressed data arrives in pieces smaller than the lines
+    file = _InflatingFile(io.BufferedReader(io.BytesIO(raw), buffer_size=16))
+
+    assert file.readline() == lines[0]
+    assert file.read(5000) == lines[1]
+    assert file.readline(2) == b')\r'
+    assert file.readline() == b'\n'
+    assert file.readline() == lines[3]
+    assert file.readline() == b''
+
+def test_compression_is_negotiated_when_offered(open_session):
+    imap = open_session(compress=True)
+
+    assert imap.compressed
+    imap.select_folder('INBOX')
+    assert imap.search('ALL') == [1, 2, 3]
+    assert imap.esearch('ALL') == '1:3'
+
+def test_dropped_connections_reconnect_and_retry_reads(server, open_session):
+    imap = open_session(compress=True)
+    imap.select_folder('INBOX')
+    first = imap.client
+
+    server.drop_connections()
+
+    # The folder is selected again on the new connection
+    assert imap.search('ALL') == [1, 2, 3]
+    assert imap.client is not first
+    assert imap.selected_folder == 'INBOX'
+
+def test_commands_that_change_the_mailbox_are_not_repeated(server, open_session,
+                                                            mailbox):
+    imap = open_session(compress=False)
+    imap.select_folder('INBOX')
+
+    server.drop_connections()
+
+    with pytest.raises(session.CONNECTION_ERRORS):
+        imap.transfer('move', [1], 'Notes')
+    assert len(mailbox.folder('Notes').messages) == 0
+    # The session is usable again
+    assert imap.search('ALL') == [1, 2, 3]
+
+def test_keepalive_sends_a_noop_when_idle(open_session):
+    imap = open_session(compress=False, keepalive_interval=0.2)
+    stop_event = threading.Event()
+    idle_since = imap.last_activity
+
+    imap.start_keepalive(stop_event)
+    time.sleep(0.5)
+    stop_event.set()
+
+    assert imap.last_activity > idle_since
+
+def test_sessions_do_without_internals_when_unsupported(open_session, mailbox,
+                                                        monkeypatch):
+    monkeypatch.setattr(_Internals, 'supported', False)
+    imap = open_session(compress=True)
+
+    assert not imap.compressed
+    assert not imap.has_capability('ESEARCH')
+    assert imap.has_capability('MOVE')
+    imap.select_folder('INBOX')
+    assert imap.transfer('move', [1], 'Notes') == []
+    assert len(mailbox.folder('Notes').messages) == 1
+
+def test_close_logs_out_and_stops_the_keepalive(server):
+    handler = EmailHandler('user', 'password', server='127.0.0.1', port=server.port,
+                           ssl=False, compress=False)
+    assert wait_for(lambda: len(server.connections) == 1)
+
+    handler.close()
+
+    assert handler.stop_event.is_set()
+    assert handler.mail.client is None
+    assert wait_for(lambda: not server.connections)
+    # Closing twice, as run.py may, is harmless
+    handler.close()
@@ -0,0 +1,137 @@
+from mailfox.email_interface.text_cleaner import TextCleaner
+
+def test_clean_strips_quoted_replies_and_their_attribution():
+    text = (
+        "Sounds good, see you then.\n"
+        "\n"
+        "On Mon, 1 Jan 2024 at 10:00, Ann <ann@example.com>\n"
+        "wrote:\n"
+        "> Can we meet on Friday?\n"
+        "> Ann"
+    )
+
+    assert TextCleaner().clean(text) == "Sounds good, see you then."
+
+def test_clean_strips_outlook_original_message():
+    text = (
+        "Approved.\n"
+        "-----Original Message-----\n"
+        "From: Bob <bob@example.com>\n"
+        "Sent: Monday\n"
+        "Please approve the invoice."
+    )
+
+    assert TextCleaner().clean(text) == "Approved."
+
+def test_clean_keeps_forwarded_messages():
+    text = (
+        "FYI\n"
+        "---------- Forwarded message ---------\n"
+        "From: Carol <carol@example.com>\n"
+        "Date: Mon, 1 Jan 2024\n"
+        "The build is fixed."
+    )
+
+    assert "The build is fixed." in TextCleaner().clean(text)
+
+def test_clean_strips_signatures_and_footers():
+    cleaner = TextCleaner()
+
+    assert cleaner.clean("Hi,\nthe report is attached.\n-- \nDan\n555-0100") == (
+        "Hi,\nthe report is attached."
+    )
+    assert cleaner.clean("Lunch at noon?\n\nSent from my iPhone") == "Lunch at noon?"
+    assert cleaner.clean(
+        "This week's top stories.\n\nTo unsubscribe, click here.\n123 Main St"
+    ) == "This week's top stories."
+    assert cleaner.clean(
+        "New features shipped.\n"
+        "You are receiving this because you signed up.\n"
+        "Unsubscribe | Manage preferences\n"
+        "© 2024 Example Inc, https://example.com"
+    ) == "New features shipped."
+
+def test_clean_keeps_personal_mail_mentioning_opt_out_or_unsubscribe():
+    cleaner = TextCleaner()
+    opt_out = (
+        "Hi Sam,\n"
+        "we should opt out of the vendor contract before it renews in March.\n"
+        "The new terms add a 12% increase and a three year lock-in.\n"
+        "I'd rather move to the cheaper plan we looked at.\n"
+        "Can you check the notice period?\n"
+        "Thanks,\n"
+        "Alex"
+    )
+    unsubscribe = (
+        "Hi Sam,\n"
+        "I had to unsubscribe from the project list, it was too noisy.\n"
+        "Can you forward me anything about the launch?\n"
+        "Please unsubscribe me from the digest too.\n"
+        "Alex"
+    )
+
+    assert cleaner.clean(opt_out) == opt_out
+    assert cleaner.clean(unsubscribe) == unsubscribe
+
+def test_clean_only_cuts_footer_blocks_at_the_end():
+    text = (
+        "Our team read 'to unsubscribe' in the draft footer on page 2.\n"
+        "Let's discuss it on Monday.\n"
+        "Alex"
+    )
+
+    assert TextCleaner().clean(text) == text
+
+def test_clean_drops_a_leading_browser_link():
+    text = "View this email in your browser\nBig sale this weekend.\nShop now."
+
+    assert TextCleaner().clean(text) == "Big sale this weekend.\nShop now."
+
+def test_clean_never_strips_text_to_nothing():
+    assert TextCleaner().clean("> only a quote") == "> only a quote"
+
+def test_clean_learns_a_senders_recurring_footer():
+    cleaner = TextCleaner(min_support=3, min_fraction=0.6)
+    sender = "Legal <legal@example.com>"
+    footer = "\n\nThis message is confidential. Ref 1234."
+
+    bodies = ["Contract signed.", "Audit booked.", "Policy updated.", "Office closed."]
+    cleaned = [cleaner.clean(body + footer, sender=sender) for body in bodies]
+
+    assert cleaned[0] == "Contract signed." + footer
+    assert cleaned[3] == "Office closed."
+    # The footer is learned per sender
+    assert cleaner.clean(f"Hello.{footer}", sender="other@example.com").endswith(
+        "Ref 1234."
+    )
+
+def test_frozen_cleaners_strip_learned_footers_without_learning():
+    learner = TextCleaner(min_support=3, min_fraction=0.6)
+    footer = "\n\nThis message is confidential. Ref 1234."
+    for body in ["Contract signed.", "Audit booked.", "Policy updated."]:
+        learner.clean(body + footer, sender="legal@example.com")
+
+    frozen = TextCleaner(min_support=3, min_fraction=0.6, learning=False)
+    frozen.load_footers(learner.take_footer_changes())
+
+    assert frozen.clean("Office closed." + footer, sender="legal@example.com") == (
+        "Office closed."
+    )
+    # Nothing is learned while frozen, so cleaning is independent of order
+    for _ in range(5):
+        frozen.clean("Hello." + footer, sender="other@example.com")
+    assert frozen.take_footer_changes() == {}
+    assert frozen.clean("Hello." + footer, sender="other@example.com").endswith(
+        "Ref 1234."
+    )
+
+def test_take_footer_changes_reports_forgotten_senders():
+    cleaner = TextCleaner(max_senders=1)
+    cleaner.clean("First.", sender="a@example.com")
+    cleaner.take_footer_changes()
+    cleaner.clean("Second.", sender="b@example.com")
+
+    changes = cleaner.take_footer_changes()
+
+    assert changes["a@example.com"] is None
+    assert changes["b@example.com"][0] == 1
@@ -0,0 +1,85 @@
+from email.message import EmailMessage
+
+import pytest
+
+from benchmarks.fake_imap import FakeIMAPServer, Mailbox
+from mailfox.email_interface.email_handler import EmailHandler, _text_sections
+
+# BODYSTRUCTUREs as IMAPClient parses them
+PLAIN = (b'text', b'plain', (b'charset', b'utf-8'), None, None, b'7bit', 6, 1, None,
+         None, None, None)
+HTML = (b'text', b'html', (b'charset', b'utf-8'), None, None, b'quoted-printable', 17,
+        1, None, None, None, None)
+PLAIN_ATTACHMENT = (b'text', b'plain', (b'charset', b'utf-8'), None, None, b'base64',
+                    6, 1, None, (b'attachment', (b'filename', b'n.txt')), None, None)
+PDF = (b'application', b'pdf', None, None, None, b'base64', 9, None,
+       (b'attachment', (b'filename', b'a.pdf')), None, None)
+
+def multipart(parts, subtype):
+    return (parts, subtype, (b'boundary', b'=='), None, None, None)
+
+def message(kind):
+    mail = EmailMessage()
+    mail['From'] = 'ann@example.com'
+    mail['To'] = 'bob@example.com'
+    mail['Subject'] = 'Weekly digest'
+    mail['Date'] = 'Mon, 01 Jan 2024 10:00:00 +0000'
+    mail['Message-ID'] = f'<{kind}@example.com>'
+    if kind == 'html':
+        mail.set_content('<p>Only <b>HTML</b> here</p>', subtype='html')
+        mail.add_attachment(b'%PDF', maintype='application', subtype='pdf',
+                            filename='a.pdf')
+    else:
+        mail.set_content('Plain text here')
+        mail.add_alternative('<p>HTML text here</p>', subtype='html')
+    return mail
+
+@pytest.fixture
+def handler():
+    mailbox = Mailbox()
+    mailbox.folder('INBOX')
+    for kind in ('html', 'alternative'):
+        mailbox.add('INBOX', message(kind).as_bytes())
+    with FakeIMAPServer(mailbox) as server:
+        handler = EmailHandler('user', 'password', server='127.0.0.1', port=server.port,
+                               ssl=False, compress=False)
+        yield handler
+        handler.stop_event.set()
+        handler.mail.close()
+
+def test_single_part_text_is_read_whole():
+    assert _text_sections(PLAIN) == [("1", b'7bit')]
+    assert _text_sections(PDF) == []
+
+def test_plain_parts_are_preferred_over_html():
+    structure = multipart([PLAIN, HTML], b'alternative')
+
+    assert _text_sections(structure) == [("1", b'7bit')]
+
+def test_attachments_are_skipped():
+    structure = multipart([PLAIN, PLAIN_ATTACHMENT, PDF], b'mixed')
+
+    assert _text_sections(structure) == [("1", b'7bit')]
+
+def test_html_only_messages_fall_back_to_html_parts():
+    structure = multipart([multipart([HTML], b'related'), PDF], b'mixed')
+
+    assert _text_sections(structure) == [("1.1", b'quoted-printable')]
+
+def test_extract_body_reads_html_only_multipart_messages(handler):
+    body = handler._extract_body(message('html'))
+
+    assert '<b>HTML</b>' in body
+
+def test_extract_body_prefers_plain_text(handler):
+    body = handler._extract_body(message('alternative'))
+
+    assert 'Plain text here' in body
+    assert 'HTML text here' not in body
+
+def test_text_fetches_read_the_same_parts_as_full_fetches(handler):
+    emails = handler.get_mail(filter='all', folders=['INBOX'])
+
+    paragraphs = {mail.message_id: ' '.join(mail.paragraphs) for mail in emails}
+    assert 'Only HTML here' in paragraphs['<html@example.com>']
+    assert 'Plain text here' in paragraphs['<alternative@example.com>']
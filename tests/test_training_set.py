@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from mailfox.vector.training_set import (
+    DAY_SECONDS,
+    _deduplicate,
+    build_training_set,
+    recency_weights,
+    training_since,
+)
+
+def test_deduplicate_maps_near_identical_rows_of_a_folder():
+    embeddings = np.array([
+        [1.0, 0.0, 0.0],
+        [0.0, 1.0, 0.0],
+        [1.0, 0.001, 0.0],
+        [1.0, 0.0, 0.0],
+    ])
+    labels = np.array([0, 0, 0, 1])
+
+    representative = _deduplicate(embeddings, labels, threshold=0.98, seed=42)
+
+    # Row 3 is identical to row 0 but filed in another folder, so it's kept
+    assert representative.tolist() == [0, 1, 0, 3]
+
+def test_deduplicate_keeps_rows_below_the_threshold():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((50, 16))
+
+    representative = _deduplicate(embeddings, np.zeros(50), threshold=0.98, seed=42)
+
+    assert representative.tolist() == list(range(50))
+
+def test_deduplicate_resolves_representatives_to_kept_rows():
+    rng = np.random.default_rng(1)
+    base = rng.standard_normal((5, 32))
+    embeddings = np.repeat(base, 20, axis=0) + rng.normal(0, 1e-4, (100, 32))
+
+    representative = _deduplicate(embeddings, np.zeros(100), threshold=0.99, seed=42)
+
+    assert np.array_equal(representative[representative], representative)
+    assert len(np.unique(representative)) == 5
+
+def test_build_training_set_weights_every_email_equally():
+    embeddings = np.eye(4)
+
+    vectors, folders, weights = build_training_set(
+        embeddings, ['a', 'a', 'a', 'b'], ['x', 'x', 'x', 'y'], dedup_threshold=None
+    )
+
+    assert folders == ['a', 'a', 'a', 'b']
+    assert np.allclose(weights, [2 / 3, 2 / 3, 2 / 3, 2])
+    assert weights.mean() == pytest.approx(1)
+
+def test_build_training_set_adds_dropped_duplicate_weight_to_the_kept_row():
+    embeddings = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+
+    vectors, folders, weights = build_training_set(
+        embeddings, ['a', 'a', 'b'], ['x', 'y', 'z'], weighting='none'
+    )
+
+    assert folders == ['a', 'b']
+    assert np.array_equal(vectors, [[1.0, 0.0], [0.0, 1.0]])
+    assert np.allclose(weights, [4 / 3, 2 / 3])
+
+def test_build_training_set_caps_folders_preserving_their_weight():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((30, 8))
+    folders = ['big'] * 25 + ['small'] * 5
+
+    _, capped, weights = build_training_set(
+        embeddings, folders, [str(i) for i in range(30)], dedup_threshold=None,
+        weighting='none', max_per_folder=5
+    )
+
+    assert capped == ['big'] * 5 + ['small'] * 5
+    big = np.array(capped) == 'big'
+    assert weights[big].sum() == pytest.approx(5 * weights[~big].sum())
+
+def test_build_training_set_rejects_unknown_weightings():
+    with pytest.raises(ValueError):
+        build_training_set(np.eye(2), ['a', 'b'], ['x', 'y'], weighting='chunk')
+
+def test_build_training_set_handles_no_vectors():
+    vectors, folders, weights = build_training_set(np.empty((0, 3)), [], [])
+
+    assert folders == []
+    assert len(weights) == 0
+
+def test_recency_weights_halve_every_half_life():
+    now = 100 * DAY_SECONDS
+    timestamps = [now, now - 30 * DAY_SECONDS, now - 60 * DAY_SECONDS, None, now + 5]
+
+    weights = recency_weights(timestamps, half_life_days=30, now=now)
+
+    # Undated emails and ones dated in the future get the full weight
+    assert np.allclose(weights, [1, 0.5, 0.25, 1, 1])
+
+def test_build_training_set_decays_weights_with_age():
+    weights = build_training_set(
+        np.eye(2), ['a', 'b'], ['x', 'y'], dedup_threshold=None, weighting='none',
+        timestamps=[None, 0.0], half_life_days=30
+    )[2]
+
+    assert weights[0] > weights[1]
+    assert weights.mean() == pytest.approx(1)
+
+def test_training_since_takes_the_later_bound():
+    now = 100 * DAY_SECONDS
+
+    assert training_since(now=now) is None
+    assert training_since(max_age_days=30, now=now) == 70 * DAY_SECONDS
+    assert training_since(max_age_days=30, since=80 * DAY_SECONDS, now=now) == (
+        80 * DAY_SECONDS
+    )
+    assert training_since(since=5.0, now=now) == 5.0
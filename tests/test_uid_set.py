@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from mailfox.core.uid_set import UIDSet
+
+def test_parse_merges_overlapping_and_reversed_ranges():
+    uids = UIDSet.parse('7:5,1:3,4,10')
+
+    assert uids.ranges() == [(1, 7), (10, 10)]
+    assert str(uids) == '1:7,10'
+    assert len(uids) == 8
+
+def test_parse_accepts_bytes_and_empty_sets():
+    assert UIDSet.parse(b'3:4') == {3, 4}
+    assert not UIDSet.parse('')
+
+def test_parse_rejects_invalid_elements():
+    with pytest.raises(ValueError):
+        UIDSet.parse('1:*')
+
+def test_difference_splits_and_trims_ranges():
+    uids = UIDSet.parse('1:10,20:30')
+
+    assert str(uids - UIDSet.parse('3:4,8:22,30')) == '1:2,5:7,23:29'
+    assert str(uids - [1, 10, 20, 31]) == '2:9,21:30'
+    assert not uids - UIDSet.parse('1:40')
+    assert uids - UIDSet() == uids
+
+def test_difference_matches_python_sets():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        first = set(rng.integers(1, 200, 120).tolist())
+        second = set(rng.integers(1, 200, 120).tolist())
+
+        assert set(UIDSet(first) - UIDSet(second)) == first - second
+        assert set(UIDSet(first) | UIDSet(second)) == first | second
+
+def test_contains_checks_membership():
+    uids = UIDSet.parse('5:9,12')
+
+    assert uids.contains([4, 5, 9, 10, 12]).tolist() == [False, True, True, False, True]
+    assert 7 in uids
+    assert 11 not in uids
+
+def test_from_ranges_merges_touching_ranges():
+    uids = UIDSet.from_ranges([10, 1, 4], [12, 3, 6])
+
+    assert uids.ranges() == [(1, 6), (10, 12)]
+    assert uids.to_array().tolist() == [1, 2, 3, 4, 5, 6, 10, 11, 12]
+    assert (uids.min(), uids.max()) == (1, 12)
+
+def test_update_adds_uids_in_place():
+    uids = UIDSet([1, 2])
+    uids.update([3, 8])
+
+    assert str(uids) == '1:3,8'
@@ -0,0 +1,172 @@
+import pytest
+
+from mailfox.vector import database
+from mailfox.vector.enums import EmbeddingFunctions, SearchModes
+
+@pytest.fixture
+def mailbox(vector_db, make_email):
+    emails = {
+        'invoice': make_email(
+            "Invoice for March", ["Your invoice for March is attached, pay by Friday."]
+        ),
+        'terms': make_email(
+            "Updated terms", ["Read the new terms and conditions of the service."]
+        ),
+        'lunch': make_email("Lunch", ["Lunch at noon? The usual place."]),
+    }
+    vector_db.store_emails(list(emails.values()))
+    return {name: mail.uuid for name, mail in emails.items()}
+
+def uuids(results):
+    return [result['uuid'] for result in results]
+
+def test_exact_search_only_uses_the_fts_index(vector_db, mailbox, embedding_function):
+    calls = len(embedding_function.calls)
+
+    results = vector_db.search_emails("invoice", mode=SearchModes.EXACT)
+
+    assert uuids(results) == [mailbox['invoice']]
+    assert results[0]['subject'] == "Invoice for March"
+    assert len(embedding_function.calls) == calls
+    assert vector_db.search_emails("   ", mode=SearchModes.EXACT) == []
+
+@pytest.mark.parametrize("query, expected", [
+    ('"invoice', 'invoice'),
+    ('AND', 'terms'),
+    ('pay*', 'invoice'),
+    ('NEAR(lunch noon)', None),
+])
+def test_exact_search_matches_fts_syntax_literally(vector_db, mailbox, query, expected):
+    results = vector_db.search_emails(query, mode=SearchModes.EXACT)
+
+    assert uuids(results) == ([mailbox[expected]] if expected else [])
+
+def test_hybrid_search_fuses_the_rankings(vector_db, mailbox, monkeypatch):
+    monkeypatch.setattr(
+        vector_db, '_exact_search',
+        lambda query, limit: [mailbox['invoice'], mailbox['terms']]
+    )
+    monkeypatch.setattr(
+        vector_db, '_semantic_search',
+        lambda query, limit: [mailbox['terms'], mailbox['lunch']]
+    )
+
+    results = vector_db.search_emails("anything", n_results=2)
+
+    # Second in one ranking and first in the other beats first in one only
+    assert uuids(results) == [mailbox['terms'], mailbox['invoice']]
+
+def test_hybrid_search_ranks_emails_matching_both_ways_first(vector_db, mailbox):
+    results = vector_db.search_emails("invoice for March", n_results=3)
+
+    assert uuids(results)[0] == mailbox['invoice']
+
+def test_the_fts_index_is_backfilled_for_existing_databases(tmp_path, vector_db,
+                                                            mailbox):
+    # A database from before the FTS index has emails but an empty index
+    vector_db.conn.execute('DELETE FROM emails_fts')
+    vector_db.conn.commit()
+    assert vector_db.search_emails("lunch", mode=SearchModes.EXACT) == []
+    vector_db.close()
+
+    reopened = database.VectorDatabase(str(tmp_path / "db"))
+
+    results = reopened.search_emails("lunch", mode=SearchModes.EXACT)
+    assert uuids(results) == [mailbox['lunch']]
+
+def test_date_timestamps_are_backfilled_in_utc(tmp_path, vector_db, make_email,
+                                               new_york_time):
+    # The handler writes the display date in local time, 05:00 EST is 10:00 UTC
+    vector_db.store_emails([
+        make_email("Hello", ["Hi."], date='Mon, 01 Jan 2024 05:00:00', date_ts=None)
+    ])
+    # A database from before date_ts only has the display date
+    vector_db.conn.execute('DROP INDEX emails_date_ts')
+    vector_db.conn.execute('ALTER TABLE emails DROP COLUMN date_ts')
+    vector_db.close()
+
+    reopened = database.VectorDatabase(str(tmp_path / "db"))
+
+    row = reopened.conn.execute('SELECT date_ts FROM emails').fetchone()
+    assert row[0] == 1704103200
+
+class WordEncoding():
+    """Counts words as tokens, tiktoken would download its encoding."""
+    def encode(self, text):
+        return text.split()
+
+def test_an_interrupted_reindex_resumes_and_is_picked_up(tmp_path, vector_db,
+                                                         mailbox, make_email,
+                                                         monkeypatch):
+    monkeypatch.setattr(database.tiktoken, 'get_encoding', lambda name: WordEncoding())
+    reindexing = database.VectorDatabase(
+        str(tmp_path / "db"), embedding_function=EmbeddingFunctions.OPENAI,
+        openai_api_key='test-key'
+    )
+    embed = database.EmbeddingModel.embed
+    calls = []
+
+    def interrupted(model, text):
+        calls.append(text)
+        if len(calls) > 1:
+            raise RuntimeError("interrupted")
+        return embed(model, text)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(database.EmbeddingModel, 'embed', interrupted)
+        with pytest.raises(RuntimeError):
+            reindexing.reindex(batch_size=1, workers=1, page_size=1)
+    building = reindexing.collection_status()[-1]
+    assert (building['status'], building['embedded']) == ('building', 1)
+
+    assert reindexing.reindex(batch_size=1, workers=1, page_size=1)
+    statuses = {status['name']: status for status in reindexing.collection_status()}
+    assert statuses[building['name']]['status'] == 'active'
+    assert statuses['emails']['status'] == 'retired'
+
+    # The running process stores mail in the old collection until it switches, and
+    # reads the API key of the new model from the credentials
+    monkeypatch.setattr(database, 'read_credentials', lambda: ('u', 'p', 'test-key'))
+    late = make_email("Late", ["Stored after the reindex finished."])
+    vector_db.store_emails([late])
+    assert vector_db.refresh_active_collection()
+    assert vector_db.active_collection == building['name']
+    assert vector_db.stored_embedding_model == reindexing.embedding_model
+    assert not vector_db.refresh_active_collection()
+    uuids = {metadata['uuid'] for metadata in vector_db.emails_collection.get(
+        include=['metadatas'])['metadatas']}
+    assert uuids == {*mailbox.values(), late.uuid}
+
+def stored_row(vector_db, uuid):
+    return vector_db.conn.execute(
+        'SELECT folder, uid, auto_filed FROM emails WHERE uuid=?', (uuid,)
+    ).fetchone()
+
+def vector_folders(vector_db, uuid):
+    docs = vector_db.emails_collection.get(
+        where={'uuid': uuid}, include=['metadatas']
+    )
+    return {metadata['folder'] for metadata in docs['metadatas']}
+
+def test_restore_location_undoes_a_failed_move(vector_db, make_email):
+    mail = make_email("Invoice", ["Your invoice for March is attached."], uid=7)
+    # Stored under the predicted folder before the move, like the pipeline does
+    mail.folder, mail.uid = "Bills", None
+    vector_db.store_emails([mail], auto_filed={mail.uuid})
+
+    vector_db.restore_location(mail.uuid, "INBOX", 7)
+
+    assert stored_row(vector_db, mail.uuid) == ("INBOX", "7", 1)
+    assert vector_folders(vector_db, mail.uuid) == {"INBOX"}
+    # The email is still in the source folder, so the next poll must pick it up
+    assert vector_db.check_seen_uids([7], "INBOX") == set()
+
+def test_record_moves_marks_the_new_uids_seen(vector_db, make_email):
+    mail = make_email("Invoice", ["Your invoice for March is attached."], uid=7)
+    vector_db.store_emails([mail])
+
+    vector_db.record_moves({mail.uuid: 12}, "Bills")
+
+    assert stored_row(vector_db, mail.uuid) == ("Bills", "12", 1)
+    assert vector_folders(vector_db, mail.uuid) == {"Bills"}
+    assert vector_db.check_seen_uids([12], "Bills") == {12}